@@ -0,0 +1,151 @@
+"""
+Cache-miss throughput of the weather endpoint, sync view under WSGI threads
+vs the async view under ASGI, against a local stub upstream with fixed latency.
+
+    python benchmarks/async_path.py [requests] [upstream_ms] [wsgi_threads]
+
+Every request asks for a different city, so each one waits on the upstream.
+The WSGI side runs POST /api/weather/data/ on `wsgi_threads` threads, like a
+threaded worker; the ASGI side sends all requests to POST /api/weather/data/async/
+at once on one event loop. Needs Postgres and Redis; uses a throwaway test database.
+"""
+import asyncio
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import httpx  # noqa: E402
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.test import Client, override_settings  # noqa: E402
+
+from weather.asgi import application  # noqa: E402
+from weather_api.services.cash_service import local_cache  # noqa: E402
+from weather_api.services.weather_api_service import OpenWeatherAPI  # noqa: E402
+
+
+def payload_for(city):
+    return json.dumps({
+        "main": {"temp": 20.5, "feels_like": 19.0, "pressure": 1015, "humidity": 70},
+        "wind": {"speed": 4.2, "deg": 180},
+        "visibility": 10000,
+        "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+        "name": city,
+        "sys": {"country": "GB"},
+        "coord": {"lat": 51.5074, "lon": -0.1278},
+    }).encode()
+
+
+def start_stub_upstream(delay):
+    """Keep-alive HTTP/1.1 stub on its own event loop; every response takes `delay` seconds."""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    address = {}
+
+    async def handle(reader, writer):
+        try:
+            while True:
+                head = await reader.readuntil(b"\r\n\r\n")
+                target = head.split(b" ", 2)[1].decode()
+                city = parse_qs(urlsplit(target).query).get("q", ["london"])[0]
+                body = payload_for(city)
+                await asyncio.sleep(delay)
+                writer.write(
+                    b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\n"
+                    b"Content-Length: " + str(len(body)).encode() + b"\r\n\r\n" + body
+                )
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            writer.close()
+
+    async def serve():
+        server = await asyncio.start_server(handle, "127.0.0.1", 0, backlog=4096)
+        address["port"] = server.sockets[0].getsockname()[1]
+        ready.set()
+        await server.serve_forever()
+
+    threading.Thread(target=loop.run_until_complete, args=(serve(),), daemon=True).start()
+    ready.wait()
+    return f"http://127.0.0.1:{address['port']}/data/2.5/weather"
+
+
+def request_body(run, i):
+    return {"city": f"{run}-city-{i}", "units": "C"}
+
+
+def client_ip(i):
+    # One client per request so the per-IP rate limit never interferes
+    return f"10.{(i >> 16) & 255}.{(i >> 8) & 255}.{i & 255}"
+
+
+def run_wsgi(total, threads):
+    def one(i):
+        response = Client().post(
+            "/api/weather/data/", request_body("wsgi", i),
+            content_type="application/json", HTTP_X_FORWARDED_FOR=client_ip(i),
+        )
+        connection.close()
+        return response.status_code
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        statuses = list(pool.map(one, range(total)))
+    return time.perf_counter() - start, statuses
+
+
+async def run_asgi(total):
+    transport = httpx.ASGITransport(app=application)
+    async with httpx.AsyncClient(transport=transport, base_url="http://localhost", timeout=60) as client:
+        async def one(i):
+            response = await client.post(
+                "/api/weather/data/async/", json=request_body("asgi", i),
+                headers={"X-Forwarded-For": client_ip(i)},
+            )
+            return response.status_code
+
+        start = time.perf_counter()
+        statuses = await asyncio.gather(*[one(i) for i in range(total)])
+    return time.perf_counter() - start, statuses
+
+
+def report(label, total, elapsed, statuses):
+    failed = sum(code != 200 for code in statuses)
+    print(f"{label:<28} {elapsed:7.2f} s   {total / elapsed:8.0f} req/s   non-200: {failed}")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 200.0) / 1000
+    threads = int(sys.argv[3]) if len(sys.argv) > 3 else 16
+
+    url = start_stub_upstream(delay)
+    test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with patch.object(OpenWeatherAPI, "BASE_URL", url), \
+                override_settings(ALLOWED_HOSTS=["localhost", "testserver"]):
+            cache.clear()
+            local_cache.clear()
+            report(f"WSGI sync ({threads} threads)", total, *run_wsgi(total, threads))
+            cache.clear()
+            local_cache.clear()
+            report("ASGI async (1 event loop)", total, *asyncio.run(run_asgi(total)))
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+    print(f"upstream latency {delay * 1000:.0f} ms; ideal = requests x latency / concurrency")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+"""
+Compares the versioned cache codec against the previous pickled ORM tuples.
+
+    python benchmarks/cache_codec.py [iterations]
+
+Needs no running database or Redis: the model instances are built in memory.
+django-redis pickles every value it stores, so the codec's bytes are
+wrapped once more in Redis; the "stored" row includes that wrapping.
+"""
+import os
+import pickle
+import sys
+import time
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from weather_api.models import Location, WeatherData  # noqa: E402
+from weather_api.services.cache_codec import (  # noqa: E402
+    LOCATION_FIELDS, WEATHER_DATA_FIELDS, encode_entry, decode_entry,
+)
+
+# Every field the codec reads, so encoding never falls back to a deferred-field query
+LOCATION_VALUES = {
+    "id": 42, "city": "london", "country_code": "GB", "latitude": 51.5074, "longitude": -0.1278,
+    "grid_cell": Location.grid_cell_for(51.5074, -0.1278), "owm_id": 2643743,
+}
+WEATHER_DATA_VALUES = {
+    "id": 1337, "temperature": 20.5, "feels_like": 19.0, "pressure": 1015, "humidity": 70,
+    "wind_speed": 4.2, "wind_direction": 180, "visibility": 10000,
+    "main_weather": "Clouds", "description": "scattered clouds", "icon": "03d",
+}
+
+
+def sample_entry():
+    location = Location.from_db("default", LOCATION_FIELDS, [LOCATION_VALUES[f] for f in LOCATION_FIELDS])
+    weather_data = WeatherData.from_db(
+        "default", WEATHER_DATA_FIELDS, [WEATHER_DATA_VALUES[f] for f in WEATHER_DATA_FIELDS]
+    )
+    return location, weather_data, time.time(), time.time() + 300
+
+
+def bench(label, encode, decode, iterations):
+    payload = encode()
+    encode_us = timeit.timeit(encode, number=iterations) / iterations * 1e6
+    decode_us = timeit.timeit(lambda: decode(payload), number=iterations) / iterations * 1e6
+    print(f"{label:<8} {len(payload):>8} {encode_us:>12.2f} {decode_us:>12.2f}")
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    location, weather_data, fetched_at, expires_at = sample_entry()
+
+    print(f"{'codec':<8} {'bytes':>8} {'encode (us)':>12} {'decode (us)':>12}")
+    bench("pickle", lambda: pickle.dumps((location, weather_data, fetched_at, expires_at)), pickle.loads, iterations)
+    bench("codec", lambda: encode_entry(location, weather_data, fetched_at, expires_at), decode_entry, iterations)
+    bench(
+        "stored",
+        lambda: pickle.dumps(encode_entry(location, weather_data, fetched_at, expires_at), pickle.HIGHEST_PROTOCOL),
+        lambda payload: decode_entry(pickle.loads(payload)),
+        iterations,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Upstream requests spent by one hot-city refresh cycle, one call per city
+vs OpenWeatherMap group calls, against a local stub upstream.
+
+    python benchmarks/group_refresh.py [cities] [upstream_ms]
+
+Seeds `cities` hot locations through the normal lookup path, ages their
+observations past the refresh lead and runs HotCityRefresher.run_once(),
+first with the city ids cleared (single /weather calls) and then with them
+(/group calls of up to 20 ids). Needs Postgres and Redis; uses a throwaway test database.
+"""
+import json
+import os
+import sys
+import threading
+import time
+from datetime import timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+from urllib.parse import parse_qs, urlsplit
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.core.cache import cache  # noqa: E402
+from django.db import connection  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from weather_api.models import LatestObservation, Location  # noqa: E402
+from weather_api.services.cash_service import get_weather_for_city, local_cache  # noqa: E402
+from weather_api.services.hot_refresh import HotCityRefresher  # noqa: E402
+from weather_api.services.weather_api_service import OpenWeatherAPI  # noqa: E402
+
+CITY_ID_BASE = 1000
+
+
+def payload_for(city_id):
+    return {
+        "id": city_id,
+        "main": {"temp": 20.5, "feels_like": 19.0, "pressure": 1015, "humidity": 70},
+        "wind": {"speed": 4.2, "deg": 180},
+        "visibility": 10000,
+        "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+        "name": f"City {city_id}",
+        "sys": {"country": "GB"},
+        "coord": {"lat": 51.5074, "lon": -0.1278},
+    }
+
+
+def start_stub_upstream(delay, counts):
+    """Threaded stub for /weather?q=City N and /group?id=...; counts requests per path."""
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_GET(self):
+            url = urlsplit(self.path)
+            query = parse_qs(url.query)
+            if url.path.endswith("/group"):
+                ids = [int(i) for i in query["id"][0].split(",")]
+                data = {"cnt": len(ids), "list": [payload_for(i) for i in ids]}
+            else:
+                name = query["q"][0].split(",")[0]
+                data = payload_for(int(name.split()[-1]))
+            counts[url.path.rsplit("/", 1)[-1]] += 1
+
+            time.sleep(delay)
+            body = json.dumps(data).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return f"http://127.0.0.1:{server.server_address[1]}/data/2.5"
+
+
+def run_cycle(label, counts):
+    LatestObservation.objects.update(fetched_at=timezone.now() - timedelta(minutes=10))
+    cache.clear()
+    local_cache.clear()
+    counts.update(weather=0, group=0)
+
+    refresher = HotCityRefresher(top_n=10_000, lead=30, concurrency=4, budget=10_000, window=3600)
+    start = time.perf_counter()
+    try:
+        stats = refresher.run_once()
+    finally:
+        refresher.shutdown()
+    elapsed = time.perf_counter() - start
+    requests = counts["weather"] + counts["group"]
+    print(f"{label:<24} {elapsed:6.2f} s   refreshed {stats['refreshed']:>5}   upstream requests {requests:>5}")
+
+
+def main():
+    cities = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 50.0) / 1000
+
+    counts = {"weather": 0, "group": 0}
+    base = start_stub_upstream(delay, counts)
+    test_db = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+    try:
+        with patch.object(OpenWeatherAPI, "BASE_URL", f"{base}/weather"), \
+                patch.object(OpenWeatherAPI, "GROUP_URL", f"{base}/group"):
+            cache.clear()
+            for i in range(cities):
+                # One client per city so the per-IP rate limit never interferes
+                get_weather_for_city(f"City {CITY_ID_BASE + i}", "C", f"10.0.{i >> 8}.{i & 255}")
+
+            owm_ids = dict(Location.objects.values_list("id", "owm_id"))
+            Location.objects.update(owm_id=None)
+            run_cycle("single /weather calls", counts)
+            for location_id, owm_id in owm_ids.items():
+                Location.objects.filter(id=location_id).update(owm_id=owm_id)
+            run_cycle("/group calls", counts)
+    finally:
+        connection.creation.destroy_test_db(test_db, verbosity=0)
+    print(f"{cities} hot cities, upstream latency {delay * 1000:.0f} ms, 4 concurrent calls")
+
+
+if __name__ == "__main__":
+    main()
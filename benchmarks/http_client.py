@@ -0,0 +1,107 @@
+"""
+Cache-miss upstream latency of OpenWeatherAPI.fetch_weather against a local
+stub server, with a fresh connection per call vs the pooled keep-alive client.
+
+    python benchmarks/http_client.py [requests] [handshake_ms]
+
+`handshake_ms` delays the first response on every new connection to stand in
+for the DNS + TCP + TLS setup a real api.openweathermap.org call pays (default 30).
+"""
+import json
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+import requests  # noqa: E402
+
+from weather_api.services.http_client import PooledHTTPClient  # noqa: E402
+from weather_api.services.weather_api_service import OpenWeatherAPI  # noqa: E402
+
+PAYLOAD = json.dumps({
+    "main": {"temp": 20.5, "feels_like": 19.0, "pressure": 1015, "humidity": 70},
+    "wind": {"speed": 4.2, "deg": 180},
+    "visibility": 10000,
+    "weather": [{"main": "Clouds", "description": "scattered clouds", "icon": "03d"}],
+    "name": "London",
+    "sys": {"country": "GB"},
+    "coord": {"lat": 51.5074, "lon": -0.1278},
+}).encode()
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    disable_nagle_algorithm = True  # headers and body go out in separate writes
+    handshake_delay = 0.0
+    connections = 0
+
+    def setup(self):
+        super().setup()
+        StubHandler.connections += 1
+        time.sleep(self.handshake_delay)
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(PAYLOAD)))
+        self.end_headers()
+        self.wfile.write(PAYLOAD)
+
+    def log_message(self, *args):
+        pass
+
+
+class OneShotClient:
+    """The previous behaviour: module-level requests.get, new connection every call."""
+
+    def get(self, url, params=None, read_timeout=None):
+        return requests.get(url, params=params, timeout=5)
+
+
+def run(label, client, url, total):
+    StubHandler.connections = 0
+    timings = []
+    with patch("weather_api.services.weather_api_service.http_client", client), \
+            patch.object(OpenWeatherAPI, "BASE_URL", url):
+        for _ in range(total):
+            start = time.perf_counter()
+            OpenWeatherAPI.fetch_weather("london")
+            timings.append(time.perf_counter() - start)
+
+    timings.sort()
+    mean = sum(timings) / total * 1000
+    p50 = timings[total // 2] * 1000
+    p99 = timings[min(int(total * 0.99), total - 1)] * 1000
+    print(f"{label:<22} mean {mean:7.2f} ms   p50 {p50:7.2f} ms   p99 {p99:7.2f} ms   "
+          f"connections {StubHandler.connections}")
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    StubHandler.handshake_delay = (float(sys.argv[2]) if len(sys.argv) > 2 else 30.0) / 1000
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_address[1]}/data/2.5/weather"
+
+    try:
+        run("requests.get (before)", OneShotClient(), url, total)
+        pooled = PooledHTTPClient(pool_size=10, connect_timeout=1.0, read_timeout=5.0)
+        run("pooled client (after)", pooled, url, total)
+        pooled.close()
+    finally:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""
+Requests/sec on the cache-hit path of POST /api/weather/data/,
+with and without the pre-rendered response cache.
+
+    python benchmarks/response_cache.py [requests]
+
+The service call is stubbed with an in-memory cache-hit WeatherQuery, so only
+view, serialization and rendering costs are measured; no database or Redis needed.
+"""
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DJANGO_SETTINGS_MODULE", "weather.settings")
+
+import django  # noqa: E402
+
+django.setup()
+
+from django.test import override_settings  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from rest_framework.test import APIRequestFactory  # noqa: E402
+
+from weather_api.models import Location, WeatherData, WeatherQuery  # noqa: E402
+from weather_api.views import WeatherDataAPIView  # noqa: E402
+
+
+def cache_hit_query():
+    location = Location(id=42, city="london", country_code="GB", latitude=51.5074, longitude=-0.1278)
+    weather_data = WeatherData(
+        id=1337, temperature=20.5, feels_like=19.0, pressure=1015, humidity=70, wind_speed=4.2,
+        wind_direction=180, visibility=10000, main_weather="Clouds", description="scattered clouds", icon="03d",
+    )
+    return WeatherQuery(
+        id=1, location=location, weather_data=weather_data, units="C", ip_address="127.0.0.1",
+        served_from_cache=True, raw_response=None, timestamp=timezone.now(),
+    )
+
+
+def run(label, view, factory, total):
+    body = None
+    start = time.perf_counter()
+    for _ in range(total):
+        request = factory.post("/api/weather/data/", {"city": "london", "units": "C"}, format="json")
+        response = view(request)
+        if hasattr(response, "render"):
+            response.render()
+        body = response.content
+    elapsed = time.perf_counter() - start
+    print(f"{label:<24} {total / elapsed:>10.0f} req/s")
+    return body
+
+
+def main():
+    total = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    factory = APIRequestFactory()
+    view = WeatherDataAPIView.as_view()
+    query = cache_hit_query()
+
+    with patch("weather_api.views.get_weather_for_city", return_value=query):
+        with override_settings(WEATHER_RESPONSE_CACHE=False):
+            serialized = run("serializer (before)", view, factory, total)
+        with override_settings(WEATHER_RESPONSE_CACHE=True):
+            spliced = run("response cache (after)", view, factory, total)
+
+    assert serialized == spliced, "spliced body differs from serializer output"
+
+
+if __name__ == "__main__":
+    main()
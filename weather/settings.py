@@ -68,17 +68,112 @@ DATABASES = {
     }
 }
 
+# Redis outages: calls give up after these socket timeouts (seconds); after
+# WEATHER_REDIS_FAILURE_THRESHOLD consecutive failures each worker stops calling Redis
+# for WEATHER_REDIS_RETRY_SECONDS and serves from an in-process failover tier
+# (WEATHER_REDIS_FAILOVER_SIZE entries for up to WEATHER_REDIS_FAILOVER_TTL seconds)
+# plus the database, with per-process rate limiting
+WEATHER_REDIS_SOCKET_TIMEOUT = float(os.getenv('WEATHER_REDIS_SOCKET_TIMEOUT', 0.5))
+WEATHER_REDIS_CONNECT_TIMEOUT = float(os.getenv('WEATHER_REDIS_CONNECT_TIMEOUT', 0.25))
+WEATHER_REDIS_FAILURE_THRESHOLD = int(os.getenv('WEATHER_REDIS_FAILURE_THRESHOLD', 3))
+WEATHER_REDIS_RETRY_SECONDS = float(os.getenv('WEATHER_REDIS_RETRY_SECONDS', 5))
+WEATHER_REDIS_FAILOVER_SIZE = int(os.getenv('WEATHER_REDIS_FAILOVER_SIZE', 1000))
+WEATHER_REDIS_FAILOVER_TTL = int(os.getenv('WEATHER_REDIS_FAILOVER_TTL', 60))
+
 CACHES = {
     'default': {
-        'BACKEND': 'django_redis.cache.RedisCache',
+        # django-redis with local failover while Redis is down (see services/redis_failover.py)
+        'BACKEND': 'weather_api.services.redis_failover.ResilientRedisCache',
         'LOCATION': os.getenv('REDIS_URL', 'redis://redis:6379/1'),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            # Counts Redis round trips per request (see services/redis_metrics.py)
+            'CONNECTION_POOL_CLASS': 'weather_api.services.redis_metrics.CountingConnectionPool',
+            'SOCKET_TIMEOUT': WEATHER_REDIS_SOCKET_TIMEOUT,
+            'SOCKET_CONNECT_TIMEOUT': WEATHER_REDIS_CONNECT_TIMEOUT,
         },
         'KEY_PREFIX': 'weather',
     }
 }
 
+# Per-worker in-memory tier in front of Redis (TTL in seconds, capped by the Redis TTL)
+WEATHER_LOCAL_CACHE_SIZE = int(os.getenv('WEATHER_LOCAL_CACHE_SIZE', 500))
+WEATHER_LOCAL_CACHE_TTL = int(os.getenv('WEATHER_LOCAL_CACHE_TTL', 60))
+
+# Stale-while-revalidate: Redis entries live this long (seconds) and are refreshed
+# in the background once past their soft TTL
+WEATHER_CACHE_HARD_TTL = int(os.getenv('WEATHER_CACHE_HARD_TTL', 900))
+# Soft TTL (seconds): follows each location's upstream update cadence, between
+# MIN and MAX (capped at the hard TTL); the default applies while it is unknown
+WEATHER_CACHE_TTL = int(os.getenv('WEATHER_CACHE_TTL', 300))
+WEATHER_CACHE_MIN_TTL = int(os.getenv('WEATHER_CACHE_MIN_TTL', 60))
+WEATHER_CACHE_MAX_TTL = int(os.getenv('WEATHER_CACHE_MAX_TTL', 600))
+WEATHER_REFRESH_WORKERS = int(os.getenv('WEATHER_REFRESH_WORKERS', 4))
+
+# Negative cache: seconds an unknown city, or a city whose upstream call just
+# failed, is answered from a Redis tombstone instead of calling upstream again
+WEATHER_NOT_FOUND_TTL = int(os.getenv('WEATHER_NOT_FOUND_TTL', 600))
+WEATHER_UPSTREAM_ERROR_TTL = int(os.getenv('WEATHER_UPSTREAM_ERROR_TTL', 15))
+
+# Per-worker in-memory map of city spellings to locations, in front of the city_aliases table
+WEATHER_ALIAS_CACHE_SIZE = int(os.getenv('WEATHER_ALIAS_CACHE_SIZE', 10000))
+
+# Coordinate lookups are served from the nearest known location within this
+# radius (km); grid cells of locations are kept in memory per worker
+WEATHER_COORDS_RADIUS_KM = float(os.getenv('WEATHER_COORDS_RADIUS_KM', 5.0))
+WEATHER_GRID_CACHE_SIZE = int(os.getenv('WEATHER_GRID_CACHE_SIZE', 20000))
+
+# refresh_hot_cities: keeps the top N locations by requests over the last
+# WEATHER_HOT_WINDOW seconds fresh, refreshing LEAD seconds before the soft TTL
+WEATHER_HOT_CITIES = int(os.getenv('WEATHER_HOT_CITIES', 50))
+WEATHER_HOT_WINDOW = int(os.getenv('WEATHER_HOT_WINDOW', 3600))
+WEATHER_HOT_REFRESH_LEAD = int(os.getenv('WEATHER_HOT_REFRESH_LEAD', 30))
+WEATHER_HOT_REFRESH_CONCURRENCY = int(os.getenv('WEATHER_HOT_REFRESH_CONCURRENCY', 4))
+WEATHER_HOT_REFRESH_BUDGET = int(os.getenv('WEATHER_HOT_REFRESH_BUDGET', 60))  # upstream calls per minute
+
+# Serve cache hits from pre-rendered JSON with only the per-query fields rendered
+WEATHER_RESPONSE_CACHE = os.getenv('WEATHER_RESPONSE_CACHE', 'True').lower() == 'true'
+
+# Query log writes: 'sync' saves each row inline, 'write_behind' queues rows
+# and saves them in batches from a background thread (flush interval in seconds)
+WEATHER_QUERY_LOG_MODE = os.getenv('WEATHER_QUERY_LOG_MODE', 'sync')
+WEATHER_QUERY_LOG_QUEUE_SIZE = int(os.getenv('WEATHER_QUERY_LOG_QUEUE_SIZE', 10000))
+WEATHER_QUERY_LOG_BATCH_SIZE = int(os.getenv('WEATHER_QUERY_LOG_BATCH_SIZE', 500))
+WEATHER_QUERY_LOG_FLUSH_INTERVAL = float(os.getenv('WEATHER_QUERY_LOG_FLUSH_INTERVAL', 1.0))
+
+# 'sliding_window' (atomic Lua script, one round trip) or the legacy 'fixed_window' counter
+WEATHER_RATE_LIMIT_BACKEND = os.getenv('WEATHER_RATE_LIMIT_BACKEND', 'sliding_window')
+
+# Batch endpoint: max cities per request and concurrent upstream fetches per worker
+WEATHER_BATCH_MAX_ITEMS = int(os.getenv('WEATHER_BATCH_MAX_ITEMS', 200))
+WEATHER_BATCH_WORKERS = int(os.getenv('WEATHER_BATCH_WORKERS', 10))
+
+# Keep-alive connection pool for OpenWeatherMap calls (per worker process, timeouts in seconds)
+WEATHER_HTTP_POOL_SIZE = int(os.getenv('WEATHER_HTTP_POOL_SIZE', 10))
+WEATHER_HTTP_CONNECT_TIMEOUT = float(os.getenv('WEATHER_HTTP_CONNECT_TIMEOUT', 1.0))
+WEATHER_HTTP_READ_TIMEOUT = float(os.getenv('WEATHER_HTTP_READ_TIMEOUT', 5.0))
+# Connection cap for the async (ASGI) upstream client, per worker process and event loop
+WEATHER_ASYNC_HTTP_MAX_CONNECTIONS = int(os.getenv('WEATHER_ASYNC_HTTP_MAX_CONNECTIONS', 1000))
+# Async requests doing ORM work at once per worker; each holds a Postgres connection meanwhile
+WEATHER_ASYNC_DB_CONCURRENCY = int(os.getenv('WEATHER_ASYNC_DB_CONCURRENCY', 20))
+
+# Upstream circuit breaker, shared by all workers through Redis. Opens when at least
+# WEATHER_BREAKER_MIN_CALLS calls in a WEATHER_BREAKER_WINDOW-second window fail at
+# WEATHER_BREAKER_FAILURE_RATE or more (calls slower than WEATHER_BREAKER_SLOW_CALL
+# seconds count as failures), then fails fast for WEATHER_BREAKER_OPEN_SECONDS.
+WEATHER_BREAKER_FAILURE_RATE = float(os.getenv('WEATHER_BREAKER_FAILURE_RATE', 0.5))
+WEATHER_BREAKER_MIN_CALLS = int(os.getenv('WEATHER_BREAKER_MIN_CALLS', 10))
+WEATHER_BREAKER_WINDOW = float(os.getenv('WEATHER_BREAKER_WINDOW', 60))
+WEATHER_BREAKER_SLOW_CALL = float(os.getenv('WEATHER_BREAKER_SLOW_CALL', 2.0))
+WEATHER_BREAKER_OPEN_SECONDS = float(os.getenv('WEATHER_BREAKER_OPEN_SECONDS', 30))
+
+# Upstream call budget shared by all workers through Redis: set to the API key's
+# per-minute limit (0 = unlimited). Up to WEATHER_UPSTREAM_QUOTA_BURST calls at once;
+# background refreshes leave WEATHER_UPSTREAM_BACKGROUND_RESERVE of the burst to requests.
+WEATHER_UPSTREAM_QUOTA_PER_MINUTE = int(os.getenv('WEATHER_UPSTREAM_QUOTA_PER_MINUTE', 0))
+WEATHER_UPSTREAM_QUOTA_BURST = int(os.getenv('WEATHER_UPSTREAM_QUOTA_BURST', 10))
+WEATHER_UPSTREAM_BACKGROUND_RESERVE = float(os.getenv('WEATHER_UPSTREAM_BACKGROUND_RESERVE', 0.5))
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -0,0 +1,49 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from weather_api.services.hot_refresh import HotCityRefresher
+
+
+class Command(BaseCommand):
+    help = (
+        "Re-fetches the most requested cities shortly before their cache entries "
+        "turn stale, within an upstream call budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=settings.WEATHER_HOT_CITIES,
+                            help="Number of most requested locations to keep fresh")
+        parser.add_argument('--lead', type=float, default=settings.WEATHER_HOT_REFRESH_LEAD,
+                            help="Seconds before the soft TTL to refresh an entry")
+        parser.add_argument('--concurrency', type=int, default=settings.WEATHER_HOT_REFRESH_CONCURRENCY,
+                            help="Upstream fetches in flight at once")
+        parser.add_argument('--budget', type=int, default=settings.WEATHER_HOT_REFRESH_BUDGET,
+                            help="Upstream calls allowed per minute")
+        parser.add_argument('--window', type=float, default=settings.WEATHER_HOT_WINDOW,
+                            help="Seconds of query log counted for popularity")
+        parser.add_argument('--interval', type=float, default=60,
+                            help="Longest sleep between cycles, in seconds")
+        parser.add_argument('--once', action='store_true', help="Run a single cycle and exit")
+
+    def handle(self, *args, **options):
+        refresher = HotCityRefresher(
+            top_n=options['top'],
+            lead=options['lead'],
+            concurrency=options['concurrency'],
+            budget=options['budget'],
+            window=options['window'],
+        )
+        try:
+            if options['once']:
+                stats = refresher.run_once()
+                self.stdout.write(
+                    f"hot={stats['hot']} upstream_calls={stats['upstream_calls']} "
+                    f"refreshed={stats['refreshed']} skipped={stats['skipped']} "
+                    f"over_budget={stats['over_budget']} failed={stats['failed']}"
+                )
+            else:
+                refresher.run_forever(interval=options['interval'])
+        except KeyboardInterrupt:
+            pass
+        finally:
+            refresher.shutdown()
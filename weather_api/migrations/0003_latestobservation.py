@@ -0,0 +1,31 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:30
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0002_remove_weatherquery_weather_que_timesta_78d43d_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestObservation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('city_key', models.CharField(max_length=100)),
+                ('units', models.CharField(choices=[('C', 'Celsius'), ('F', 'Fahrenheit')], default='C', max_length=1)),
+                ('raw_response', models.JSONField(blank=True, null=True)),
+                ('fetched_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='weather_api.location')),
+                ('weather_data', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='weather_api.weatherdata')),
+            ],
+            options={
+                'db_table': 'latest_observations',
+                'constraints': [models.UniqueConstraint(fields=('city_key', 'units'), name='unique_latest_observation')],
+            },
+        ),
+    ]
@@ -0,0 +1,45 @@
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0003_latestobservation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RawResponse',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('digest', models.CharField(max_length=64, unique=True)),
+                ('payload', models.JSONField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'db_table': 'raw_responses',
+            },
+        ),
+        migrations.RenameField(
+            model_name='weatherquery',
+            old_name='raw_response',
+            new_name='raw_response_json',
+        ),
+        migrations.RenameField(
+            model_name='latestobservation',
+            old_name='raw_response',
+            new_name='raw_response_json',
+        ),
+        migrations.AddField(
+            model_name='weatherquery',
+            name='raw_response',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='weather_api.rawresponse'),
+        ),
+        migrations.AddField(
+            model_name='latestobservation',
+            name='raw_response',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='weather_api.rawresponse'),
+        ),
+    ]
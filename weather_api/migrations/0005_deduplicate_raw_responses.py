@@ -0,0 +1,66 @@
+import hashlib
+import json
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def _digest(payload):
+    canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _move_payloads(RawResponse, model):
+    """Replaces each row's inline JSON with a reference to a shared RawResponse."""
+    known = dict(RawResponse.objects.values_list('digest', 'id'))
+    rows = model.objects.filter(raw_response_json__isnull=False).only('id', 'raw_response_json')
+
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        digest = _digest(row.raw_response_json)
+        if digest not in known:
+            known[digest] = RawResponse.objects.create(digest=digest, payload=row.raw_response_json).id
+        row.raw_response_id = known[digest]
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, ['raw_response'])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['raw_response'])
+
+
+def _restore_payloads(model):
+    rows = model.objects.filter(raw_response__isnull=False).select_related('raw_response')
+
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        row.raw_response_json = row.raw_response.payload
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            model.objects.bulk_update(batch, ['raw_response_json'])
+            batch = []
+    if batch:
+        model.objects.bulk_update(batch, ['raw_response_json'])
+
+
+def forwards(apps, schema_editor):
+    RawResponse = apps.get_model('weather_api', 'RawResponse')
+    _move_payloads(RawResponse, apps.get_model('weather_api', 'WeatherQuery'))
+    _move_payloads(RawResponse, apps.get_model('weather_api', 'LatestObservation'))
+
+
+def backwards(apps, schema_editor):
+    _restore_payloads(apps.get_model('weather_api', 'WeatherQuery'))
+    _restore_payloads(apps.get_model('weather_api', 'LatestObservation'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0004_rawresponse'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
@@ -0,0 +1,19 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0005_deduplicate_raw_responses'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='weatherquery',
+            name='raw_response_json',
+        ),
+        migrations.RemoveField(
+            model_name='latestobservation',
+            name='raw_response_json',
+        ),
+    ]
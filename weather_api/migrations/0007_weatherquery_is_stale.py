@@ -0,0 +1,18 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0006_remove_inline_raw_responses'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherquery',
+            name='is_stale',
+            field=models.BooleanField(default=False),
+        ),
+    ]
@@ -0,0 +1,81 @@
+from django.db import migrations
+from django.db.models import Q
+
+BATCH_SIZE = 2000
+METERS_PER_SECOND_IN_MPH = 0.44704
+
+
+def _to_metric(row):
+    if row.temperature is not None:
+        row.temperature = round((row.temperature - 32) * 5 / 9, 2)
+    if row.feels_like is not None:
+        row.feels_like = round((row.feels_like - 32) * 5 / 9, 2)
+    if row.wind_speed is not None:
+        row.wind_speed = round(row.wind_speed * METERS_PER_SECOND_IN_MPH, 2)
+
+
+def _to_imperial(row):
+    if row.temperature is not None:
+        row.temperature = round(row.temperature * 9 / 5 + 32, 2)
+    if row.feels_like is not None:
+        row.feels_like = round(row.feels_like * 9 / 5 + 32, 2)
+    if row.wind_speed is not None:
+        row.wind_speed = round(row.wind_speed / METERS_PER_SECOND_IN_MPH, 2)
+
+
+def _convert(WeatherData, rows, convert):
+    rows = rows.only('id', 'temperature', 'feels_like', 'wind_speed')
+
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        convert(row)
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            WeatherData.objects.bulk_update(batch, ['temperature', 'feels_like', 'wind_speed'])
+            batch = []
+    if batch:
+        WeatherData.objects.bulk_update(batch, ['temperature', 'feels_like', 'wind_speed'])
+
+
+def forwards(apps, schema_editor):
+    """
+    Observations were fetched in the requested units, one WeatherData row per
+    (city, units) fetch. Converts the Fahrenheit ones to metric and keeps a
+    single latest observation per city, preferring the Celsius one.
+
+    Raw payloads are shared and content-addressed, and the queries that
+    served them really did get imperial units, so they are left as they are;
+    the converted latest observations just stop pointing at them, as the DB
+    tier would otherwise hand an imperial payload out next to metric data.
+    """
+    WeatherData = apps.get_model('weather_api', 'WeatherData')
+    LatestObservation = apps.get_model('weather_api', 'LatestObservation')
+
+    imperial = WeatherData.objects.filter(
+        Q(weatherquery__units='F') | Q(latestobservation__units='F')
+    ).distinct()
+    _convert(WeatherData, imperial, _to_metric)
+
+    celsius_cities = LatestObservation.objects.filter(units='C').values('city_key')
+    LatestObservation.objects.filter(units='F', city_key__in=celsius_cities).delete()
+    LatestObservation.objects.filter(units='F').update(raw_response=None)
+
+
+def backwards(apps, schema_editor):
+    # Rows shared with Celsius queries since the switch stay metric
+    WeatherData = apps.get_model('weather_api', 'WeatherData')
+    imperial_only = WeatherData.objects.filter(weatherquery__units='F').exclude(
+        weatherquery__units='C'
+    ).distinct()
+    _convert(WeatherData, imperial_only, _to_imperial)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0007_weatherquery_is_stale'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, backwards),
+    ]
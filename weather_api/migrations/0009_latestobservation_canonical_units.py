@@ -0,0 +1,25 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:54
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0008_convert_weather_data_to_metric'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='latestobservation',
+            name='unique_latest_observation',
+        ),
+        migrations.RemoveField(
+            model_name='latestobservation',
+            name='units',
+        ),
+        migrations.AddConstraint(
+            model_name='latestobservation',
+            constraint=models.UniqueConstraint(fields=('city_key',), name='unique_latest_observation_city'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:58
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0009_latestobservation_canonical_units'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CityAlias',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alias', models.CharField(max_length=100, unique=True)),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('location', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='aliases', to='weather_api.location')),
+            ],
+            options={
+                'db_table': 'city_aliases',
+            },
+        ),
+    ]
@@ -0,0 +1,53 @@
+import unicodedata
+
+from django.db import migrations
+
+BATCH_SIZE = 2000
+
+
+def _normalize(name):
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+def forwards(apps, schema_editor):
+    """
+    Seeds aliases from the inputs latest observations were keyed by and from
+    the country-qualified location names, then keeps one latest observation
+    per location (the most recent). Bare names are not seeded: a name found
+    in one country here may still mean another country upstream, and would
+    pin every later lookup of it to this location.
+    """
+    Location = apps.get_model('weather_api', 'Location')
+    CityAlias = apps.get_model('weather_api', 'CityAlias')
+    LatestObservation = apps.get_model('weather_api', 'LatestObservation')
+
+    aliases = {}
+    locations = Location.objects.exclude(country_code='').values_list('city', 'country_code', 'id')
+    for city, country_code, location_id in locations.iterator(chunk_size=BATCH_SIZE):
+        aliases[_normalize(f"{city}, {country_code}")] = location_id
+    # Inputs override names: they are what users actually typed
+    observations = LatestObservation.objects.order_by('fetched_at').values_list('city_key', 'location_id')
+    for city_key, location_id in observations.iterator(chunk_size=BATCH_SIZE):
+        aliases[_normalize(city_key)] = location_id
+
+    CityAlias.objects.bulk_create(
+        [CityAlias(alias=alias[:100], location_id=location_id) for alias, location_id in aliases.items()],
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True,
+    )
+
+    newest = {}
+    for pk, location_id in LatestObservation.objects.order_by('fetched_at').values_list('id', 'location_id'):
+        newest[location_id] = pk
+    LatestObservation.objects.exclude(id__in=list(newest.values())).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0010_cityalias'),
+    ]
+
+    operations = [
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
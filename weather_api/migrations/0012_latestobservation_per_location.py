@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-16 22:58
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def restore_city_keys(apps, schema_editor):
+    """Reverse only: keys latest observations by location name again."""
+    LatestObservation = apps.get_model('weather_api', 'LatestObservation')
+    rows = LatestObservation.objects.select_related('location').order_by('id')
+
+    seen = set()
+    batch = []
+    for row in rows.iterator(chunk_size=BATCH_SIZE):
+        city_key = row.location.city
+        if city_key in seen:  # same name in another country
+            city_key = f"{city_key} ({row.location.country_code})"
+        seen.add(city_key)
+        row.city_key = city_key
+        batch.append(row)
+        if len(batch) >= BATCH_SIZE:
+            LatestObservation.objects.bulk_update(batch, ['city_key'])
+            batch = []
+    if batch:
+        LatestObservation.objects.bulk_update(batch, ['city_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0011_populate_city_aliases'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='latestobservation',
+            name='unique_latest_observation_city',
+        ),
+        migrations.AddConstraint(
+            model_name='latestobservation',
+            constraint=models.UniqueConstraint(fields=('location',), name='unique_latest_observation_location'),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, restore_city_keys),
+        migrations.AlterField(
+            model_name='latestobservation',
+            name='city_key',
+            field=models.CharField(default='', max_length=100),
+        ),
+        migrations.RemoveField(
+            model_name='latestobservation',
+            name='city_key',
+        ),
+    ]
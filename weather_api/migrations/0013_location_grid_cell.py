@@ -0,0 +1,48 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:02
+
+import math
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+# Location.GRID_CELL_DEGREES at the time of this migration
+GRID_CELL_DEGREES = 0.1
+
+
+def _grid_cell(latitude, longitude):
+    row = math.floor(latitude / GRID_CELL_DEGREES)
+    col = math.floor(longitude / GRID_CELL_DEGREES) % round(360 / GRID_CELL_DEGREES)
+    return f"{row}:{col}"
+
+
+def forwards(apps, schema_editor):
+    Location = apps.get_model('weather_api', 'Location')
+    located = Location.objects.filter(latitude__isnull=False, longitude__isnull=False).only(
+        'id', 'latitude', 'longitude'
+    )
+
+    batch = []
+    for location in located.iterator(chunk_size=BATCH_SIZE):
+        location.grid_cell = _grid_cell(location.latitude, location.longitude)
+        batch.append(location)
+        if len(batch) >= BATCH_SIZE:
+            Location.objects.bulk_update(batch, ['grid_cell'])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ['grid_cell'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0012_latestobservation_per_location'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='grid_cell',
+            field=models.CharField(blank=True, db_index=True, default='', max_length=32),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:07
+
+from django.db import migrations, models
+
+BATCH_SIZE = 2000
+
+
+def forwards(apps, schema_editor):
+    """Takes each location's OpenWeatherMap id from its latest stored payload."""
+    Location = apps.get_model('weather_api', 'Location')
+    LatestObservation = apps.get_model('weather_api', 'LatestObservation')
+
+    observations = LatestObservation.objects.filter(raw_response__isnull=False).values_list(
+        'location_id', 'raw_response__payload'
+    )
+    batch = []
+    for location_id, payload in observations.iterator(chunk_size=BATCH_SIZE):
+        owm_id = payload.get('id') if isinstance(payload, dict) else None
+        if isinstance(owm_id, int):
+            batch.append(Location(id=location_id, owm_id=owm_id))
+        if len(batch) >= BATCH_SIZE:
+            Location.objects.bulk_update(batch, ['owm_id'])
+            batch = []
+    if batch:
+        Location.objects.bulk_update(batch, ['owm_id'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0013_location_grid_cell'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='location',
+            name='owm_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.RunPython(forwards, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.8 on 2026-10-16 23:13
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('weather_api', '0014_location_owm_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='latestobservation',
+            name='expires_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='latestobservation',
+            name='observation_lag',
+            field=models.FloatField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='latestobservation',
+            name='observed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='latestobservation',
+            name='update_interval',
+            field=models.FloatField(blank=True, null=True),
+        ),
+    ]
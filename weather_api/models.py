@@ -1,3 +1,7 @@
+import hashlib
+import json
+import math
+
 from django.db import models
 from django.utils import timezone
 
@@ -6,10 +10,17 @@ class Location(models.Model):
     Normalized location data to prevent duplicates.
     Unique constraint ensures same city+country appears only once.
     """
+    # Cells are stored, so changing the size needs a data migration
+    GRID_CELL_DEGREES = 0.1
+
     city = models.CharField(max_length=100, db_index=True)
     country_code = models.CharField(max_length=2, blank=True)
     latitude = models.FloatField(null=True, blank=True)
     longitude = models.FloatField(null=True, blank=True)
+    # "row:col" of the GRID_CELL_DEGREES grid cell holding the coordinates, '' without them
+    grid_cell = models.CharField(max_length=32, blank=True, default='', db_index=True)
+    # OpenWeatherMap city id, for multi-city group refreshes
+    owm_id = models.IntegerField(null=True, blank=True)
 
     class Meta:
         db_table = 'locations'
@@ -20,11 +31,29 @@ class Location(models.Model):
             )
         ]
 
+    @staticmethod
+    def grid_cell_for(latitude, longitude) -> str:
+        if latitude is None or longitude is None:
+            return ''
+        return grid_cell_key(
+            math.floor(latitude / Location.GRID_CELL_DEGREES),
+            math.floor(longitude / Location.GRID_CELL_DEGREES),
+        )
+
     def __str__(self):
         return f"{self.city}, {self.country_code}".strip(", ")
 
 
+def grid_cell_key(row: int, col: int) -> str:
+    """Longitude columns wrap at the antimeridian."""
+    return f"{row}:{col % round(360 / Location.GRID_CELL_DEGREES)}"
+
+
 class WeatherData(models.Model):
+    """
+    One upstream observation, always in metric units (°C, m/s).
+    Fahrenheit queries are converted when serialized.
+    """
     temperature = models.FloatField()
     feels_like = models.FloatField(null=True, blank=True)
     pressure = models.IntegerField(null=True, blank=True)
@@ -44,6 +73,27 @@ class WeatherData(models.Model):
         return f"{self.temperature}° — {self.description}"
 
 
+class RawResponse(models.Model):
+    """
+    Upstream API payloads stored once and shared by every query that served them.
+    Content-addressed: the digest is the SHA-256 of the canonical JSON encoding.
+    """
+    digest = models.CharField(max_length=64, unique=True)
+    payload = models.JSONField()
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'raw_responses'
+
+    @staticmethod
+    def digest_for(payload) -> str:
+        canonical = json.dumps(payload, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+        return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+    def __str__(self):
+        return self.digest[:12]
+
+
 class WeatherQuery(models.Model):
     """
     Main query log tracking all weather requests with metadata.
@@ -67,8 +117,15 @@ class WeatherQuery(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     units = models.CharField(max_length=1, choices=UNIT_CHOICES, default='C')
     served_from_cache = models.BooleanField(default=False)
+    # Served an observation past the hard TTL because the upstream circuit was open
+    is_stale = models.BooleanField(default=False)
 
-    raw_response = models.JSONField(null=True, blank=True)
+    raw_response = models.ForeignKey(
+        RawResponse,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+    )
 
     class Meta:
         db_table = 'weather_queries'
@@ -82,3 +139,51 @@ class WeatherQuery(models.Model):
 
     def __str__(self):
         return f"{self.location.city} @ {self.timestamp:%Y-%m-%d %H:%M}"
+
+
+class CityAlias(models.Model):
+    """
+    Normalized user input (see services.city_aliases.normalize_city) resolved
+    to the Location upstream returned for it, so every spelling of a city
+    shares that location's cache entries.
+    """
+    alias = models.CharField(max_length=100, unique=True)
+    location = models.ForeignKey(Location, on_delete=models.CASCADE, related_name='aliases')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'city_aliases'
+
+    def __str__(self):
+        return f"{self.alias} -> {self.location_id}"
+
+
+class LatestObservation(models.Model):
+    """
+    Current observation per location, shared by both units and all aliases.
+    Upserted on every upstream fetch so the DB cache tier is a single
+    unique-index read, independent of the query log size.
+    """
+    location = models.ForeignKey(Location, on_delete=models.CASCADE)
+    weather_data = models.ForeignKey(WeatherData, on_delete=models.CASCADE)
+    raw_response = models.ForeignKey(RawResponse, on_delete=models.SET_NULL, null=True, blank=True)
+    fetched_at = models.DateTimeField(default=timezone.now)
+    # Upstream measurement time (payload `dt`) and the per-location cadence
+    # learned from it; see services.observation_ttl
+    observed_at = models.DateTimeField(null=True, blank=True)
+    update_interval = models.FloatField(null=True, blank=True)  # seconds between observations
+    observation_lag = models.FloatField(null=True, blank=True)  # seconds from `dt` until served
+    # Soft TTL end; null for rows stored before adaptive TTLs (fetched_at + WEATHER_CACHE_TTL)
+    expires_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        db_table = 'latest_observations'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['location'],
+                name='unique_latest_observation_location'
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.location} @ {self.fetched_at:%Y-%m-%d %H:%M}"
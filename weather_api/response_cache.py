@@ -0,0 +1,88 @@
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework import serializers
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+
+from .serializers import LocationSerializer, WeatherDataSerializer, WeatherQuerySerializer
+from .services.local_cache import LocalTTLCache
+from .services.rate_limiter import rate_limit_headers
+from .services.units import convert_fields
+
+# Pre-rendered shared part of cache-hit responses, keyed per (location, units)
+# and tagged with the WeatherData id it was rendered from
+_fragments = LocalTTLCache(
+    maxsize=settings.WEATHER_LOCAL_CACHE_SIZE,
+    ttl=settings.WEATHER_CACHE_HARD_TTL,
+)
+_renderer = JSONRenderer()
+_timestamp_field = serializers.DateTimeField()
+
+
+def weather_query_response(request, weather_query, status_code: int):
+    """
+    Builds the WeatherQuerySerializer response for a weather request.
+    Cache hits reuse the rendered location/weather_data JSON and only render
+    the per-query fields, producing the same bytes as the serializer path.
+    """
+    if _can_splice(request, weather_query):
+        response = HttpResponse(
+            _render_spliced(weather_query),
+            status=status_code,
+            content_type="application/json",
+        )
+    else:
+        response = Response(WeatherQuerySerializer(weather_query).data, status=status_code)
+
+    for header, value in rate_limit_headers(getattr(weather_query, "rate_limit", None)).items():
+        response[header] = value
+    return response
+
+
+def render_weather_query(weather_query) -> bytes:
+    """Compact JSON body of a weather query, for views outside DRF content negotiation."""
+    if _can_splice_query(weather_query):
+        return _render_spliced(weather_query)
+    return _renderer.render(WeatherQuerySerializer(weather_query).data)
+
+
+def _can_splice(request, weather_query) -> bool:
+    if not _can_splice_query(weather_query):
+        return False
+    renderer = getattr(request, "accepted_renderer", None)
+    return type(renderer) is JSONRenderer and "indent" not in (request.accepted_media_type or "")
+
+
+def _can_splice_query(weather_query) -> bool:
+    if not settings.WEATHER_RESPONSE_CACHE:
+        return False
+    # Only cache hits share a body: fresh fetches carry their own raw_response
+    if not weather_query.served_from_cache or weather_query.raw_response_id is not None:
+        return False
+    return weather_query.weather_data_id is not None
+
+
+def _render_spliced(weather_query) -> bytes:
+    fragment_key = f"{weather_query.location_id}:{weather_query.units}"
+    cached = _fragments.get(fragment_key)
+
+    if cached and cached[0] == weather_query.weather_data_id:
+        shared = cached[1]
+    else:
+        shared = _renderer.render({
+            "raw_response": None,
+            "location": LocationSerializer(weather_query.location).data,
+            "weather_data": convert_fields(WeatherDataSerializer(weather_query.weather_data).data, weather_query.units),
+        })
+        _fragments.set(fragment_key, (weather_query.weather_data_id, shared))
+
+    per_query = _renderer.render({
+        "id": weather_query.id,
+        "timestamp": _timestamp_field.to_representation(weather_query.timestamp),
+        "units": weather_query.units,
+        "served_from_cache": weather_query.served_from_cache,
+        "is_stale": weather_query.is_stale,
+        "ip_address": weather_query.ip_address,
+    })
+    # '{"id":..,"ip_address":..}' + '{"raw_response":..}' -> one object, serializer field order
+    return per_query[:-1] + b"," + shared[1:]
@@ -1,5 +1,7 @@
+from django.conf import settings
 from rest_framework import serializers
 from .models import Location, WeatherData, WeatherQuery
+from .services.units import convert_fields
 
 
 class LocationSerializer(serializers.ModelSerializer):
@@ -28,6 +30,7 @@ class WeatherDataSerializer(serializers.ModelSerializer):
 class WeatherQuerySerializer(serializers.ModelSerializer):
     location = LocationSerializer()
     weather_data = WeatherDataSerializer()
+    raw_response = serializers.JSONField(source='raw_response.payload', allow_null=True, read_only=True)
 
     class Meta:
         model = WeatherQuery
@@ -36,12 +39,20 @@ class WeatherQuerySerializer(serializers.ModelSerializer):
             "timestamp",
             "units",
             "served_from_cache",
+            "is_stale",
             "ip_address",
             "raw_response",
             "location",
             "weather_data",
         ]
 
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        # Stored observations are metric; convert for Fahrenheit queries
+        if data["weather_data"] is not None:
+            convert_fields(data["weather_data"], instance.units)
+        return data
+
 
 class WeatherQueryListSerializer(serializers.ModelSerializer):
     city = serializers.CharField(source='location.city')
@@ -64,6 +75,9 @@ class WeatherQueryListSerializer(serializers.ModelSerializer):
             "served_from_cache",
         ]
 
+    def to_representation(self, instance):
+        return convert_fields(super().to_representation(instance), instance.units)
+
 
 class WeatherQueryCreateSerializer(serializers.Serializer):
     city = serializers.CharField(max_length=100, min_length=1)
@@ -76,3 +90,17 @@ class WeatherQueryCreateSerializer(serializers.Serializer):
         if len(value) > 100:
             raise serializers.ValidationError("City name too long")
         return value
+
+
+class WeatherCoordinatesSerializer(serializers.Serializer):
+    lat = serializers.FloatField(min_value=-90, max_value=90)
+    lon = serializers.FloatField(min_value=-180, max_value=180)
+    units = serializers.ChoiceField(choices=["C", "F"], default="C")
+
+
+class WeatherBatchSerializer(serializers.Serializer):
+    items = serializers.ListField(
+        child=WeatherQueryCreateSerializer(),
+        min_length=1,
+        max_length=settings.WEATHER_BATCH_MAX_ITEMS,
+    )
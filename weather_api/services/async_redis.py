@@ -0,0 +1,42 @@
+import asyncio
+import hashlib
+import weakref
+
+import redis.asyncio
+from django.conf import settings
+from redis.exceptions import NoScriptError
+
+# Async connections are bound to the event loop that opened them
+_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis() -> redis.asyncio.Redis:
+    """Async client for the default cache's Redis, one connection pool per event loop."""
+    loop = asyncio.get_running_loop()
+    client = _clients.get(loop)
+    if client is None:
+        client = redis.asyncio.Redis.from_url(
+            settings.CACHES["default"]["LOCATION"],
+            socket_timeout=settings.WEATHER_REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=settings.WEATHER_REDIS_CONNECT_TIMEOUT,
+        )
+        _clients[loop] = client
+    return client
+
+
+class LuaScript:
+    """
+    Loop-independent counterpart of redis-py's registered scripts: EVALSHA,
+    falling back to EVAL when the script is not cached on the server yet.
+    """
+
+    def __init__(self, source: str):
+        self.source = source
+        self.sha = hashlib.sha1(source.encode()).hexdigest()
+
+    async def __call__(self, keys: list, args: list):
+        client = get_async_redis()
+        try:
+            return await client.evalsha(self.sha, len(keys), *keys, *args)
+        except NoScriptError:
+            return await client.eval(self.source, len(keys), *keys, *args)
@@ -0,0 +1,94 @@
+import json
+import zlib
+
+from django.db.models.base import ModelState
+
+from ..models import Location, WeatherData
+
+# Bump whenever the field lists below change; entries with another version are cache misses
+SCHEMA_VERSION = 3
+COMPRESS_THRESHOLD = 1024  # bytes
+
+_PLAIN = b"j"
+_ZLIB = b"z"
+
+LOCATION_FIELDS = ("id", "city", "country_code", "latitude", "longitude", "grid_cell", "owm_id")
+WEATHER_DATA_FIELDS = (
+    "id",
+    "temperature",
+    "feels_like",
+    "pressure",
+    "humidity",
+    "wind_speed",
+    "wind_direction",
+    "visibility",
+    "main_weather",
+    "description",
+    "icon",
+)
+
+
+class CacheDecodeError(ValueError):
+    pass
+
+
+def encode_entry(location: Location, weather_data: WeatherData, fetched_at: float, expires_at: float) -> bytes:
+    """
+    Compact, versioned cache payload: positional field values as JSON,
+    zlib-compressed when larger than COMPRESS_THRESHOLD.
+    """
+    payload = json.dumps(
+        [
+            SCHEMA_VERSION,
+            fetched_at,
+            expires_at,
+            [getattr(location, field) for field in LOCATION_FIELDS],
+            [getattr(weather_data, field) for field in WEATHER_DATA_FIELDS],
+        ],
+        separators=(",", ":"),
+        ensure_ascii=False,
+    ).encode("utf-8")
+
+    if len(payload) > COMPRESS_THRESHOLD:
+        return _ZLIB + zlib.compress(payload, 1)
+    return _PLAIN + payload
+
+
+def decode_entry(data: bytes):
+    """
+    Returns (location, weather_data, fetched_at, expires_at) as if loaded from the database.
+    Raises CacheDecodeError for unknown formats or schema versions.
+    """
+    if not isinstance(data, bytes) or not data:
+        raise CacheDecodeError("Unsupported cache payload")
+
+    marker, body = data[:1], data[1:]
+    try:
+        if marker == _ZLIB:
+            body = zlib.decompress(body)
+        elif marker != _PLAIN:
+            raise CacheDecodeError("Unknown cache payload format")
+        version, *fields = json.loads(body)
+    except (zlib.error, ValueError, TypeError) as e:
+        raise CacheDecodeError(f"Corrupt cache payload: {e}")
+
+    if version != SCHEMA_VERSION:
+        raise CacheDecodeError(f"Cache schema version {version} != {SCHEMA_VERSION}")
+    try:
+        fetched_at, expires_at, location_values, weather_values = fields
+    except ValueError as e:
+        raise CacheDecodeError(f"Corrupt cache payload: {e}")
+
+    location = _build_instance(Location, LOCATION_FIELDS, location_values)
+    weather_data = _build_instance(WeatherData, WEATHER_DATA_FIELDS, weather_values)
+    return location, weather_data, fetched_at, expires_at
+
+
+def _build_instance(model, fields, values):
+    # Same shortcut unpickling takes: skips Model.__init__ and signal dispatch
+    instance = model.__new__(model)
+    instance.__dict__.update(zip(fields, values))
+    instance._state = ModelState()
+    instance._state.adding = False
+    instance._state.db = "default"
+    return instance
@@ -1,31 +1,742 @@
-from datetime import timedelta
+from datetime import timedelta, datetime, timezone as dt_timezone
+from django.conf import settings
 from django.utils import timezone
-from django.db import transaction
+from django.db import transaction, connection
 from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import LockError
+from concurrent.futures import ThreadPoolExecutor
+from asgiref.sync import sync_to_async
+from contextlib import asynccontextmanager
+from functools import partial
+import asyncio
 import logging
-import pickle
+import threading
+import time
+import weakref
 
-from ..models import WeatherQuery, Location, WeatherData
-from .weather_api_service import OpenWeatherAPI
-from .rate_limiter import check_rate_limit, RateLimitExceeded
+from ..models import WeatherQuery, Location, WeatherData, LatestObservation, RawResponse, CityAlias
+from .weather_api_service import OpenWeatherAPI, UpstreamUnavailable, CityNotFound
+from .rate_limiter import (
+    check_rate_limit, check_rate_limit_and_get_many,
+    acheck_rate_limit, acheck_rate_limit_and_get_many, RateLimitExceeded,
+)
+from .async_redis import get_async_redis
+from .redis_metrics import count_round_trips
+from .cache_codec import encode_entry, decode_entry, CacheDecodeError
+from .city_aliases import city_aliases, normalize_city
+from .geo import location_grid
+from .local_cache import LocalTTLCache
+from .negative_cache import negative_cache
+from .observation_ttl import observation_ttl
+from .query_log import record_query, record_queries, arecord_query
+from .redis_failover import redis_health, failover_values
+from .single_flight import SingleFlight
+from .upstream_quota import upstream_priority, BACKGROUND
 
 logger = logging.getLogger("weather")
-CACHE_TTL = timedelta(minutes=5)
+# Soft TTL: entries past their expiry are still served but refreshed in the background.
+# Each observation's expiry follows its location's upstream cadence (see observation_ttl);
+# this default applies while that is unknown. Past the hard TTL (WEATHER_CACHE_HARD_TTL)
+# Redis drops the entry and requests block on upstream.
+CACHE_TTL = timedelta(seconds=settings.WEATHER_CACHE_TTL)
+
+# Refresh coalescing: one upstream call per key across threads and workers
+REFRESH_LOCK_TTL = 10  # seconds, lease expiry if the refreshing worker dies
+REFRESH_WAIT_TIMEOUT = 6  # seconds, longer than the upstream request timeout
+REFRESH_POLL_INTERVAL = 0.05
+
+_refresh_flight = SingleFlight()
+
+ALIAS_MAX_LENGTH = CityAlias._meta.get_field('alias').max_length
+
+# Process-local tier in front of Redis; entries never outlive their soft TTL
+# there (see _cache_locally), so stale entries are always revalidated via Redis
+local_cache = LocalTTLCache(
+    maxsize=settings.WEATHER_LOCAL_CACHE_SIZE,
+    ttl=min(settings.WEATHER_LOCAL_CACHE_TTL, CACHE_TTL.total_seconds()),
+)
+
+# Stale-while-revalidate background refreshes, at most one pending per key per process
+_refresh_executor = ThreadPoolExecutor(
+    max_workers=settings.WEATHER_REFRESH_WORKERS,
+    thread_name_prefix="weather-refresh",
+)
+_pending_refreshes = set()
+_pending_lock = threading.Lock()
+
+# Redis back-fills after a DB-tier hit, kept off the request path
+_backfill_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="weather-backfill")
+
+# In-flight async refreshes per key, shared by concurrent coroutines in this process
+_async_refreshes = {}
+# Per event loop cap on async requests doing ORM work at once (see _db_access)
+_async_db_slots = weakref.WeakKeyDictionary()
+
+# Upstream calls for batch misses; bounds concurrent upstream requests per process
+_batch_executor = ThreadPoolExecutor(
+    max_workers=settings.WEATHER_BATCH_WORKERS,
+    thread_name_prefix="weather-batch",
+)
 
 
 def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = None) -> WeatherQuery:
     """
     Main weather data retrieval with multi-layer caching strategy:
-    1. Redis cache (fast, in-memory) - 5 minutes
-    2. Database cache (persistent) - 5 minutes
-    3. External API (fresh data) - with automatic cache update
+    0. Local process cache (no network) - up to WEATHER_LOCAL_CACHE_TTL
+    1. Redis cache (fast, in-memory) - fresh until the next upstream observation is due
+       (see observation_ttl), served stale up to the hard TTL
+    2. Database cache (persistent latest observation) - same soft/hard TTLs as Redis
+    3. External API (fresh data) - one coalesced call per key, with automatic cache update
+    4. Last known observation, marked is_stale - only while the upstream circuit is open
+
+    Entries are keyed by Location: the input is resolved through city aliases,
+    so every spelling of a city that upstream resolved to the same place
+    shares one entry. Before the database, a negative-cache tombstone for a
+    recently unknown or failing city re-raises that error without an upstream call.
+    Stale cache entries are returned immediately and refreshed in the background.
+    The rate-limit check and the Redis reads share one pipelined round trip.
+    The returned query carries the caller's quota as `rate_limit` and the
+    number of Redis round trips it took as `redis_round_trips`.
     """
-    check_rate_limit(ip_address)
+    normalized_city = normalize_city(city_name)
+    location_id = city_aliases.cached(normalized_city)
 
-    now = timezone.now()
-    normalized_city = city_name.strip().lower()
+    with count_round_trips() as round_trips:
+        if location_id is not None:
+            redis_cache_key = _location_cache_key(location_id)
+            local_data = local_cache.get(redis_cache_key)
+            if local_data:
+                rate_limit = check_rate_limit(ip_address)
+                cached_value = tombstone = None
+            else:
+                rate_limit, (cached_value, tombstone) = check_rate_limit_and_get_many(
+                    ip_address, [redis_cache_key, negative_cache.key(normalized_city)]
+                )
+        else:
+            # Input not seen by this worker yet: the tombstone (and the entry a
+            # concurrent refresh hands off under the input key) come with the
+            # rate-limit check, and the alias table is read only if neither is set
+            redis_cache_key = f"weather:{normalized_city}"
+            local_data = None
+            rate_limit, (cached_value, tombstone) = check_rate_limit_and_get_many(
+                ip_address, [redis_cache_key, negative_cache.key(normalized_city)]
+            )
+            if cached_value is None and tombstone is None:
+                location_id = city_aliases.lookup(normalized_city)
+                if location_id is not None:
+                    redis_cache_key = _location_cache_key(location_id)
+                    local_data = local_cache.get(redis_cache_key)
+                    cached_value = None if local_data else cache.get(redis_cache_key)
 
-    redis_cache_key = f"weather:{normalized_city}:{units}"
+        weather_query = _resolve_weather(
+            city_name, normalized_city, units, ip_address, location_id,
+            redis_cache_key, local_data, cached_value, tombstone
+        )
+
+    weather_query.rate_limit = rate_limit
+    weather_query.redis_round_trips = round_trips.count
+    return weather_query
+
+
+async def aget_weather_for_city(city_name: str, units: str = "C", ip_address: str = None) -> WeatherQuery:
+    """
+    Async get_weather_for_city for ASGI views: the same tiers, with Redis,
+    ORM reads and the upstream call awaited instead of holding a thread.
+    Persisting a fresh observation runs in a worker thread, since it needs a transaction.
+    """
+    try:
+        return await _aget_weather_for_city(city_name, units, ip_address)
+    finally:
+        # Once per request: the ORM steps above share one connection
+        await sync_to_async(_release_db_connection)()
+
+
+async def _aget_weather_for_city(city_name: str, units: str, ip_address: str) -> WeatherQuery:
+    normalized_city = normalize_city(city_name)
+    location_id = city_aliases.cached(normalized_city)
+
+    if location_id is not None:
+        redis_cache_key = _location_cache_key(location_id)
+        local_data = local_cache.get(redis_cache_key)
+        if local_data:
+            rate_limit = await acheck_rate_limit(ip_address)
+            cached_value = tombstone = None
+        else:
+            rate_limit, (cached_value, tombstone) = await acheck_rate_limit_and_get_many(
+                ip_address, [redis_cache_key, negative_cache.key(normalized_city)]
+            )
+    else:
+        redis_cache_key = f"weather:{normalized_city}"
+        local_data = None
+        rate_limit, (cached_value, tombstone) = await acheck_rate_limit_and_get_many(
+            ip_address, [redis_cache_key, negative_cache.key(normalized_city)]
+        )
+        if cached_value is None and tombstone is None:
+            async with _db_access():
+                location_id = await city_aliases.alookup(normalized_city)
+            if location_id is not None:
+                redis_cache_key = _location_cache_key(location_id)
+                local_data = local_cache.get(redis_cache_key)
+                if not local_data:
+                    cached_value = await _aread_redis_value(redis_cache_key)
+
+    weather_query = await _aresolve_weather(
+        city_name, normalized_city, units, ip_address, location_id,
+        redis_cache_key, local_data, cached_value, tombstone
+    )
+    weather_query.rate_limit = rate_limit
+    return weather_query
+
+
+async def _aresolve_weather(city_name: str, normalized_city: str, units: str, ip_address: str, location_id,
+                            redis_cache_key: str, local_data, cached_value, tombstone) -> WeatherQuery:
+    cached_entry = local_data or _decode_redis_entry(cached_value)
+    if cached_entry:
+        location, weather_data, fetched_at, expires_at = cached_entry
+        if not local_data:
+            _cache_locally(redis_cache_key, cached_entry)
+        _revalidate_if_stale(city_name, normalized_city, redis_cache_key, fetched_at, expires_at)
+        return await _arecord_query(
+            location=location,
+            weather_data=weather_data,
+            units=units,
+            ip_address=ip_address,
+            served_from_cache=True,
+            raw_response=None,
+        )
+
+    latest = None
+    if location_id is not None:
+        async with _db_access():
+            latest = await LatestObservation.objects.filter(
+                location_id=location_id,
+                fetched_at__gte=timezone.now() - timedelta(seconds=settings.WEATHER_CACHE_HARD_TTL),
+            ).select_related('location', 'weather_data', 'raw_response').afirst()
+
+    if latest:
+        fetched_at, expires_at = _observation_times(latest)
+        _cache_locally(redis_cache_key, (latest.location, latest.weather_data, fetched_at, expires_at))
+        _backfill_executor.submit(
+            _backfill_redis, redis_cache_key, latest.location, latest.weather_data, fetched_at, expires_at
+        )
+        _revalidate_if_stale(city_name, normalized_city, redis_cache_key, fetched_at, expires_at)
+        return await _arecord_query(
+            location=latest.location,
+            weather_data=latest.weather_data,
+            units=units,
+            ip_address=ip_address,
+            served_from_cache=True,
+            raw_response=latest.raw_response,
+        )
+
+    try:
+        negative_cache.raise_if_tombstoned(normalized_city, tombstone)
+    except UpstreamUnavailable:
+        return await _aserve_last_known(location_id, units, ip_address)
+
+    logger.info(
+        "All cache miss - fetching from external API",
+        extra={
+            'ip': ip_address or 'unknown',
+            'event': 'api_fetch',
+            'city': normalized_city,
+            'units': units,
+        }
+    )
+
+    try:
+        (location, weather_data, raw_response), shared = await _ashared_refresh(
+            city_name, normalized_city, redis_cache_key
+        )
+    except UpstreamUnavailable:
+        return await _aserve_last_known(location_id, units, ip_address)
+
+    served_from_cache = shared or raw_response is None
+    return await _arecord_query(
+        location=location,
+        weather_data=weather_data,
+        units=units,
+        ip_address=ip_address,
+        served_from_cache=served_from_cache,
+        raw_response=None if served_from_cache else raw_response,
+    )
+
+
+async def _aserve_last_known(location_id, units: str, ip_address: str) -> WeatherQuery:
+    """Async _serve_last_known."""
+    latest = None
+    if location_id is not None:
+        async with _db_access():
+            latest = await LatestObservation.objects.filter(
+                location_id=location_id,
+            ).select_related('location', 'weather_data').afirst()
+    if latest is None:
+        raise UpstreamUnavailable("Weather service temporarily unavailable")
+    return await _arecord_query(
+        location=latest.location,
+        weather_data=latest.weather_data,
+        units=units,
+        ip_address=ip_address,
+        served_from_cache=True,
+        is_stale=True,
+        raw_response=None,
+    )
+
+
+async def _ashared_refresh(city_name: str, normalized_city: str, redis_cache_key: str):
+    """In-process coalescing for coroutines; returns (result, shared)."""
+    task = _async_refreshes.get(redis_cache_key)
+    if task is not None:
+        return await asyncio.shield(task), True
+
+    task = asyncio.ensure_future(_acoalesced_refresh(city_name, normalized_city, redis_cache_key))
+    _async_refreshes[redis_cache_key] = task
+    task.add_done_callback(lambda done: _async_refreshes.pop(redis_cache_key, None))
+    # Shielded so a disconnecting client does not cancel the fetch others wait on
+    return await asyncio.shield(task), False
+
+
+async def _acoalesced_refresh(city_name: str, normalized_city: str, redis_cache_key: str):
+    """
+    Async _coalesced_refresh: same Redis lease, polled with asyncio.sleep.
+    Without Redis the lease is skipped; _ashared_refresh still coalesces this process.
+    """
+    lock = get_async_redis().lock(cache.make_key(f"lock:{redis_cache_key}"), timeout=REFRESH_LOCK_TTL)
+    acquired = await redis_health.acall("lock", lambda: lock.acquire(blocking=False), lambda: None)
+    if acquired is None:
+        return await _afetch_and_store(city_name, normalized_city, redis_cache_key)
+
+    if acquired:
+        try:
+            cached_entry = _decode_redis_entry(await _aread_redis_value(redis_cache_key))
+            if cached_entry and not _is_stale(cached_entry[3]):
+                _cache_locally(redis_cache_key, cached_entry)
+                return cached_entry[0], cached_entry[1], None
+            return await _afetch_and_store(city_name, normalized_city, redis_cache_key)
+        finally:
+            try:
+                await redis_health.acall("unlock", lock.release, lambda: None)
+            except LockError:
+                pass
+
+    deadline = time.monotonic() + REFRESH_WAIT_TIMEOUT
+    while time.monotonic() < deadline and not redis_health.is_open:
+        await asyncio.sleep(REFRESH_POLL_INTERVAL)
+        cached_value, tombstone, leased = await _aread_refresh_state(redis_cache_key, normalized_city)
+        cached_entry = _decode_redis_entry(cached_value)
+        if cached_entry:
+            _cache_locally(redis_cache_key, cached_entry)
+            return cached_entry[0], cached_entry[1], None
+        negative_cache.raise_if_tombstoned(normalized_city, tombstone)
+        if not leased:
+            break
+
+    return await _afetch_and_store(city_name, normalized_city, redis_cache_key)
+
+
+async def _afetch_and_store(city_name: str, normalized_city: str, redis_cache_key: str):
+    # Hold no connection while waiting on upstream
+    await sync_to_async(_release_db_connection)()
+    try:
+        raw_data = await OpenWeatherAPI.afetch_weather(city_name)
+        async with _db_access():
+            return await sync_to_async(_store_observation)(normalized_city, redis_cache_key, raw_data)
+    except Exception as e:
+        _log_api_error(normalized_city, e)
+        await sync_to_async(negative_cache.remember)(normalized_city, e)
+        raise
+
+
+async def _arecord_query(**fields) -> WeatherQuery:
+    async with _db_access():
+        return await arecord_query(**fields)
+
+
+@asynccontextmanager
+async def _db_access():
+    """
+    Wraps each ORM step of the async path. Under ASGI every in-flight request
+    has its own thread and so its own Postgres connection; this caps how many
+    run ORM work at once (WEATHER_ASYNC_DB_CONCURRENCY). The connection is
+    kept across a request's steps and closed once, when the request ends or
+    before it waits on upstream, so requests waiting on upstream hold none.
+    """
+    loop = asyncio.get_running_loop()
+    slots = _async_db_slots.get(loop)
+    if slots is None:
+        slots = _async_db_slots[loop] = asyncio.Semaphore(settings.WEATHER_ASYNC_DB_CONCURRENCY)
+
+    async with slots:
+        yield
+
+
+def _release_db_connection():
+    # Inside a transaction (e.g. a test case) the connection is still in use
+    if not connection.in_atomic_block:
+        connection.close()
+
+
+def _decode_async_value(raw):
+    """Undoes django-redis value encoding for reads made on the raw async client."""
+    return cache.client.decode(raw) if raw is not None else None
+
+
+async def _aread_redis_value(redis_cache_key: str):
+    """Async cache.get() on the raw async client, from the failover tier while Redis is unavailable."""
+    cache_key = cache.make_key(redis_cache_key)
+    return await redis_health.acall(
+        "get",
+        lambda: _aget_decoded(cache_key),
+        lambda: failover_values([cache_key])[0],
+    )
+
+
+async def _aget_decoded(cache_key: str):
+    return _decode_async_value(await get_async_redis().get(cache_key))
+
+
+def _refresh_state_keys(redis_cache_key: str, normalized_city: str) -> list:
+    return [
+        cache.make_key(redis_cache_key),
+        cache.make_key(negative_cache.key(normalized_city)),
+        cache.make_key(f"lock:{redis_cache_key}"),
+    ]
+
+
+def _read_refresh_state(redis_cache_key: str, normalized_city: str):
+    """
+    What a worker waiting on another's refresh lease polls, in one MGET:
+    (entry value, negative-cache tombstone, whether the lease is still held).
+    """
+    keys = _refresh_state_keys(redis_cache_key, normalized_city)
+
+    def read():
+        cached_value, tombstone, lease = get_redis_connection("default").mget(keys)
+        return _decode_async_value(cached_value), _decode_async_value(tombstone), lease is not None
+
+    return redis_health.call("get", read, lambda: (*failover_values(keys[:2]), False))
+
+
+async def _aread_refresh_state(redis_cache_key: str, normalized_city: str):
+    """Async _read_refresh_state."""
+    keys = _refresh_state_keys(redis_cache_key, normalized_city)
+
+    async def read():
+        cached_value, tombstone, lease = await get_async_redis().mget(keys)
+        return _decode_async_value(cached_value), _decode_async_value(tombstone), lease is not None
+
+    return await redis_health.acall("get", read, lambda: (*failover_values(keys[:2]), False))
+
+
+def get_weather_for_coordinates(latitude: float, longitude: float, units: str = "C",
+                                ip_address: str = None) -> WeatherQuery:
+    """
+    Weather at a point. The nearest location within WEATHER_COORDS_RADIUS_KM
+    that upstream already resolved (see geo.LocationGrid) is served through
+    the same tiers as get_weather_for_city, so nearby clients share its cache
+    entry. A miss on that entry is refreshed by the location's OpenWeatherMap
+    id, or by the point it was matched at, never by its name, which upstream
+    may resolve to another place. Otherwise upstream resolves the coordinates
+    to a location, which later requests near that point then share.
+    """
+    match = location_grid.nearest(latitude, longitude, settings.WEATHER_COORDS_RADIUS_KM)
+
+    with count_round_trips() as round_trips:
+        if match:
+            location_id, match_latitude, match_longitude, city, country_code, owm_id, distance_km = match
+            if owm_id is not None:
+                fetch = partial(OpenWeatherAPI.fetch_weather_by_id, owm_id)
+            else:
+                fetch = partial(OpenWeatherAPI.fetch_weather_by_coordinates, match_latitude, match_longitude)
+            city_name = _upstream_query(city, country_code)
+            redis_cache_key = _location_cache_key(location_id)
+            local_data = local_cache.get(redis_cache_key)
+            if local_data:
+                rate_limit = check_rate_limit(ip_address)
+                cached_value = None
+            else:
+                rate_limit, (cached_value,) = check_rate_limit_and_get_many(ip_address, [redis_cache_key])
+
+            weather_query = _resolve_weather(
+                city_name, normalize_city(city_name), units, ip_address, location_id,
+                redis_cache_key, local_data, cached_value, None, fetch
+            )
+        else:
+            rate_limit = check_rate_limit(ip_address)
+            weather_query = _resolve_coordinates(latitude, longitude, units, ip_address)
+
+    weather_query.rate_limit = rate_limit
+    weather_query.redis_round_trips = round_trips.count
+    return weather_query
+
+
+def _resolve_coordinates(latitude: float, longitude: float, units: str, ip_address: str) -> WeatherQuery:
+    """Upstream lookup for coordinates no known location is near; identical points in flight share one call."""
+    point = f"{latitude:.3f},{longitude:.3f}"
+    logger.info(
+        "No location near coordinates - fetching from external API",
+        extra={
+            'ip': ip_address or 'unknown',
+            'event': 'api_fetch',
+            'coordinates': point,
+            'units': units,
+        }
+    )
+
+    def fetch():
+        try:
+            raw_data = OpenWeatherAPI.fetch_weather_by_coordinates(latitude, longitude)
+            if not raw_data.get("name"):
+                raise CityNotFound("No named location at these coordinates")
+            stored = _store_observation(normalize_city(raw_data["name"]), None, raw_data)
+        except Exception as e:
+            _log_api_error(point, e)
+            raise
+        location_grid.add(stored[0], latitude, longitude)
+        return stored
+
+    try:
+        (location, weather_data, raw_response), shared = _refresh_flight.do(
+            f"weather:coords:{point}", fetch, timeout=REFRESH_WAIT_TIMEOUT
+        )
+    except TimeoutError:
+        (location, weather_data, raw_response), shared = fetch(), False
+
+    return record_query(
+        location=location,
+        weather_data=weather_data,
+        units=units,
+        ip_address=ip_address,
+        served_from_cache=shared,
+        raw_response=None if shared else raw_response,
+    )
+
+
+def get_weather_for_cities(items: list, ip_address: str = None):
+    """
+    Batch variant of get_weather_for_city for [(city_name, units), ...].
+    The batch takes one rate-limit slot, plus one per city beyond the first
+    that has to be fetched from upstream; misses the remaining budget cannot
+    cover fail with RateLimitExceeded. Redis hits come from one pipelined
+    MGET, DB hits from one query, and misses are fetched from upstream
+    concurrently on a bounded pool, under the same per-key refresh lease as
+    single lookups; query log rows are written with one bulk_create.
+
+    Returns (results, rate_limit), where results[i] is the WeatherQuery for
+    items[i] or the exception that item failed with.
+    """
+    normalized = [normalize_city(city_name) for city_name, units in items]
+    location_ids = city_aliases.resolve_many(normalized)
+
+    keys = []
+    unique = {}
+    for (city_name, units), normalized_city in zip(items, normalized):
+        location_id = location_ids.get(normalized_city)
+        key = _location_cache_key(location_id) if location_id is not None else f"weather:{normalized_city}"
+        keys.append((units, key))
+        unique.setdefault(key, (city_name, normalized_city, location_id))
+
+    # key -> dict of WeatherQuery fields, or the exception for that key
+    resolved = {}
+    remote_keys = []
+    for key, (city_name, normalized_city, location_id) in unique.items():
+        local_data = local_cache.get(key)
+        if local_data:
+            location, weather_data, fetched_at, expires_at = local_data
+            _revalidate_if_stale(city_name, normalized_city, key, fetched_at, expires_at)
+            resolved[key] = _cached_fields(location, weather_data)
+        else:
+            remote_keys.append(key)
+
+    # Entries and negative-cache tombstones for all remote keys in one MGET
+    tombstone_keys = [negative_cache.key(unique[key][1]) for key in remote_keys]
+    rate_limit, values = check_rate_limit_and_get_many(ip_address, remote_keys + tombstone_keys)
+    cached_values, tombstones = values[:len(remote_keys)], values[len(remote_keys):]
+
+    db_keys = []
+    # key -> UpstreamUnavailable for recently failing cities: the database tier
+    # and the last known observation are tried, upstream is not
+    unavailable = {}
+    for key, cached_value, tombstone in zip(remote_keys, cached_values, tombstones):
+        cached_entry = _decode_redis_entry(cached_value)
+        if cached_entry is None:
+            try:
+                negative_cache.raise_if_tombstoned(unique[key][1], tombstone)
+            except CityNotFound as e:
+                resolved[key] = e
+                continue
+            except UpstreamUnavailable as e:
+                unavailable[key] = e
+            db_keys.append(key)
+            continue
+        city_name, normalized_city, location_id = unique[key]
+        location, weather_data, fetched_at, expires_at = cached_entry
+        _cache_locally(key, cached_entry)
+        _revalidate_if_stale(city_name, normalized_city, key, fetched_at, expires_at)
+        resolved[key] = _cached_fields(location, weather_data)
+
+    upstream_keys = []
+    latest_by_location = _latest_observations([unique[key][2] for key in db_keys if unique[key][2] is not None])
+    for key in db_keys:
+        city_name, normalized_city, location_id = unique[key]
+        latest = latest_by_location.get(location_id)
+        if latest is None and key in unavailable:
+            resolved[key] = _last_known_fields(location_id, unavailable[key])
+            continue
+        if latest is None:
+            upstream_keys.append(key)
+            continue
+        fetched_at, expires_at = _observation_times(latest)
+        _cache_locally(key, (latest.location, latest.weather_data, fetched_at, expires_at))
+        _backfill_executor.submit(
+            _backfill_redis, key, latest.location, latest.weather_data, fetched_at, expires_at
+        )
+        _revalidate_if_stale(city_name, normalized_city, key, fetched_at, expires_at)
+        resolved[key] = _cached_fields(latest.location, latest.weather_data, latest.raw_response)
+
+    if len(upstream_keys) > 1:
+        # Cached cities are cheap; upstream misses cost as much as single lookups
+        try:
+            rate_limit = check_rate_limit(ip_address, cost=len(upstream_keys) - 1)
+        except RateLimitExceeded as e:
+            for key in upstream_keys:
+                resolved[key] = e
+            upstream_keys = []
+            rate_limit = e.status
+
+    if upstream_keys:
+        logger.info(
+            "Batch cache miss - fetching from external API",
+            extra={
+                'ip': ip_address or 'unknown',
+                'event': 'batch_api_fetch',
+                'count': len(upstream_keys),
+            }
+        )
+
+    # Misses take the same per-key refresh lease as single lookups (see
+    # _coalesced_refresh): keys leased elsewhere wait for that worker's result
+    leases = {}
+    waiting = []
+    for key in upstream_keys:
+        lock = cache.lock(f"lock:{key}", timeout=REFRESH_LOCK_TTL)
+        if lock.acquire(blocking=False):
+            leases[key] = lock
+        else:
+            waiting.append(key)
+
+    try:
+        if leases:
+            # Another worker may have finished a refresh between our miss and the lease
+            refreshed = cache.get_many(list(leases))
+            for key, cached_value in refreshed.items():
+                cached_entry = _decode_redis_entry(cached_value)
+                if cached_entry and not _is_stale(cached_entry[3]):
+                    _cache_locally(key, cached_entry)
+                    resolved[key] = _cached_fields(cached_entry[0], cached_entry[1])
+
+        # Only the HTTP calls run on the pool; persisting stays on this thread and connection
+        futures = {
+            key: _batch_executor.submit(OpenWeatherAPI.fetch_weather, unique[key][0])
+            for key in leases if key not in resolved
+        }
+        deadline = time.monotonic() + REFRESH_WAIT_TIMEOUT
+        for key in waiting:
+            city_name, normalized_city, location_id = unique[key]
+            try:
+                cached_entry = _wait_for_refresh(normalized_city, key, deadline)
+            except CityNotFound as e:
+                resolved[key] = e
+                continue
+            except UpstreamUnavailable as e:
+                resolved[key] = _last_known_fields(location_id, e)
+                continue
+            if cached_entry is None:
+                futures[key] = _batch_executor.submit(OpenWeatherAPI.fetch_weather, city_name)
+            else:
+                resolved[key] = _cached_fields(cached_entry[0], cached_entry[1])
+
+        for key, future in futures.items():
+            city_name, normalized_city, location_id = unique[key]
+            try:
+                location, weather_data, raw_response = _store_observation(normalized_city, key, future.result())
+                resolved[key] = {
+                    "location": location,
+                    "weather_data": weather_data,
+                    "served_from_cache": False,
+                    "raw_response": raw_response,
+                }
+            except UpstreamUnavailable as e:
+                resolved[key] = _last_known_fields(location_id, e)
+            except Exception as e:
+                _log_api_error(normalized_city, e)
+                negative_cache.remember(normalized_city, e)
+                resolved[key] = e
+    finally:
+        for lock in leases.values():
+            try:
+                lock.release()
+            except LockError:
+                pass
+
+    results = []
+    queries = []
+    for units, key in keys:
+        fields = resolved[key]
+        if isinstance(fields, Exception):
+            results.append(fields)
+            continue
+        query = WeatherQuery(units=units, ip_address=ip_address, **fields)
+        results.append(query)
+        queries.append(query)
+        if not fields["served_from_cache"]:
+            # Repeats of a freshly fetched city in the same batch are cache hits
+            resolved[key] = _cached_fields(fields["location"], fields["weather_data"])
+
+    record_queries(queries)
+    return results, rate_limit
+
+
+def _cached_fields(location: Location, weather_data: WeatherData, raw_response: RawResponse = None) -> dict:
+    return {
+        "location": location,
+        "weather_data": weather_data,
+        "served_from_cache": True,
+        "raw_response": raw_response,
+    }
+
+
+def _last_known_fields(location_id, error: UpstreamUnavailable):
+    """Batch counterpart of _serve_last_known: stale WeatherQuery fields, or `error` without an observation."""
+    latest = _last_known_observation(location_id)
+    if latest is None:
+        return error
+    return dict(_cached_fields(latest.location, latest.weather_data), is_stale=True)
+
+
+def _latest_observations(location_ids: list) -> dict:
+    """One query for several locations' observations within the hard TTL."""
+    if not location_ids:
+        return {}
+    cutoff = timezone.now() - timedelta(seconds=settings.WEATHER_CACHE_HARD_TTL)
+    observations = LatestObservation.objects.filter(
+        location_id__in=set(location_ids),
+        fetched_at__gte=cutoff,
+    ).select_related('location', 'weather_data', 'raw_response')
+    return {latest.location_id: latest for latest in observations}
+
+
+def _resolve_weather(city_name: str, normalized_city: str, units: str, ip_address: str, location_id,
+                     redis_cache_key: str, local_data, cached_value, tombstone, fetch=None) -> WeatherQuery:
+    """
+    Serves the request from the first tier that has the key. `local_data`,
+    `cached_value` and `tombstone` are the L0 entry, the Redis value and the
+    negative-cache value already read by the caller; `location_id` is None
+    for inputs no alias resolves yet, which skip the database tier. `fetch`
+    replaces the upstream lookup by `city_name` on refreshes (see _fetch_and_store).
+    """
+    now = timezone.now()
 
     logger.info(
         "Checking cache for city",
@@ -37,8 +748,31 @@ def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = Non
         }
     )
 
-    cached_data = cache.get(redis_cache_key)
-    if cached_data:
+    if local_data:
+        logger.info(
+            "Local cache hit - using cached data",
+            extra={
+                'ip': ip_address or 'unknown',
+                'event': 'local_cache_hit',
+                'city': normalized_city,
+                'units': units,
+            }
+        )
+        location, weather_data, fetched_at, expires_at = local_data
+        _revalidate_if_stale(city_name, normalized_city, redis_cache_key, fetched_at, expires_at, fetch)
+
+        new_query = record_query(
+            location=location,
+            weather_data=weather_data,
+            units=units,
+            ip_address=ip_address,
+            served_from_cache=True,
+            raw_response=None,
+        )
+        return new_query
+
+    cached_entry = _decode_redis_entry(cached_value)
+    if cached_entry:
         logger.info(
             "Redis cache hit - using cached data",
             extra={
@@ -48,9 +782,11 @@ def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = Non
                 'units': units,
             }
         )
-        location, weather_data = pickle.loads(cached_data)
+        location, weather_data, fetched_at, expires_at = cached_entry
+        _cache_locally(redis_cache_key, cached_entry)
+        _revalidate_if_stale(city_name, normalized_city, redis_cache_key, fetched_at, expires_at, fetch)
 
-        new_query = WeatherQuery.objects.create(
+        new_query = record_query(
             location=location,
             weather_data=weather_data,
             units=units,
@@ -70,13 +806,14 @@ def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = Non
         }
     )
 
-    last_query = WeatherQuery.objects.filter(
-        location__city__iexact=normalized_city,
-        units=units,
-        timestamp__gte=now - CACHE_TTL
-    ).select_related('location', 'weather_data').order_by('-timestamp').first()
+    latest = None
+    if location_id is not None:
+        latest = LatestObservation.objects.filter(
+            location_id=location_id,
+            fetched_at__gte=now - timedelta(seconds=settings.WEATHER_CACHE_HARD_TTL),
+        ).select_related('location', 'weather_data', 'raw_response').first()
 
-    if last_query and last_query.weather_data:
+    if latest:
         logger.info(
             "Database cache hit - using cached data",
             extra={
@@ -87,19 +824,29 @@ def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = Non
             }
         )
 
-        cache_data = pickle.dumps((last_query.location, last_query.weather_data))
-        cache.set(redis_cache_key, cache_data, timeout=300)
+        fetched_at, expires_at = _observation_times(latest)
+        _cache_locally(redis_cache_key, (latest.location, latest.weather_data, fetched_at, expires_at))
+        _backfill_executor.submit(
+            _backfill_redis, redis_cache_key, latest.location, latest.weather_data, fetched_at, expires_at
+        )
+        _revalidate_if_stale(city_name, normalized_city, redis_cache_key, fetched_at, expires_at, fetch)
 
-        new_query = WeatherQuery.objects.create(
-            location=last_query.location,
-            weather_data=last_query.weather_data,
+        new_query = record_query(
+            location=latest.location,
+            weather_data=latest.weather_data,
             units=units,
             ip_address=ip_address,
             served_from_cache=True,
-            raw_response=last_query.raw_response,
+            raw_response=latest.raw_response,
         )
         return new_query
 
+    # Checked after the database tier: a recent upstream error should not hide a usable observation
+    try:
+        negative_cache.raise_if_tombstoned(normalized_city, tombstone)
+    except UpstreamUnavailable:
+        return _serve_last_known(location_id, normalized_city, units, ip_address)
+
     logger.info(
         "All cache miss - fetching from external API",
         extra={
@@ -110,71 +857,529 @@ def get_weather_for_city(city_name: str, units: str = "C", ip_address: str = Non
         }
     )
 
+    def refresh():
+        return _coalesced_refresh(city_name, normalized_city, redis_cache_key, fetch)
+
     try:
-        raw_data = OpenWeatherAPI.fetch_weather(city_name, units)
+        try:
+            (location, weather_data, raw_response), shared = _refresh_flight.do(
+                redis_cache_key, refresh, timeout=REFRESH_WAIT_TIMEOUT
+            )
+        except TimeoutError:
+            logger.warning(
+                "Timed out waiting for in-flight refresh - fetching directly",
+                extra={
+                    'ip': ip_address or 'unknown',
+                    'event': 'refresh_wait_timeout',
+                    'city': normalized_city,
+                    'units': units,
+                }
+            )
+            location, weather_data, raw_response = refresh()
+            shared = False
+    except UpstreamUnavailable:
+        return _serve_last_known(location_id, normalized_city, units, ip_address)
 
-        logger.info(
-            "External API response received successfully",
+    # raw_response is None when another caller's refresh produced the data
+    served_from_cache = shared or raw_response is None
+
+    new_query = record_query(
+        location=location,
+        weather_data=weather_data,
+        units=units,
+        ip_address=ip_address,
+        served_from_cache=served_from_cache,
+        raw_response=None if served_from_cache else raw_response,
+    )
+    return new_query
+
+
+def _serve_last_known(location_id, normalized_city: str, units: str, ip_address: str) -> WeatherQuery:
+    """
+    Upstream circuit is open: serve the last observation regardless of age,
+    marked stale. Re-raises UpstreamUnavailable when there is none.
+    """
+    latest = _last_known_observation(location_id)
+    if latest is None:
+        raise UpstreamUnavailable("Weather service temporarily unavailable")
+
+    logger.warning(
+        "Upstream unavailable - serving last known observation",
+        extra={
+            'ip': ip_address or 'unknown',
+            'event': 'stale_fallback',
+            'city': normalized_city,
+            'units': units,
+        }
+    )
+    return record_query(
+        location=latest.location,
+        weather_data=latest.weather_data,
+        units=units,
+        ip_address=ip_address,
+        served_from_cache=True,
+        is_stale=True,
+        raw_response=None,
+    )
+
+
+def _last_known_observation(location_id):
+    """Latest observation regardless of age, or None (also for an unresolved location)."""
+    if location_id is None:
+        return None
+    return LatestObservation.objects.filter(
+        location_id=location_id,
+    ).select_related('location', 'weather_data').first()
+
+
+def _store_raw_response(payload: dict) -> RawResponse:
+    """Content-addressed insert: identical upstream payloads share one row."""
+    raw_response, created = RawResponse.objects.get_or_create(
+        digest=RawResponse.digest_for(payload),
+        defaults={"payload": payload},
+    )
+    return raw_response
+
+
+def _location_cache_key(location_id: int) -> str:
+    return f"weather:loc:{location_id}"
+
+
+def _upstream_query(city: str, country_code: str) -> str:
+    """Upstream query for a known location; the country keeps the name unambiguous."""
+    return f"{city},{country_code}" if country_code else city
+
+
+def _cache_locally(redis_cache_key: str, entry: tuple):
+    """Keeps (location, weather_data, fetched_at, expires_at) in the local tier until expires_at at most."""
+    ttl = min(local_cache.ttl, entry[3] - time.time())
+    if ttl > 0:
+        local_cache.set(redis_cache_key, entry, ttl=ttl)
+
+
+def _read_redis_entry(redis_cache_key: str):
+    """Returns (location, weather_data, fetched_at, expires_at), or None on a miss or an undecodable entry."""
+    return _decode_redis_entry(cache.get(redis_cache_key))
+
+
+def _decode_redis_entry(cached_data):
+    if not cached_data:
+        return None
+
+    try:
+        return decode_entry(cached_data)
+    except CacheDecodeError as e:
+        logger.warning(
+            "Discarding undecodable cache entry",
             extra={
-                'ip': ip_address or 'unknown',
-                'event': 'api_success',
-                'city': normalized_city,
-                'units': units,
+                'event': 'cache_decode_error',
+                'error': str(e),
+            }
+        )
+        return None
+
+
+def _write_cache_entry(redis_cache_key: str, location: Location, weather_data: WeatherData,
+                       fetched_at: float, expires_at: float):
+    cache.set(
+        redis_cache_key,
+        encode_entry(location, weather_data, fetched_at, expires_at),
+        timeout=settings.WEATHER_CACHE_HARD_TTL,
+    )
+    _cache_locally(redis_cache_key, (location, weather_data, fetched_at, expires_at))
+
+
+def _backfill_redis(redis_cache_key: str, location: Location, weather_data: WeatherData,
+                    fetched_at: float, expires_at: float):
+    try:
+        # add(): never overwrite an entry a concurrent refresh wrote meanwhile
+        cache.add(
+            redis_cache_key,
+            encode_entry(location, weather_data, fetched_at, expires_at),
+            timeout=settings.WEATHER_CACHE_HARD_TTL,
+        )
+    except Exception as e:
+        # The next miss back-fills again; the request was already served from the DB
+        logger.warning(
+            "Failed to back-fill Redis from database cache",
+            extra={
+                'event': 'cache_backfill_error',
+                'error': str(e),
             }
         )
 
-        location_data = OpenWeatherAPI.normalize_location_data(raw_data)
-        weather_data_dict = OpenWeatherAPI.normalize_weather_data(raw_data)
 
-        with transaction.atomic():
-            location_city = location_data["city"].lower().strip() if location_data.get("city") else normalized_city
+def _is_stale(expires_at: float) -> bool:
+    return time.time() > expires_at
+
+
+def _observation_times(latest: LatestObservation):
+    """(fetched_at, expires_at) of a database-tier entry, as epoch seconds."""
+    fetched_at = latest.fetched_at.timestamp()
+    expires_at = latest.expires_at.timestamp() if latest.expires_at else None
+    return fetched_at, observation_ttl.expiry(fetched_at, expires_at)
+
+
+def _observation_history(location: Location):
+    """(observed_at, update_interval, observation_lag) stored for the location, or None."""
+    previous = LatestObservation.objects.filter(location=location).values_list(
+        'observed_at', 'update_interval', 'observation_lag'
+    ).first()
+    if previous is None:
+        return None
+    observed_at, update_interval, observation_lag = previous
+    return observed_at and observed_at.timestamp(), update_interval, observation_lag
+
+
+def _from_timestamp(value):
+    return datetime.fromtimestamp(value, tz=dt_timezone.utc) if value is not None else None
+
+
+def _revalidate_if_stale(city_name: str, normalized_city: str, redis_cache_key: str,
+                         fetched_at: float, expires_at: float, fetch=None):
+    """Schedules a single background refresh for an entry past the soft TTL."""
+    if not _is_stale(expires_at):
+        observation_ttl.note_current(redis_cache_key, fetched_at)
+        return
+
+    with _pending_lock:
+        if redis_cache_key in _pending_refreshes:
+            return
+        _pending_refreshes.add(redis_cache_key)
+
+    logger.info(
+        "Serving stale cache entry - scheduling background refresh",
+        extra={
+            'event': 'stale_cache_hit',
+            'city': normalized_city,
+        }
+    )
+    _refresh_executor.submit(_background_refresh, city_name, normalized_city, redis_cache_key, fetch)
+
+
+def _background_refresh(city_name: str, normalized_city: str, redis_cache_key: str, fetch=None):
+    lock = cache.lock(f"lock:{redis_cache_key}", timeout=REFRESH_LOCK_TTL)
+    try:
+        # Another worker already holds the lease and is refreshing this key
+        if not lock.acquire(blocking=False):
+            return
+        try:
+            with upstream_priority(BACKGROUND):
+                _fetch_and_store(city_name, normalized_city, redis_cache_key, fetch)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
+    except Exception:
+        # Already logged by _fetch_and_store; the stale entry keeps being served
+        pass
+    finally:
+        with _pending_lock:
+            _pending_refreshes.discard(redis_cache_key)
+        connection.close()
 
-            location, created = Location.objects.get_or_create(
-                city=location_city,
-                country_code=location_data.get("country_code", ""),
-                defaults={
-                    "city": location_city,
-                    "country_code": location_data.get("country_code", ""),
-                    "latitude": location_data.get("latitude"),
-                    "longitude": location_data.get("longitude"),
+
+def refresh_location(location_id: int, city: str, country_code: str) -> bool:
+    """
+    Re-fetches a known location's observation ahead of expiry, for the hot-city
+    refresher, at background upstream priority. Returns False without calling
+    upstream when another worker holds the key's refresh lease; upstream errors propagate.
+    """
+    city_name = _upstream_query(city, country_code)
+    redis_cache_key = _location_cache_key(location_id)
+    lock = cache.lock(f"lock:{redis_cache_key}", timeout=REFRESH_LOCK_TTL)
+    if not lock.acquire(blocking=False):
+        return False
+    try:
+        with upstream_priority(BACKGROUND):
+            _fetch_and_store(city_name, normalize_city(city_name), redis_cache_key)
+        return True
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            pass
+
+
+def refresh_locations(locations: list) -> dict:
+    """
+    Re-fetches several known locations for the hot-city refresher. `locations`
+    holds (location_id, city, country_code, owm_id) tuples; those with an
+    OpenWeatherMap id go GROUP_MAX_IDS per upstream call, the rest one call
+    each via refresh_location, all at background upstream priority.
+    Returns {location_id: True if refreshed, False if another worker holds
+    its lease, or the exception it failed with}.
+    """
+    results = {}
+    grouped = []
+    for location_id, city, country_code, owm_id in locations:
+        if owm_id is not None:
+            grouped.append((location_id, city, country_code, owm_id))
+            continue
+        try:
+            results[location_id] = refresh_location(location_id, city, country_code)
+        except Exception as e:
+            results[location_id] = e
+
+    for start in range(0, len(grouped), OpenWeatherAPI.GROUP_MAX_IDS):
+        results.update(_refresh_group(grouped[start:start + OpenWeatherAPI.GROUP_MAX_IDS]))
+    return results
+
+
+def _refresh_group(locations: list) -> dict:
+    """One group call for the locations whose refresh lease this worker gets."""
+    results = {}
+    leased = []
+    for location in locations:
+        lock = cache.lock(f"lock:{_location_cache_key(location[0])}", timeout=REFRESH_LOCK_TTL)
+        if lock.acquire(blocking=False):
+            leased.append((location, lock))
+        else:
+            results[location[0]] = False
+
+    try:
+        if leased:
+            with upstream_priority(BACKGROUND):
+                payloads = OpenWeatherAPI.fetch_group([owm_id for (*_, owm_id), lock in leased])
+            logger.info(
+                "Group response received successfully",
+                extra={
+                    'event': 'api_success',
+                    'city': ",".join(city for (_, city, *_), lock in leased),
                 }
             )
+            for (location_id, city, country_code, owm_id), lock in leased:
+                normalized_city = normalize_city(_upstream_query(city, country_code))
+                payload = payloads.get(owm_id)
+                try:
+                    if payload is None:
+                        raise CityNotFound("City not found")
+                    _store_observation(normalized_city, _location_cache_key(location_id), payload)
+                    results[location_id] = True
+                except Exception as e:
+                    _log_api_error(normalized_city, e)
+                    results[location_id] = e
+    except Exception as e:
+        _log_api_error(",".join(city for (_, city, *_), lock in leased), e)
+        for location, lock in leased:
+            results.setdefault(location[0], e)
+    finally:
+        for location, lock in leased:
+            try:
+                lock.release()
+            except LockError:
+                pass
+    return results
 
-            weather_data = WeatherData.objects.create(**weather_data_dict)
 
-            new_query = WeatherQuery.objects.create(
-                location=location,
-                weather_data=weather_data,
-                units=units,
-                ip_address=ip_address,
-                served_from_cache=False,
-                raw_response=raw_data,
-            )
+def _coalesced_refresh(city_name: str, normalized_city: str, redis_cache_key: str, fetch=None):
+    """
+    Cross-worker coalescing via a Redis lease on the cache key.
+    The lease holder fetches from upstream, other workers wait for the
+    Redis entry it writes, or re-raise the tombstone it leaves for an unknown
+    city or upstream error. Falls back to a direct fetch if the lease is
+    released without either, or after REFRESH_WAIT_TIMEOUT.
+    Returns (location, weather_data, raw_response); raw_response is None when reused.
+    """
+    lock = cache.lock(f"lock:{redis_cache_key}", timeout=REFRESH_LOCK_TTL)
+
+    if lock.acquire(blocking=False):
+        try:
+            # Another worker may have finished a refresh between our miss and the lease
+            cached_entry = _read_redis_entry(redis_cache_key)
+            if cached_entry and not _is_stale(cached_entry[3]):
+                _cache_locally(redis_cache_key, cached_entry)
+                return cached_entry[0], cached_entry[1], None
+            return _fetch_and_store(city_name, normalized_city, redis_cache_key, fetch)
+        finally:
+            try:
+                lock.release()
+            except LockError:
+                pass
 
-            cache_data = pickle.dumps((location, weather_data))
-            cache.set(redis_cache_key, cache_data, timeout=300)
+    logger.info(
+        "Refresh in progress on another worker - waiting for cache",
+        extra={
+            'event': 'refresh_wait',
+            'city': normalized_city,
+        }
+    )
+
+    cached_entry = _wait_for_refresh(normalized_city, redis_cache_key, time.monotonic() + REFRESH_WAIT_TIMEOUT)
+    if cached_entry:
+        return cached_entry[0], cached_entry[1], None
+    return _fetch_and_store(city_name, normalized_city, redis_cache_key, fetch)
 
+
+def _wait_for_refresh(normalized_city: str, redis_cache_key: str, deadline: float):
+    """
+    Polls for the result of a refresh another worker holds the lease for.
+    Returns its entry, re-raises the tombstone it left, or returns None once
+    the lease is released without either or `deadline` (monotonic) passes.
+    """
+    # The lease holder cannot publish through a Redis that went down meanwhile
+    while time.monotonic() < deadline and not redis_health.is_open:
+        time.sleep(REFRESH_POLL_INTERVAL)
+        cached_value, tombstone, leased = _read_refresh_state(redis_cache_key, normalized_city)
+        cached_entry = _decode_redis_entry(cached_value)
+        if cached_entry:
+            _cache_locally(redis_cache_key, cached_entry)
+            return cached_entry
+        negative_cache.raise_if_tombstoned(normalized_city, tombstone)
+        if not leased:
             logger.info(
-                "Data successfully saved to cache",
+                "Refresh lease released without a result - fetching directly",
                 extra={
-                    'ip': ip_address or 'unknown',
-                    'event': 'cache_update',
+                    'event': 'refresh_wait_released',
                     'city': normalized_city,
-                    'units': units,
                 }
             )
+            return None
 
-        return new_query
+    logger.warning(
+        "Timed out waiting for refresh lease - fetching directly",
+        extra={
+            'event': 'refresh_wait_timeout',
+            'city': normalized_city,
+        }
+    )
+    return None
 
-    except Exception as e:
-        logger.error(
-            "Error fetching weather data from external API",
+
+def _fetch_and_store(city_name: str, normalized_city: str, redis_cache_key: str, fetch=None):
+    """
+    Fetches fresh data from the external API, persists it and updates Redis.
+    `fetch` is a no-argument upstream call used instead of looking up
+    `city_name`, for keys that are better resolved by city id or coordinates.
+    Returns (location, weather_data, raw_response).
+    """
+    try:
+        raw_data = fetch() if fetch else OpenWeatherAPI.fetch_weather(city_name)
+
+        logger.info(
+            "External API response received successfully",
             extra={
-                'ip': ip_address or 'unknown',
-                'event': 'api_error',
+                'event': 'api_success',
                 'city': normalized_city,
-                'units': units,
-                'error': str(e),
             }
         )
-        raise
\ No newline at end of file
+
+        return _store_observation(normalized_city, redis_cache_key, raw_data)
+
+    except Exception as e:
+        _log_api_error(normalized_city, e)
+        negative_cache.remember(normalized_city, e)
+        raise
+
+
+def _qualified_alias(city: str, country_code: str):
+    """'london, gb' for a location, the spelling upstream resolves to it; None without a country."""
+    return normalize_city(f"{city}, {country_code}") if country_code else None
+
+
+def _store_observation(normalized_city: str, redis_cache_key, raw_data: dict):
+    """
+    Persists an upstream payload as the location's latest observation, records
+    the input and the country-qualified upstream name as aliases of the
+    location and caches it.
+    `redis_cache_key` is the key callers may be polling (None for coordinate
+    lookups). Observations are always metric; serializers convert to the requested units.
+    """
+    location_data = OpenWeatherAPI.normalize_location_data(raw_data)
+    weather_data_dict = OpenWeatherAPI.normalize_weather_data(raw_data)
+
+    with transaction.atomic():
+        location_city = location_data["city"].lower().strip() if location_data.get("city") else normalized_city
+
+        location, created = Location.objects.get_or_create(
+            city=location_city,
+            country_code=location_data.get("country_code", ""),
+            defaults={
+                "city": location_city,
+                "country_code": location_data.get("country_code", ""),
+                "latitude": location_data.get("latitude"),
+                "longitude": location_data.get("longitude"),
+                "grid_cell": Location.grid_cell_for(location_data.get("latitude"), location_data.get("longitude")),
+                "owm_id": location_data.get("owm_id"),
+            }
+        )
+        if location_data.get("owm_id") and location.owm_id != location_data["owm_id"]:
+            location.owm_id = location_data["owm_id"]
+            location.save(update_fields=['owm_id'])
+
+        weather_data = WeatherData.objects.create(**weather_data_dict)
+        raw_response = _store_raw_response(raw_data)
+        fetched_at = timezone.now()
+
+        timing = observation_ttl.schedule(
+            None if created else _observation_history(location),
+            OpenWeatherAPI.observed_at(raw_data),
+            fetched_at.timestamp(),
+        )
+
+        LatestObservation.objects.bulk_create(
+            [LatestObservation(
+                location=location,
+                weather_data=weather_data,
+                raw_response=raw_response,
+                fetched_at=fetched_at,
+                observed_at=_from_timestamp(timing["observed_at"]),
+                update_interval=timing["update_interval"],
+                observation_lag=timing["observation_lag"],
+                expires_at=_from_timestamp(timing["expires_at"]),
+            )],
+            update_conflicts=True,
+            unique_fields=['location'],
+            update_fields=[
+                'weather_data', 'raw_response', 'fetched_at',
+                'observed_at', 'update_interval', 'observation_lag', 'expires_at',
+            ],
+        )
+
+        # The input is what upstream just resolved; the upstream name is only
+        # recorded country-qualified, as a bare name can mean another country
+        aliases = {
+            alias for alias in (normalized_city, _qualified_alias(location_city, location.country_code))
+            if alias and len(alias) <= ALIAS_MAX_LENGTH
+        }
+        CityAlias.objects.bulk_create(
+            [CityAlias(alias=alias, location=location) for alias in aliases],
+            update_conflicts=True,
+            unique_fields=['alias'],
+            update_fields=['location'],
+        )
+
+    # Written after commit so waiting workers never see uncommitted rows
+    city_aliases.learn(aliases, location.id)
+    location_grid.add(location)
+    location_key = _location_cache_key(location.id)
+    _write_cache_entry(location_key, location, weather_data, fetched_at.timestamp(), timing["expires_at"])
+    if redis_cache_key not in (None, location_key):
+        # Hand-off for workers polling the input key while this refresh ran
+        cache.set(
+            redis_cache_key,
+            encode_entry(location, weather_data, fetched_at.timestamp(), timing["expires_at"]),
+            timeout=REFRESH_LOCK_TTL,
+        )
+
+    logger.info(
+        "Data successfully saved to cache",
+        extra={
+            'event': 'cache_update',
+            'city': normalized_city,
+        }
+    )
+
+    return location, weather_data, raw_response
+
+
+def _log_api_error(normalized_city: str, error: Exception):
+    logger.error(
+        "Error fetching weather data from external API",
+        extra={
+            'event': 'api_error',
+            'city': normalized_city,
+            'error': str(error),
+        }
+    )
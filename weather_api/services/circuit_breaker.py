@@ -0,0 +1,286 @@
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from .async_redis import LuaScript
+from .redis_failover import REDIS_ERRORS, redis_health
+
+logger = logging.getLogger("weather")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Admission check. Open circuits reject until `open_until`, then let a single
+# half-open probe through; the probe lease expires in case its worker dies.
+# Returns {allowed, state}.
+ALLOW_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local probe_ms = tonumber(ARGV[1])
+
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'closed' then
+    return {1, state}
+end
+if state == 'open' and now < tonumber(redis.call('HGET', KEYS[1], 'open_until') or 0) then
+    return {0, state}
+end
+if state == 'half_open' and now < tonumber(redis.call('HGET', KEYS[1], 'probe_until') or 0) then
+    return {0, state}
+end
+redis.call('HSET', KEYS[1], 'state', 'half_open', 'probe_until', now + probe_ms)
+return {1, 'half_open'}
+"""
+
+# Outcome of one upstream call. Closed circuits count calls and failures in a
+# tumbling window and open once the failure rate crosses the threshold; a
+# half-open probe closes the circuit on success and reopens it on failure.
+# Returns the resulting state.
+RECORD_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local failed = tonumber(ARGV[1])
+local window_ms = tonumber(ARGV[2])
+local min_calls = tonumber(ARGV[3])
+local failure_rate = tonumber(ARGV[4])
+local open_ms = tonumber(ARGV[5])
+
+local state = redis.call('HGET', KEYS[1], 'state') or 'closed'
+if state == 'open' then
+    return state
+end
+if state == 'half_open' then
+    redis.call('DEL', KEYS[1])
+    if failed == 1 then
+        redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', now + open_ms)
+        return 'open'
+    end
+    return 'closed'
+end
+
+local start = tonumber(redis.call('HGET', KEYS[1], 'window_start') or 0)
+if now - start > window_ms then
+    redis.call('HSET', KEYS[1], 'window_start', now, 'calls', 0, 'failures', 0)
+end
+local calls = redis.call('HINCRBY', KEYS[1], 'calls', 1)
+local failures = redis.call('HINCRBY', KEYS[1], 'failures', failed)
+
+if calls >= min_calls and failures / calls >= failure_rate then
+    redis.call('DEL', KEYS[1])
+    redis.call('HSET', KEYS[1], 'state', 'open', 'open_until', now + open_ms)
+    return 'open'
+end
+return 'closed'
+"""
+
+
+class CircuitOpen(Exception):
+    def __init__(self, name: str):
+        super().__init__(f"Circuit '{name}' is open")
+        self.name = name
+
+
+class CircuitBreaker:
+    """
+    Closed/open/half-open circuit breaker with its state in Redis, so every
+    worker stops calling a failing dependency together. Calls that raise or
+    take longer than `slow_call_threshold` seconds count as failures.
+    If Redis itself is unavailable the breaker lets calls through, without
+    trying Redis while `redis_health` has it marked down.
+    """
+
+    def __init__(self, name: str, failure_rate: float, min_calls: int, window: float,
+                 slow_call_threshold: float, open_duration: float, probe_timeout: float):
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.slow_call_threshold = slow_call_threshold
+        self.open_duration = open_duration
+        self.probe_timeout = probe_timeout
+        self._allow_script = None
+        self._record_script = None
+        self._async_allow_script = LuaScript(ALLOW_SCRIPT)
+        self._async_record_script = LuaScript(RECORD_SCRIPT)
+
+    @property
+    def key(self) -> str:
+        return cache.make_key(f"circuit:{self.name}")
+
+    def call(self, fn, *args, ignore=(), uncounted=(), **kwargs):
+        """
+        Runs fn through the breaker. Raises CircuitOpen without calling fn
+        while the circuit is open. Exceptions listed in `ignore` (e.g. a 404)
+        propagate but count as successful calls; those in `uncounted` mean fn
+        gave up before reaching the dependency and are not recorded at all.
+        """
+        if not self.allow():
+            raise CircuitOpen(self.name)
+
+        start = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except uncounted:
+            raise
+        except ignore:
+            self.record(failed=time.monotonic() - start > self.slow_call_threshold)
+            raise
+        except Exception:
+            self.record(failed=True)
+            raise
+        self.record(failed=time.monotonic() - start > self.slow_call_threshold)
+        return result
+
+    async def acall(self, fn, *args, ignore=(), uncounted=(), **kwargs):
+        """Async call(): awaits the coroutine function fn through the breaker."""
+        if not await self.aallow():
+            raise CircuitOpen(self.name)
+
+        start = time.monotonic()
+        try:
+            result = await fn(*args, **kwargs)
+        except uncounted:
+            raise
+        except ignore:
+            await self.arecord(failed=time.monotonic() - start > self.slow_call_threshold)
+            raise
+        except Exception:
+            await self.arecord(failed=True)
+            raise
+        await self.arecord(failed=time.monotonic() - start > self.slow_call_threshold)
+        return result
+
+    def allow(self) -> bool:
+        if redis_health.is_open:
+            return True
+        try:
+            if self._allow_script is None:
+                self._allow_script = get_redis_connection("default").register_script(ALLOW_SCRIPT)
+            allowed, state = self._allow_script(keys=[self.key], args=self._allow_args())
+        except Exception as e:
+            self._log_unavailable(e)
+            return True
+        return bool(allowed)
+
+    async def aallow(self) -> bool:
+        if redis_health.is_open:
+            return True
+        try:
+            allowed, state = await self._async_allow_script(keys=[self.key], args=self._allow_args())
+        except Exception as e:
+            self._log_unavailable(e)
+            return True
+        return bool(allowed)
+
+    def record(self, failed: bool):
+        if redis_health.is_open:
+            return
+        try:
+            if self._record_script is None:
+                self._record_script = get_redis_connection("default").register_script(RECORD_SCRIPT)
+            state = self._record_script(keys=[self.key], args=self._record_args(failed))
+        except Exception as e:
+            self._log_record_error(e)
+            return
+        self._log_transition(failed, state)
+
+    async def arecord(self, failed: bool):
+        if redis_health.is_open:
+            return
+        try:
+            state = await self._async_record_script(keys=[self.key], args=self._record_args(failed))
+        except Exception as e:
+            self._log_record_error(e)
+            return
+        self._log_transition(failed, state)
+
+    def _allow_args(self) -> list:
+        return [int(self.probe_timeout * 1000)]
+
+    def _record_args(self, failed: bool) -> list:
+        return [
+            int(failed),
+            int(self.window * 1000),
+            self.min_calls,
+            self.failure_rate,
+            int(self.open_duration * 1000),
+        ]
+
+    def _log_unavailable(self, error: Exception):
+        redis_health.record_failure("circuit_breaker", error)
+        logger.warning(
+            "Circuit breaker state unavailable - allowing call",
+            extra={
+                'event': 'circuit_breaker_error',
+                'circuit': self.name,
+                'error': str(error),
+            }
+        )
+
+    def _log_record_error(self, error: Exception):
+        redis_health.record_failure("circuit_breaker", error)
+        logger.warning(
+            "Failed to record circuit breaker outcome",
+            extra={
+                'event': 'circuit_breaker_error',
+                'circuit': self.name,
+                'error': str(error),
+            }
+        )
+
+    def _log_transition(self, failed: bool, state):
+        if failed and _decode(state) == OPEN:
+            logger.warning(
+                "Circuit breaker open - failing fast",
+                extra={
+                    'event': 'circuit_breaker_open',
+                    'circuit': self.name,
+                }
+            )
+
+    def snapshot(self) -> dict:
+        """Current shared state, for health reporting."""
+        # Without Redis every call is let through, which is what a closed breaker does
+        unavailable = {"state": CLOSED, "shared_state": "unavailable"}
+        if redis_health.is_open:
+            return unavailable
+        try:
+            fields = {
+                _decode(k): _decode(v)
+                for k, v in get_redis_connection("default").hgetall(self.key).items()
+            }
+        except REDIS_ERRORS as e:
+            redis_health.record_failure("circuit_breaker", e)
+            return unavailable
+        state = fields.get("state", CLOSED)
+        snapshot = {
+            "state": state,
+            "calls": int(fields.get("calls", 0)),
+            "failures": int(fields.get("failures", 0)),
+        }
+        if state == OPEN:
+            remaining = int(fields.get("open_until", 0)) / 1000 - time.time()
+            snapshot["retry_after"] = max(round(remaining, 1), 0)
+        return snapshot
+
+    def reset(self):
+        get_redis_connection("default").delete(self.key)
+
+
+def _decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+
+upstream_breaker = CircuitBreaker(
+    name="openweather",
+    failure_rate=settings.WEATHER_BREAKER_FAILURE_RATE,
+    min_calls=settings.WEATHER_BREAKER_MIN_CALLS,
+    window=settings.WEATHER_BREAKER_WINDOW,
+    slow_call_threshold=settings.WEATHER_BREAKER_SLOW_CALL,
+    open_duration=settings.WEATHER_BREAKER_OPEN_SECONDS,
+    probe_timeout=settings.WEATHER_HTTP_CONNECT_TIMEOUT + settings.WEATHER_HTTP_READ_TIMEOUT,
+)
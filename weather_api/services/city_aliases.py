@@ -0,0 +1,106 @@
+import threading
+import unicodedata
+
+from django.conf import settings
+
+from ..models import CityAlias
+from .local_cache import LocalTTLCache
+
+# Aliases practically never change; the TTL only bounds how long a worker
+# keeps following an alias that a refresh re-pointed elsewhere
+ALIAS_MEMORY_TTL = 3600  # seconds
+
+
+def normalize_city(name: str) -> str:
+    """
+    Canonical form of user input for alias and cache keys: NFKC (full-width
+    and compatibility characters), casefold and single inner spaces.
+    """
+    return " ".join(unicodedata.normalize("NFKC", name).casefold().split())
+
+
+class CityAliasMap:
+    """
+    Normalized city input -> Location id, from an in-process LRU map in front
+    of the city_aliases table. Aliases are recorded when an upstream fetch
+    resolves an input, so later spellings of the same city share its
+    location-keyed cache entries. Resolution counters are per process.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = ALIAS_MEMORY_TTL):
+        self._memory = LocalTTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.db_hits = 0
+        self.misses = 0
+
+    def cached(self, alias: str):
+        """Location id from the in-process map only, or None."""
+        location_id = self._memory.get(alias)
+        if location_id is not None:
+            self._count("memory_hits")
+        return location_id
+
+    def lookup(self, alias: str):
+        """Location id from the database (one unique-index read), or None."""
+        location_id = CityAlias.objects.filter(alias=alias).values_list('location_id', flat=True).first()
+        return self._remember_lookup(alias, location_id)
+
+    async def alookup(self, alias: str):
+        location_id = await CityAlias.objects.filter(alias=alias).values_list('location_id', flat=True).afirst()
+        return self._remember_lookup(alias, location_id)
+
+    def resolve_many(self, aliases: list) -> dict:
+        """alias -> location id for the known ones; one query for those not in memory."""
+        resolved = {}
+        unknown = []
+        for alias in aliases:
+            location_id = self.cached(alias)
+            if location_id is None:
+                unknown.append(alias)
+            else:
+                resolved[alias] = location_id
+        if unknown:
+            found = dict(CityAlias.objects.filter(alias__in=set(unknown)).values_list('alias', 'location_id'))
+            for alias in unknown:
+                location_id = self._remember_lookup(alias, found.get(alias))
+                if location_id is not None:
+                    resolved[alias] = location_id
+        return resolved
+
+    def learn(self, aliases, location_id: int):
+        """Records aliases already persisted for a location in the in-process map."""
+        for alias in aliases:
+            self._memory.set(alias, location_id)
+
+    def clear(self):
+        self._memory.clear()
+        with self._lock:
+            self.memory_hits = self.db_hits = self.misses = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            resolved = self.memory_hits + self.db_hits
+            total = resolved + self.misses
+            return {
+                "size": self._memory.stats()["size"],
+                "memory_hits": self.memory_hits,
+                "db_hits": self.db_hits,
+                "misses": self.misses,
+                "hit_rate": round(resolved / total, 4) if total else 0.0,
+            }
+
+    def _remember_lookup(self, alias: str, location_id):
+        if location_id is None:
+            self._count("misses")
+        else:
+            self._count("db_hits")
+            self._memory.set(alias, location_id)
+        return location_id
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+city_aliases = CityAliasMap(maxsize=settings.WEATHER_ALIAS_CACHE_SIZE)
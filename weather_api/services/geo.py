@@ -0,0 +1,149 @@
+import math
+import threading
+
+from django.conf import settings
+
+from ..models import Location, grid_cell_key
+from .local_cache import LocalTTLCache
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+# Cells found empty are re-read after this long, so a location another worker
+# stored becomes visible here without invalidation
+GRID_MEMORY_TTL = 300  # seconds
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle distance between two points in kilometres."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def cells_within(latitude: float, longitude: float, radius_km: float) -> list:
+    """Grid cells that may hold a point within `radius_km` of the given one."""
+    size = Location.GRID_CELL_DEGREES
+    columns = round(360 / size)
+    row = math.floor(latitude / size)
+    col = math.floor(longitude / size)
+
+    radius_deg = radius_km / KM_PER_DEGREE
+    row_span = math.ceil(radius_deg / size)
+    # Columns narrow towards the poles; size the span for the most poleward row searched
+    poleward = math.cos(math.radians(min(90.0, abs(latitude) + radius_deg)))
+    if poleward <= 0 or radius_deg / poleward >= 180:
+        cols = range(columns)
+    else:
+        col_span = math.ceil(radius_deg / poleward / size)
+        cols = range(col - col_span, col + col_span + 1)
+
+    return [
+        grid_cell_key(r, c)
+        for r in range(row - row_span, row + row_span + 1)
+        for c in cols
+    ]
+
+
+class LocationGrid:
+    """
+    In-process spatial index over Location.grid_cell: cell -> the located
+    locations in it, loaded from the database one query per batch of missing
+    cells. Answers "nearest known location within a radius" for coordinate
+    lookups. Counters are per process.
+    """
+
+    def __init__(self, maxsize: int, ttl: float = GRID_MEMORY_TTL):
+        self._cells = LocalTTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self.matches = 0
+        self.misses = 0
+        self.cells_loaded = 0
+
+    def nearest(self, latitude: float, longitude: float, radius_km: float):
+        """
+        (location_id, latitude, longitude, city, country_code, owm_id, distance_km)
+        of the closest location within the radius, or None. The coordinates are
+        the indexed point: the location's own, or one upstream resolved to it.
+        """
+        best = None
+        for entries in self._load(cells_within(latitude, longitude, radius_km)):
+            for entry in entries:
+                distance = haversine_km(latitude, longitude, entry[1], entry[2])
+                if distance <= radius_km and (best is None or distance < best[-1]):
+                    best = (*entry, distance)
+
+        self._count("misses" if best is None else "matches")
+        return best
+
+    def add(self, location: Location, latitude: float = None, longitude: float = None):
+        """
+        Indexes a stored location at its own coordinates (only if that cell is
+        loaded here), or at a point upstream resolved to it, so later requests
+        near that point match even when the location's centre is out of range.
+        """
+        point_given = latitude is not None and longitude is not None
+        if not point_given:
+            latitude, longitude = location.latitude, location.longitude
+        if latitude is None or longitude is None:
+            return
+
+        cell = Location.grid_cell_for(latitude, longitude)
+        entries = self._cells.get(cell)
+        if entries is None:
+            if not point_given:
+                return
+            entries = self._load([cell])[0]
+        entry = (location.id, latitude, longitude, location.city, location.country_code, location.owm_id)
+        if entry not in entries:
+            self._cells.set(cell, tuple(entries) + (entry,))
+
+    def clear(self):
+        self._cells.clear()
+        with self._lock:
+            self.matches = self.misses = self.cells_loaded = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.matches + self.misses
+            return {
+                "cells": self._cells.stats()["size"],
+                "cells_loaded": self.cells_loaded,
+                "matches": self.matches,
+                "misses": self.misses,
+                "match_rate": round(self.matches / total, 4) if total else 0.0,
+            }
+
+    def _load(self, cells: list) -> list:
+        found = []
+        missing = []
+        for cell in cells:
+            entries = self._cells.get(cell)
+            if entries is None:
+                missing.append(cell)
+            else:
+                found.append(entries)
+        if not missing:
+            return found
+
+        loaded = {cell: [] for cell in missing}
+        rows = Location.objects.filter(grid_cell__in=missing).values_list(
+            'grid_cell', 'id', 'latitude', 'longitude', 'city', 'country_code', 'owm_id'
+        )
+        for cell, *entry in rows:
+            loaded[cell].append(tuple(entry))
+        for cell, entries in loaded.items():
+            # Empty cells are cached too, so open water costs no query per request
+            self._cells.set(cell, tuple(entries))
+            found.append(entries)
+        self._count("cells_loaded", len(missing))
+        return found
+
+    def _count(self, counter: str, amount: int = 1):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + amount)
+
+
+location_grid = LocationGrid(maxsize=settings.WEATHER_GRID_CACHE_SIZE)
@@ -0,0 +1,179 @@
+import heapq
+import logging
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait
+from datetime import timedelta
+
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from ..models import WeatherQuery, LatestObservation
+from . import cash_service
+from .observation_ttl import observation_ttl
+from .weather_api_service import OpenWeatherAPI
+
+logger = logging.getLogger("weather")
+
+
+class CallBudget:
+    """At most `per_minute` calls in any sliding 60-second window."""
+
+    def __init__(self, per_minute: int, timer=time.monotonic):
+        self.per_minute = per_minute
+        self._timer = timer
+        self._calls = deque()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            now = self._timer()
+            while self._calls and self._calls[0] <= now - 60:
+                self._calls.popleft()
+            if len(self._calls) >= self.per_minute:
+                return False
+            self._calls.append(now)
+            return True
+
+
+class HotCityRefresher:
+    """
+    Keeps the cache entries of the most requested locations fresh, so hot
+    cities never pay upstream latency on a request.
+
+    Popularity is the number of query log rows per location over the last
+    `window` seconds (both units share one entry). Each cycle re-fetches the
+    top `top_n` locations whose entry turns stale within `lead` seconds,
+    soonest-expiring and then most requested first, with at most
+    `concurrency` upstream calls in flight and `budget` calls per minute.
+    Locations with an OpenWeatherMap id are fetched in group calls of up to
+    OpenWeatherAPI.GROUP_MAX_IDS.
+    """
+
+    def __init__(self, top_n: int, lead: float, concurrency: int, budget: int, window: float):
+        self.top_n = top_n
+        self.lead = lead
+        self.window = window
+        self.budget = CallBudget(budget)
+        self._executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="hot-refresh")
+
+    def hot_locations(self) -> list:
+        """[((location_id, city, country_code, owm_id), hits)] of the top_n locations by recent requests."""
+        since = timezone.now() - timedelta(seconds=self.window)
+        rows = WeatherQuery.objects.filter(timestamp__gte=since).values(
+            'location_id', 'location__city', 'location__country_code', 'location__owm_id'
+        ).annotate(hits=Count('id')).order_by('-hits')[:self.top_n]
+        return [
+            ((row['location_id'], row['location__city'], row['location__country_code'], row['location__owm_id']),
+             row['hits'])
+            for row in rows
+        ]
+
+    def schedule(self) -> list:
+        """Heap of (refresh_at, -hits, location) for the hot locations."""
+        hot = self.hot_locations()
+        expiry = {
+            location_id: observation_ttl.expiry(fetched_at.timestamp(), expires_at and expires_at.timestamp())
+            for location_id, fetched_at, expires_at in LatestObservation.objects.filter(
+                location_id__in=[location[0] for location, hits in hot],
+            ).values_list('location_id', 'fetched_at', 'expires_at')
+        }
+
+        now = time.time()
+        heap = []
+        for location, hits in hot:
+            expires_at = expiry.get(location[0])
+            refresh_at = expires_at - self.lead if expires_at else now
+            heap.append((refresh_at, -hits, location))
+        heapq.heapify(heap)
+        return heap
+
+    @staticmethod
+    def upstream_calls(due: list) -> list:
+        """
+        Splits due heap entries, in priority order, into the entries each
+        upstream call covers: group calls for locations with an
+        OpenWeatherMap id, single calls for the rest.
+        """
+        calls = []
+        group = None
+        for entry in due:
+            if entry[2][3] is None:
+                calls.append([entry])
+                continue
+            if group is None or len(group) == OpenWeatherAPI.GROUP_MAX_IDS:
+                group = []
+                calls.append(group)
+            group.append(entry)
+        return calls
+
+    def run_once(self) -> dict:
+        """
+        One refresh cycle. Returns counters and `next_refresh_at`, the epoch
+        second the next hot entry becomes due (None when nothing is hot).
+        """
+        heap = self.schedule()
+        now = time.time()
+        stats = {"hot": len(heap), "upstream_calls": 0, "refreshed": 0, "skipped": 0, "over_budget": 0, "failed": 0}
+
+        due = []
+        while heap and heap[0][0] <= now:
+            due.append(heapq.heappop(heap))
+
+        futures = {}
+        calls = self.upstream_calls(due)
+        for i, call in enumerate(calls):
+            if not self.budget.try_acquire():
+                # Left in the heap: still due, retried once the budget frees up
+                for entry in (entry for remaining in calls[i:] for entry in remaining):
+                    heapq.heappush(heap, entry)
+                    stats["over_budget"] += 1
+                break
+            locations = [location for refresh_at, neg_hits, location in call]
+            futures[self._executor.submit(self._refresh, locations)] = locations
+        stats["upstream_calls"] = len(futures)
+
+        wait(futures)
+        for future, locations in futures.items():
+            cities = {location[0]: location[1] for location in locations}
+            for location_id, result in future.result().items():
+                if isinstance(result, Exception):
+                    stats["failed"] += 1
+                    logger.warning(
+                        "Hot city refresh failed",
+                        extra={
+                            'event': 'hot_refresh_error',
+                            'city': cities[location_id],
+                            'error': str(result),
+                        }
+                    )
+                else:
+                    stats["refreshed" if result else "skipped"] += 1
+
+        stats["next_refresh_at"] = heap[0][0] if heap else None
+        logger.info(
+            "Hot city refresh cycle finished",
+            extra={'event': 'hot_refresh_cycle', **stats}
+        )
+        return stats
+
+    def run_forever(self, interval: float, stop: threading.Event = None):
+        """Runs cycles until `stop` is set, sleeping until the next entry is due (at most `interval`)."""
+        stop = stop or threading.Event()
+        while not stop.is_set():
+            stats = self.run_once()
+            next_refresh_at = stats["next_refresh_at"]
+            delay = interval if next_refresh_at is None else next_refresh_at - time.time()
+            stop.wait(min(interval, max(1.0, delay)))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=True)
+
+    @staticmethod
+    def _refresh(locations: list) -> dict:
+        try:
+            return cash_service.refresh_locations(locations)
+        finally:
+            connection.close()
@@ -0,0 +1,111 @@
+import asyncio
+import atexit
+import os
+import threading
+import weakref
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+
+
+class PooledHTTPClient:
+    """
+    Shared keep-alive HTTP client for upstream calls.
+    Holds one requests.Session per worker process with a bounded connection
+    pool, so repeated calls reuse TCP/TLS connections instead of reconnecting.
+    A forked worker gets its own session on first use, never the parent's sockets.
+    """
+
+    def __init__(self, pool_size: int, connect_timeout: float, read_timeout: float):
+        self.pool_size = pool_size
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self._lock = threading.Lock()
+        self._session = None
+        self._pid = None
+        atexit.register(self.close)
+
+    @property
+    def session(self) -> requests.Session:
+        session = self._session
+        if session is not None and self._pid == os.getpid():
+            return session
+
+        with self._lock:
+            if self._session is None or self._pid != os.getpid():
+                # After a fork the inherited pool shares sockets with the parent: drop it unclosed
+                self._session = self._build_session()
+                self._pid = os.getpid()
+            return self._session
+
+    def get(self, url: str, params: dict = None, read_timeout: float = None) -> requests.Response:
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        return self.session.get(url, params=params, timeout=timeout)
+
+    def close(self):
+        with self._lock:
+            if self._session is not None and self._pid == os.getpid():
+                self._session.close()
+            self._session = None
+            self._pid = None
+
+    def _build_session(self) -> requests.Session:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, pool_block=False)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+
+class AsyncPooledHTTPClient:
+    """
+    Async counterpart of PooledHTTPClient for ASGI views: one httpx.AsyncClient
+    per event loop, so one worker can hold many in-flight upstream requests
+    on up to `max_connections` keep-alive connections.
+    """
+
+    def __init__(self, max_connections: int, connect_timeout: float, read_timeout: float):
+        self.max_connections = max_connections
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        # Connections are bound to the loop that opened them
+        self._clients = weakref.WeakKeyDictionary()
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        loop = asyncio.get_running_loop()
+        client = self._clients.get(loop)
+        if client is None:
+            client = httpx.AsyncClient(
+                limits=httpx.Limits(
+                    max_connections=self.max_connections,
+                    max_keepalive_connections=self.max_connections,
+                ),
+                timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+            )
+            self._clients[loop] = client
+        return client
+
+    async def get(self, url: str, params: dict = None, read_timeout: float = None) -> httpx.Response:
+        timeout = httpx.Timeout(read_timeout or self.read_timeout, connect=self.connect_timeout)
+        return await self.client.get(url, params=params, timeout=timeout)
+
+    async def aclose(self):
+        client = self._clients.pop(asyncio.get_running_loop(), None)
+        if client is not None:
+            await client.aclose()
+
+
+http_client = PooledHTTPClient(
+    pool_size=settings.WEATHER_HTTP_POOL_SIZE,
+    connect_timeout=settings.WEATHER_HTTP_CONNECT_TIMEOUT,
+    read_timeout=settings.WEATHER_HTTP_READ_TIMEOUT,
+)
+
+async_http_client = AsyncPooledHTTPClient(
+    max_connections=settings.WEATHER_ASYNC_HTTP_MAX_CONNECTIONS,
+    connect_timeout=settings.WEATHER_HTTP_CONNECT_TIMEOUT,
+    read_timeout=settings.WEATHER_HTTP_READ_TIMEOUT,
+)
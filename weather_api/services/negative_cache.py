@@ -0,0 +1,99 @@
+import logging
+import threading
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .weather_api_service import CityNotFound, UpstreamUnavailable, WeatherAPIError
+
+logger = logging.getLogger("weather")
+
+NOT_FOUND = "not_found"
+UPSTREAM_ERROR = "upstream_error"
+
+
+class NegativeCache:
+    """
+    Redis tombstones for lookups upstream could not answer: unknown cities
+    for `not_found_ttl` seconds, transient upstream errors for `error_ttl`.
+    Callers read the tombstone in the same round trip as the cache entry and
+    raise instead of calling upstream again: CityNotFound for unknown cities,
+    UpstreamUnavailable for errors, so callers can still serve the last known
+    observation. Hit and store counters are per process.
+    """
+
+    def __init__(self, not_found_ttl: int, error_ttl: int):
+        self.not_found_ttl = not_found_ttl
+        self.error_ttl = error_ttl
+        self._lock = threading.Lock()
+        self._counts = dict.fromkeys(
+            ("not_found_hits", "upstream_error_hits", "not_found_stored", "upstream_error_stored"), 0
+        )
+
+    @staticmethod
+    def key(normalized_city: str) -> str:
+        return f"weather:missing:{normalized_city}"
+
+    def remember(self, normalized_city: str, error: Exception):
+        """Stores a tombstone for CityNotFound or WeatherAPIError; other errors are not cached."""
+        if isinstance(error, CityNotFound):
+            kind, ttl = NOT_FOUND, self.not_found_ttl
+        elif isinstance(error, WeatherAPIError):
+            kind, ttl = UPSTREAM_ERROR, self.error_ttl
+        else:
+            return
+        if ttl <= 0:
+            return
+
+        try:
+            cache.set(self.key(normalized_city), kind, timeout=ttl)
+        except Exception as e:
+            # The next lookup simply calls upstream again
+            logger.warning(
+                "Failed to store negative cache entry",
+                extra={
+                    'event': 'negative_cache_error',
+                    'city': normalized_city,
+                    'error': str(e),
+                }
+            )
+            return
+        self._increment(f"{kind}_stored")
+
+    def raise_if_tombstoned(self, normalized_city: str, tombstone):
+        """Raises CityNotFound or UpstreamUnavailable if `tombstone` (the value read at key()) is set."""
+        if tombstone is None:
+            return
+        if tombstone == NOT_FOUND:
+            self._increment("not_found_hits")
+            error = CityNotFound("City not found")
+        else:
+            self._increment("upstream_error_hits")
+            # Transient: a 503 with the last known observation if there is one, never a 404
+            error = UpstreamUnavailable("Weather service temporarily unavailable, retry shortly")
+
+        logger.info(
+            "Negative cache hit - skipping upstream",
+            extra={
+                'event': 'negative_cache_hit',
+                'city': normalized_city,
+                'error': str(error),
+            }
+        )
+        raise error
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts)
+        stats["upstream_calls_absorbed"] = stats["not_found_hits"] + stats["upstream_error_hits"]
+        return stats
+
+    def _increment(self, counter: str):
+        with self._lock:
+            self._counts[counter] += 1
+
+
+negative_cache = NegativeCache(
+    not_found_ttl=settings.WEATHER_NOT_FOUND_TTL,
+    error_ttl=settings.WEATHER_UPSTREAM_ERROR_TTL,
+)
@@ -0,0 +1,119 @@
+import threading
+import time
+
+from django.conf import settings
+
+from .local_cache import LocalTTLCache
+
+# Weight of the newest sample in the per-location moving averages
+SMOOTHING = 0.3
+
+
+class ObservationTTL:
+    """
+    Soft TTL per observation, aligned with when upstream is expected to
+    publish the next one instead of a fixed age.
+
+    Upstream stamps each observation with its measurement time (`dt`) and
+    updates a location on its own cadence. Per location this tracks the
+    interval between successive `dt` values and the lag between `dt` and the
+    fetch that first returned it (both moving averages), and expires an entry
+    at dt + interval + lag, clamped to [min_ttl, max_ttl] after the fetch.
+    Observations without `dt`, or a location's first one, get `default_ttl`.
+
+    Counters are per process: `redundant_fetches` are fetches that returned
+    the observation already stored, `refreshes_deferred` entries past
+    `default_ttl` (when a fixed TTL would have refetched them) still kept
+    because their next observation was not due yet.
+    """
+
+    def __init__(self, default_ttl: float, min_ttl: float, max_ttl: float, tracked_keys: int = 10000):
+        self.default_ttl = default_ttl
+        self.min_ttl = min(min_ttl, default_ttl)
+        self.max_ttl = max(max_ttl, self.min_ttl)
+        # key -> fetched_at of the entry last counted as deferred, so each entry counts once
+        self._deferred = LocalTTLCache(maxsize=tracked_keys, ttl=self.max_ttl)
+        self._lock = threading.Lock()
+        self.fetches = 0
+        self.redundant_fetches = 0
+        self.refreshes_deferred = 0
+
+    def schedule(self, previous, observed_at, fetched_at: float) -> dict:
+        """
+        LatestObservation timing fields for a fetch. `previous` is the stored
+        (observed_at, update_interval, observation_lag) or None; times are
+        epoch seconds, `observed_at` is None when the payload has no `dt`.
+        """
+        prev_observed, interval, lag = previous or (None, None, None)
+        changed = observed_at is None or prev_observed is None or observed_at > prev_observed
+        self._count("fetches")
+        if not changed:
+            self._count("redundant_fetches")
+
+        if observed_at is not None and changed:
+            if prev_observed is not None:
+                interval = self._smooth(interval, self._interval_sample(observed_at - prev_observed, interval))
+            lag = self._smooth(lag, max(0.0, fetched_at - observed_at))
+        elif observed_at is None:
+            observed_at = prev_observed
+
+        if observed_at is None or interval is None:
+            ttl = self.default_ttl
+        else:
+            ttl = min(self.max_ttl, max(self.min_ttl, observed_at + interval + (lag or 0.0) - fetched_at))
+
+        return {
+            "observed_at": observed_at,
+            "update_interval": interval,
+            "observation_lag": lag,
+            "expires_at": fetched_at + ttl,
+        }
+
+    def expiry(self, fetched_at: float, expires_at=None) -> float:
+        """Soft expiry of an entry; rows stored before adaptive TTLs have none."""
+        return expires_at if expires_at is not None else fetched_at + self.default_ttl
+
+    def note_current(self, key: str, fetched_at: float):
+        """Called for an entry within its soft TTL; counts it once if a fixed TTL would have refetched it."""
+        if time.time() - fetched_at <= self.default_ttl or self._deferred.get(key) == fetched_at:
+            return
+        self._deferred.set(key, fetched_at)
+        self._count("refreshes_deferred")
+
+    def clear(self):
+        self._deferred.clear()
+        with self._lock:
+            self.fetches = self.redundant_fetches = self.refreshes_deferred = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "default_ttl": self.default_ttl,
+                "min_ttl": self.min_ttl,
+                "max_ttl": self.max_ttl,
+                "fetches": self.fetches,
+                "redundant_fetches": self.redundant_fetches,
+                "refreshes_deferred": self.refreshes_deferred,
+            }
+
+    def _interval_sample(self, elapsed: float, interval) -> float:
+        # A gap spanning several updates we did not fetch in between is that many intervals
+        if interval and elapsed > 1.5 * interval:
+            elapsed /= round(elapsed / interval)
+        return max(elapsed, self.min_ttl)
+
+    @staticmethod
+    def _smooth(average, sample: float) -> float:
+        return sample if average is None else average + SMOOTHING * (sample - average)
+
+    def _count(self, counter: str):
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+
+observation_ttl = ObservationTTL(
+    default_ttl=settings.WEATHER_CACHE_TTL,
+    min_ttl=settings.WEATHER_CACHE_MIN_TTL,
+    # Entries are dropped at the hard TTL, so a soft TTL past it would never be reached
+    max_ttl=min(settings.WEATHER_CACHE_MAX_TTL, settings.WEATHER_CACHE_HARD_TTL),
+)
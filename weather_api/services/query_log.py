@@ -0,0 +1,192 @@
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from ..models import WeatherQuery
+
+logger = logging.getLogger("weather")
+
+
+class QueryLogWriter:
+    """
+    Write-behind buffer for WeatherQuery audit rows.
+    Rows are queued in memory and saved with bulk_create by a background
+    flusher thread once `batch_size` rows are pending or `flush_interval`
+    seconds have passed, and on interpreter shutdown. When the queue is
+    full, enqueue waits up to `enqueue_timeout` and then drops the row;
+    with block=False (the async path) it drops the row straight away.
+    """
+
+    def __init__(self, max_queue_size: int, batch_size: int, flush_interval: float,
+                 enqueue_timeout: float = 0.05, autostart: bool = True):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.autostart = autostart
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stopped = threading.Event()
+        self._start_lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self.enqueued = 0
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+
+    def enqueue(self, query: WeatherQuery, block: bool = True) -> bool:
+        if self.autostart and self._thread is None:
+            self.start()
+
+        try:
+            if block:
+                self._queue.put(query, timeout=self.enqueue_timeout)
+            else:
+                self._queue.put_nowait(query)
+        except queue.Full:
+            self._count('dropped')
+            logger.warning(
+                "Query log queue full - dropping row",
+                extra={
+                    'event': 'query_log_dropped',
+                    'city': query.location.city,
+                    'units': query.units,
+                }
+            )
+            return False
+
+        self._count('enqueued')
+        return True
+
+    def start(self):
+        with self._start_lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name="query-log-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.stop)
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.flush_interval + 5)
+        self.flush()
+
+    def flush(self) -> int:
+        """Writes everything currently queued; returns the number of rows saved."""
+        saved = 0
+        while True:
+            batch = self._drain(self.batch_size)
+            if not batch:
+                return saved
+            saved += self._write(batch)
+
+    def stats(self) -> dict:
+        with self._stats_lock:
+            return {
+                "pending": self._queue.qsize(),
+                "enqueued": self.enqueued,
+                "written": self.written,
+                "dropped": self.dropped,
+                "failed": self.failed,
+            }
+
+    def _count(self, name: str, amount: int = 1):
+        # Request threads and the flusher update these concurrently
+        with self._stats_lock:
+            setattr(self, name, getattr(self, name) + amount)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            batch = self._collect()
+            if batch:
+                # Long-lived thread: honour CONN_MAX_AGE and drop broken connections
+                close_old_connections()
+                self._write(batch)
+
+    def _collect(self):
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self, limit: int):
+        batch = []
+        while len(batch) < limit:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _write(self, batch) -> int:
+        with self._write_lock:
+            try:
+                WeatherQuery.objects.bulk_create(batch)
+            except Exception as e:
+                self._count('failed', len(batch))
+                logger.error(
+                    "Failed to write query log batch",
+                    extra={
+                        'event': 'query_log_error',
+                        'error': str(e),
+                    }
+                )
+                return 0
+            self._count('written', len(batch))
+            return len(batch)
+
+
+query_log_writer = QueryLogWriter(
+    max_queue_size=settings.WEATHER_QUERY_LOG_QUEUE_SIZE,
+    batch_size=settings.WEATHER_QUERY_LOG_BATCH_SIZE,
+    flush_interval=settings.WEATHER_QUERY_LOG_FLUSH_INTERVAL,
+)
+
+
+def record_query(**fields) -> WeatherQuery:
+    """
+    Saves a WeatherQuery row, or queues it when WEATHER_QUERY_LOG_MODE is
+    'write_behind'. Queued rows are returned without an id.
+    """
+    if settings.WEATHER_QUERY_LOG_MODE == "write_behind":
+        query = WeatherQuery(**fields)
+        query_log_writer.enqueue(query)
+        return query
+    return WeatherQuery.objects.create(**fields)
+
+
+def record_queries(queries: list) -> list:
+    """
+    Saves unsaved WeatherQuery instances with one bulk_create, or queues
+    them all in 'write_behind' mode. Returns the same instances.
+    """
+    if settings.WEATHER_QUERY_LOG_MODE == "write_behind":
+        for query in queries:
+            query_log_writer.enqueue(query)
+        return queries
+    return WeatherQuery.objects.bulk_create(queries)
+
+
+async def arecord_query(**fields) -> WeatherQuery:
+    """
+    Async record_query; queued rows never wait on the database, and a full
+    queue drops the row instead of blocking the event loop.
+    """
+    if settings.WEATHER_QUERY_LOG_MODE == "write_behind":
+        query = WeatherQuery(**fields)
+        query_log_writer.enqueue(query, block=False)
+        return query
+    return await WeatherQuery.objects.acreate(**fields)
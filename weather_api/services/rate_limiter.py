@@ -1,21 +1,262 @@
+from collections import OrderedDict, deque
 from datetime import timedelta
-from django.core.cache import cache
-from django.utils import timezone
+from typing import NamedTuple
 import logging
+import math
+import threading
+import time
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import NoScriptError
+
+from .async_redis import get_async_redis, LuaScript
+from .redis_failover import redis_health, failover_values
 
 RATE_LIMIT = 30
 WINDOW = timedelta(minutes=1)
 
 logger = logging.getLogger('weather')
 
+# Sliding-window log in one atomic server-side call. Uses the Redis clock so
+# all workers agree on the window. A call takes `cost` slots (ARGV[4]) or none.
+# Returns {allowed, count, ms until a slot frees}.
+SLIDING_WINDOW_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+local cost = tonumber(ARGV[4])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+local allowed = 0
+if count + cost <= limit then
+    for i = 1, cost do
+        redis.call('ZADD', KEYS[1], now, ARGV[3] .. ':' .. i)
+    end
+    count = count + cost
+    allowed = 1
+end
+redis.call('PEXPIRE', KEYS[1], window)
+
+local reset = window
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+if oldest[2] then
+    reset = tonumber(oldest[2]) + window - now
+end
+return {allowed, count, reset}
+"""
+
+_sliding_window_script = None
+_async_sliding_window_script = LuaScript(SLIDING_WINDOW_SCRIPT)
+
+
+class RateLimitStatus(NamedTuple):
+    limit: int
+    remaining: int
+    reset_after: int  # seconds until the oldest counted request leaves the window
+
+
 class RateLimitExceeded(Exception):
-    pass
+    def __init__(self, message: str, status: RateLimitStatus = None):
+        super().__init__(message)
+        self.status = status
 
-def check_rate_limit(ip: str):
+
+class LocalRateLimiter:
+    """
+    Per-process sliding-window log used while Redis is unavailable. Approximate:
+    each worker counts only the requests it serves, so a client spread over
+    several workers gets up to that many times the limit. Tracks the
+    `max_clients` most recently seen IPs.
+    """
+
+    def __init__(self, limit: int, window: float, max_clients: int = 10000, timer=time.monotonic):
+        self.limit = limit
+        self.window = window
+        self.max_clients = max_clients
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._clients = OrderedDict()
+
+    def hit(self, ip: str, cost: int = 1):
+        """Takes `cost` slots; returns (allowed, count, ms until a slot frees) like the sliding-window script."""
+        with self._lock:
+            now = self._timer()
+            calls = self._clients.pop(ip, None) or deque()
+            while calls and calls[0] <= now - self.window:
+                calls.popleft()
+            allowed = len(calls) + cost <= self.limit
+            if allowed:
+                calls.extend([now] * cost)
+            self._clients[ip] = calls
+            while len(self._clients) > self.max_clients:
+                self._clients.popitem(last=False)
+            reset = (calls[0] + self.window - now) if calls else self.window
+            return int(allowed), len(calls), reset * 1000
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+
+
+local_rate_limiter = LocalRateLimiter(RATE_LIMIT, WINDOW.total_seconds())
+
+
+def check_rate_limit(ip: str, cost: int = 1) -> RateLimitStatus:
     """
     Redis-based rate limiting: 30 requests per minute per IP.
-    Uses atomic Redis operations to ensure thread safety.
+    The default sliding-window backend makes one atomic Lua call per request;
+    WEATHER_RATE_LIMIT_BACKEND='fixed_window' selects the legacy counter.
+    While Redis is unavailable requests are counted per process (LocalRateLimiter).
+    A call counts as `cost` requests, all or none of them.
     """
+    _require_ip(ip)
+
+    if settings.WEATHER_RATE_LIMIT_BACKEND == 'fixed_window':
+        return _check_fixed_window(ip, cost)
+
+    reply = redis_health.call(
+        "rate_limit",
+        lambda: _get_sliding_window_script()(keys=[_sliding_window_key(ip)], args=_sliding_window_args(cost)),
+        lambda: local_rate_limiter.hit(ip, cost),
+    )
+    return _evaluate_sliding_window(ip, reply)
+
+
+def check_rate_limit_and_get(ip: str, key: str):
+    """
+    Rate-limit check plus a cache GET of `key`, pipelined into one Redis round trip.
+    Returns (RateLimitStatus, cached value or None). The value is only
+    meaningful to the caller if the check passes; otherwise this raises.
+    """
+    status, values = check_rate_limit_and_get_many(ip, [key])
+    return status, values[0]
+
+
+def check_rate_limit_and_get_many(ip: str, keys: list):
+    """
+    Like check_rate_limit_and_get, for several keys read with one MGET.
+    Returns (RateLimitStatus, [cached value or None per key]). While Redis is
+    unavailable the values come from the local failover tier.
+    """
+    _require_ip(ip)
+
+    if settings.WEATHER_RATE_LIMIT_BACKEND == 'fixed_window':
+        status = _check_fixed_window(ip)
+        found = cache.get_many(keys) if keys else {}
+        return status, [found.get(key) for key in keys]
+
+    reply, values = redis_health.call(
+        "rate_limit",
+        lambda: _pipelined_check_and_get(ip, keys),
+        lambda: (local_rate_limiter.hit(ip), failover_values([cache.make_key(key) for key in keys])),
+    )
+    return _evaluate_sliding_window(ip, reply), values
+
+
+def _pipelined_check_and_get(ip: str, keys: list):
+    """(sliding-window reply, decoded values) from one pipelined round trip."""
+    script = _get_sliding_window_script()
+    script_keys = [_sliding_window_key(ip)]
+    script_args = _sliding_window_args()
+
+    pipe = get_redis_connection("default").pipeline(transaction=False)
+    pipe.evalsha(script.sha, len(script_keys), *script_keys, *script_args)
+    if keys:
+        pipe.mget([cache.make_key(key) for key in keys])
+    replies = pipe.execute(raise_on_error=False)
+    reply = replies[0]
+    raw_values = replies[1] if keys else []
+
+    if isinstance(reply, NoScriptError):
+        # Script cache flushed (first use or Redis restart): load it and retry the check only
+        reply = script(keys=script_keys, args=script_args)
+    elif isinstance(reply, Exception):
+        raise reply
+    if isinstance(raw_values, Exception):
+        raise raw_values
+
+    return reply, [cache.client.decode(raw) if raw is not None else None for raw in raw_values]
+
+
+async def acheck_rate_limit(ip: str) -> RateLimitStatus:
+    """Async check_rate_limit for ASGI views."""
+    _require_ip(ip)
+
+    if settings.WEATHER_RATE_LIMIT_BACKEND == 'fixed_window':
+        return await sync_to_async(_check_fixed_window)(ip)
+
+    reply = await redis_health.acall(
+        "rate_limit",
+        lambda: _async_sliding_window_script(keys=[_sliding_window_key(ip)], args=_sliding_window_args()),
+        lambda: local_rate_limiter.hit(ip),
+    )
+    return _evaluate_sliding_window(ip, reply)
+
+
+async def acheck_rate_limit_and_get(ip: str, key: str):
+    """Async check_rate_limit_and_get: one pipelined round trip on the async client."""
+    status, values = await acheck_rate_limit_and_get_many(ip, [key])
+    return status, values[0]
+
+
+async def acheck_rate_limit_and_get_many(ip: str, keys: list):
+    """Async check_rate_limit_and_get_many."""
+    _require_ip(ip)
+
+    if settings.WEATHER_RATE_LIMIT_BACKEND == 'fixed_window':
+        return await sync_to_async(check_rate_limit_and_get_many)(ip, keys)
+
+    reply, values = await redis_health.acall(
+        "rate_limit",
+        lambda: _apipelined_check_and_get(ip, keys),
+        lambda: (local_rate_limiter.hit(ip), failover_values([cache.make_key(key) for key in keys])),
+    )
+    return _evaluate_sliding_window(ip, reply), values
+
+
+async def _apipelined_check_and_get(ip: str, keys: list):
+    """Async _pipelined_check_and_get."""
+    script_keys = [_sliding_window_key(ip)]
+    script_args = _sliding_window_args()
+
+    pipe = get_async_redis().pipeline(transaction=False)
+    pipe.evalsha(_async_sliding_window_script.sha, len(script_keys), *script_keys, *script_args)
+    if keys:
+        pipe.mget([cache.make_key(key) for key in keys])
+    replies = await pipe.execute(raise_on_error=False)
+    reply = replies[0]
+    raw_values = replies[1] if keys else []
+
+    if isinstance(reply, NoScriptError):
+        reply = await _async_sliding_window_script(keys=script_keys, args=script_args)
+    elif isinstance(reply, Exception):
+        raise reply
+    if isinstance(raw_values, Exception):
+        raise raw_values
+
+    return reply, [cache.client.decode(raw) if raw is not None else None for raw in raw_values]
+
+
+def rate_limit_headers(status: RateLimitStatus, exceeded: bool = False) -> dict:
+    if status is None:
+        return {}
+    headers = {
+        'X-RateLimit-Limit': str(status.limit),
+        'X-RateLimit-Remaining': str(status.remaining),
+        'X-RateLimit-Reset': str(status.reset_after),
+    }
+    if exceeded:
+        headers['Retry-After'] = str(status.reset_after)
+    return headers
+
+
+def _require_ip(ip: str):
     if not ip:
         logger.warning(
             "Rate limit check failed - missing IP address",
@@ -26,10 +267,61 @@ def check_rate_limit(ip: str):
         )
         raise RateLimitExceeded("IP address missing")
 
+
+def _get_sliding_window_script():
+    global _sliding_window_script
+    if _sliding_window_script is None:
+        _sliding_window_script = get_redis_connection("default").register_script(SLIDING_WINDOW_SCRIPT)
+    return _sliding_window_script
+
+
+def _sliding_window_key(ip: str) -> str:
+    return cache.make_key(f"rate_limit:sw:{ip}")
+
+
+def _sliding_window_args(cost: int = 1):
+    # The unique member lets requests in the same millisecond count separately
+    return [int(WINDOW.total_seconds() * 1000), RATE_LIMIT, uuid.uuid4().hex, cost]
+
+
+def _evaluate_sliding_window(ip: str, reply) -> RateLimitStatus:
+    allowed, current_count, reset_ms = reply
+    status = RateLimitStatus(
+        limit=RATE_LIMIT,
+        remaining=max(RATE_LIMIT - current_count, 0),
+        reset_after=max(math.ceil(reset_ms / 1000), 1),
+    )
+
+    if not allowed:
+        logger.warning(
+            "Rate limit exceeded",
+            extra={
+                'ip': ip,
+                'event': 'rate_limit_exceeded',
+                'current_count': current_count,
+                'limit': RATE_LIMIT,
+            }
+        )
+        raise RateLimitExceeded(f"Rate limit exceeded: {RATE_LIMIT} req/min", status)
+
+    logger.debug(
+        "Rate limit check passed",
+        extra={
+            'ip': ip,
+            'event': 'rate_limit_check',
+            'current_count': current_count,
+            'limit': RATE_LIMIT,
+        }
+    )
+    return status
+
+
+def _check_fixed_window(ip: str, cost: int = 1) -> RateLimitStatus:
     cache_key = f"rate_limit:{ip}"
     current_count = cache.get(cache_key, 0)
+    window_seconds = int(WINDOW.total_seconds())
 
-    if current_count >= RATE_LIMIT:
+    if current_count + cost > RATE_LIMIT:
         logger.warning(
             "Rate limit exceeded",
             extra={
@@ -39,19 +331,23 @@ def check_rate_limit(ip: str):
                 'limit': RATE_LIMIT,
             }
         )
-        raise RateLimitExceeded(f"Rate limit exceeded: {RATE_LIMIT} req/min")
+        raise RateLimitExceeded(
+            f"Rate limit exceeded: {RATE_LIMIT} req/min",
+            RateLimitStatus(limit=RATE_LIMIT, remaining=0, reset_after=window_seconds),
+        )
 
     if current_count == 0:
-        cache.set(cache_key, 1, timeout=60)
+        cache.set(cache_key, cost, timeout=window_seconds)
     else:
-        cache.incr(cache_key)
+        cache.incr(cache_key, cost)
 
     logger.debug(
         "Rate limit check passed",
         extra={
             'ip': ip,
             'event': 'rate_limit_check',
-            'current_count': current_count + 1,
+            'current_count': current_count + cost,
             'limit': RATE_LIMIT,
         }
-    )
\ No newline at end of file
+    )
+    return RateLimitStatus(limit=RATE_LIMIT, remaining=RATE_LIMIT - current_count - cost, reset_after=window_seconds)
@@ -0,0 +1,315 @@
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django_redis.cache import RedisCache
+from django_redis.exceptions import ConnectionInterrupted
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from .local_cache import LocalTTLCache
+
+logger = logging.getLogger("weather")
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# Redis unreachable or slower than the socket timeout, as opposed to a failing command
+REDIS_ERRORS = (RedisConnectionError, RedisTimeoutError, ConnectionInterrupted, OSError)
+
+
+class RedisHealth:
+    """
+    In-process circuit breaker for Redis itself (the shared breakers keep
+    their state in Redis, so they cannot guard it). After `failure_threshold`
+    consecutive connection errors or timeouts, Redis calls are skipped for
+    `open_duration` seconds and callers take their local fallback at once;
+    then a single call probes Redis again. Counters are per process.
+    """
+
+    def __init__(self, failure_threshold: int, open_duration: float, timer=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.open_duration = open_duration
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._retry_at = 0.0
+        self._counts = dict.fromkeys(("errors", "short_circuited", "opened"), 0)
+
+    @property
+    def is_open(self) -> bool:
+        """True while calls are being skipped; unlike available() this never claims the probe."""
+        return self._state != CLOSED and self._timer() < self._retry_at
+
+    def available(self) -> bool:
+        """Whether to try Redis now; past the open period the first caller becomes the probe."""
+        if self._state == CLOSED:
+            return True
+        with self._lock:
+            if self._state != CLOSED and self._timer() < self._retry_at:
+                self._counts["short_circuited"] += 1
+                return False
+            if self._state != CLOSED:
+                # Other callers keep falling back until the probe reports
+                self._state = HALF_OPEN
+                self._retry_at = self._timer() + self.open_duration
+            return True
+
+    def record_success(self):
+        if self._state == CLOSED and not self._failures:
+            return
+        with self._lock:
+            recovered = self._state != CLOSED
+            self._state = CLOSED
+            self._failures = 0
+        if recovered:
+            logger.info("Redis reachable again - leaving local failover", extra={'event': 'redis_recovered'})
+
+    def record_failure(self, operation: str, error: Exception):
+        """Counts `error` if it means Redis is unreachable; other errors are ignored."""
+        if not isinstance(error, REDIS_ERRORS):
+            return
+        with self._lock:
+            self._counts["errors"] += 1
+            self._failures += 1
+            opened = self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self.failure_threshold
+            )
+            if opened:
+                self._state = OPEN
+                self._retry_at = self._timer() + self.open_duration
+                self._counts["opened"] += 1
+
+        logger.warning(
+            "Redis unavailable - opening breaker, serving from local failover" if opened
+            else "Redis unavailable - using local failover",
+            extra={
+                'event': 'redis_breaker_open' if opened else 'redis_error',
+                'operation': operation,
+                'error': str(error),
+            }
+        )
+
+    def call(self, operation: str, fn, fallback):
+        """fn() if Redis is available and answers, otherwise fallback()."""
+        if not self.available():
+            return fallback()
+        try:
+            result = fn()
+        except REDIS_ERRORS as e:
+            self.record_failure(operation, e)
+            return fallback()
+        self.record_success()
+        return result
+
+    async def acall(self, operation: str, fn, fallback):
+        """Async call(): awaits fn(); fallback is a plain callable."""
+        if not self.available():
+            return fallback()
+        try:
+            result = await fn()
+        except REDIS_ERRORS as e:
+            self.record_failure(operation, e)
+            return fallback()
+        self.record_success()
+        return result
+
+    def reset(self):
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._retry_at = 0.0
+            for counter in self._counts:
+                self._counts[counter] = 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._counts, state=self._state, consecutive_failures=self._failures)
+            if self._state != CLOSED:
+                stats["retry_after"] = max(round(self._retry_at - self._timer(), 1), 0)
+        stats["failover_entries"] = failover_cache.stats()["size"]
+        return stats
+
+
+class _LocalLocks:
+    """Named in-process locks, dropped once nobody holds or waits for them."""
+
+    def __init__(self):
+        self._guard = threading.Lock()
+        self._locks = {}  # name -> [lock, users]
+
+    def acquire(self, name: str, blocking: bool, timeout: float):
+        with self._guard:
+            entry = self._locks.setdefault(name, [threading.Lock(), 0])
+            entry[1] += 1
+        acquired = entry[0].acquire(blocking, timeout if blocking else -1)
+        if not acquired:
+            self._leave(name, entry)
+        return acquired
+
+    def release(self, name: str):
+        with self._guard:
+            entry = self._locks[name]
+        entry[0].release()
+        self._leave(name, entry)
+
+    def _leave(self, name: str, entry: list):
+        with self._guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[name]
+
+
+class FailoverLock:
+    """
+    cache.lock() that falls back to an in-process lock of the same name while
+    Redis is unavailable, so coalescing is per process rather than cluster-wide.
+    Releasing a Redis lease Redis cannot be reached for is left to its expiry.
+    """
+
+    def __init__(self, name: str, redis_lock):
+        self.name = name
+        self._redis_lock = redis_lock
+        self._held_locally = False
+
+    def acquire(self, blocking: bool = None, blocking_timeout: float = None, **kwargs) -> bool:
+        acquired = redis_health.call(
+            "lock",
+            lambda: self._redis_lock.acquire(blocking=blocking, blocking_timeout=blocking_timeout, **kwargs),
+            lambda: None,
+        )
+        if acquired is not None:
+            return acquired
+        blocking = blocking is not False
+        self._held_locally = _local_locks.acquire(
+            self.name, blocking, -1 if blocking_timeout is None else blocking_timeout
+        )
+        return self._held_locally
+
+    def release(self):
+        if self._held_locally:
+            self._held_locally = False
+            _local_locks.release(self.name)
+            return
+        redis_health.call("unlock", self._redis_lock.release, lambda: None)
+
+
+class ResilientRedisCache(RedisCache):
+    """
+    django-redis backend that keeps serving while Redis is down or slow.
+    Calls go through `redis_health`; on a connection error or timeout, and
+    without trying while the breaker is open, reads and writes use
+    `failover_cache`, a small in-process store with a short TTL. Reads of
+    keys not in it are misses, so lookups fall through to the database tier.
+    """
+
+    def get(self, key, default=None, version=None, client=None):
+        return redis_health.call(
+            "get",
+            lambda: super(ResilientRedisCache, self).get(key, default, version=version, client=client),
+            lambda: _failover_get(self.make_key(key, version=version), default),
+        )
+
+    def get_many(self, keys, version=None, client=None):
+        def fallback():
+            found = {}
+            for key in keys:
+                value = _failover_get(self.make_key(key, version=version), _MISSING)
+                if value is not _MISSING:
+                    found[key] = value
+            return found
+
+        return redis_health.call(
+            "get_many",
+            lambda: super(ResilientRedisCache, self).get_many(keys, version=version, client=client),
+            fallback,
+        )
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None, nx=False, xx=False):
+        def fallback():
+            made_key = self.make_key(key, version=version)
+            exists = _failover_get(made_key, _MISSING) is not _MISSING
+            if (nx and exists) or (xx and not exists):
+                return False
+            self._failover_set(made_key, value, timeout)
+            return True
+
+        return redis_health.call(
+            "set",
+            lambda: super(ResilientRedisCache, self).set(
+                key, value, timeout=timeout, version=version, client=client, nx=nx, xx=xx
+            ),
+            fallback,
+        )
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None, client=None):
+        return self.set(key, value, timeout=timeout, version=version, client=client, nx=True)
+
+    def delete(self, key, version=None, prefix=None, client=None):
+        def fallback():
+            failover_cache.delete(self.make_key(key, version=version))
+            return True
+
+        return redis_health.call(
+            "delete",
+            lambda: super(ResilientRedisCache, self).delete(key, version=version, prefix=prefix, client=client),
+            fallback,
+        )
+
+    def incr(self, key, delta=1, version=None, client=None, ignore_key_check=False):
+        def fallback():
+            made_key = self.make_key(key, version=version)
+            value = _failover_get(made_key, None)
+            if value is None and not ignore_key_check:
+                raise ValueError(f"Key '{key}' not found")
+            value = (value or 0) + delta
+            self._failover_set(made_key, value, DEFAULT_TIMEOUT)
+            return value
+
+        return redis_health.call(
+            "incr",
+            lambda: super(ResilientRedisCache, self).incr(
+                key, delta=delta, version=version, client=client, ignore_key_check=ignore_key_check
+            ),
+            fallback,
+        )
+
+    def lock(self, key, version=None, **kwargs):
+        return FailoverLock(str(self.make_key(key, version=version)), super().lock(key, version=version, **kwargs))
+
+    def _failover_set(self, made_key, value, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is not None and timeout <= 0:
+            failover_cache.delete(made_key)
+            return
+        failover_cache.set(made_key, (value,), ttl=min(timeout or failover_cache.ttl, failover_cache.ttl))
+
+
+_MISSING = object()
+
+
+def _failover_get(made_key, default):
+    # Stored wrapped so cached None/False values are told apart from misses
+    item = failover_cache.get(made_key)
+    return default if item is None else item[0]
+
+
+def failover_values(keys: list) -> list:
+    """Failover-tier values of raw cache keys (None if absent), for callers reading Redis directly."""
+    return [_failover_get(cache_key, None) for cache_key in keys]
+
+
+_local_locks = _LocalLocks()
+
+failover_cache = LocalTTLCache(
+    maxsize=settings.WEATHER_REDIS_FAILOVER_SIZE,
+    ttl=settings.WEATHER_REDIS_FAILOVER_TTL,
+)
+
+redis_health = RedisHealth(
+    failure_threshold=settings.WEATHER_REDIS_FAILURE_THRESHOLD,
+    open_duration=settings.WEATHER_REDIS_RETRY_SECONDS,
+)
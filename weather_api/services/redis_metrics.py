@@ -0,0 +1,65 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from redis.connection import Connection, ConnectionPool
+
+# Innermost active counter for the current thread/task; None means not counting
+_active_counter = ContextVar("redis_round_trip_counter", default=None)
+
+
+class RoundTripCounter:
+    def __init__(self, parent=None):
+        self.parent = parent
+        self.count = 0
+
+    def increment(self):
+        counter = self
+        while counter is not None:
+            counter.count += 1
+            counter = counter.parent
+
+
+class CountingConnection(Connection):
+    """
+    Counts every write to the socket as one round trip. A pipeline is sent
+    with a single write, so it counts once. Connection handshakes are not counted.
+    """
+
+    def connect(self):
+        token = _active_counter.set(None)
+        try:
+            super().connect()
+        finally:
+            _active_counter.reset(token)
+
+    def send_packed_command(self, command, check_health=True):
+        counter = _active_counter.get()
+        if counter is not None:
+            counter.increment()
+        return super().send_packed_command(command, check_health)
+
+
+class CountingConnectionPool(ConnectionPool):
+    """Plugged into django-redis via CACHES OPTIONS['CONNECTION_POOL_CLASS']."""
+
+    def __init__(self, connection_class=Connection, *args, **kwargs):
+        if connection_class is Connection:
+            connection_class = CountingConnection
+        super().__init__(connection_class, *args, **kwargs)
+
+
+@contextmanager
+def count_round_trips():
+    """
+    Counts Redis round trips made by the current thread inside the block:
+
+        with count_round_trips() as trips:
+            ...
+        trips.count
+    """
+    counter = RoundTripCounter(parent=_active_counter.get())
+    token = _active_counter.set(counter)
+    try:
+        yield counter
+    finally:
+        _active_counter.reset(token)
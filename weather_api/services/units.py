@@ -0,0 +1,36 @@
+# Observations are fetched and stored in metric units (°C, m/s) only, so one
+# cache entry serves both unit systems; Fahrenheit responses are converted
+# to °F and mph when serialized.
+CANONICAL_UNITS = "C"
+
+METERS_PER_SECOND_IN_MPH = 0.44704
+
+TEMPERATURE_FIELDS = ("temperature", "feels_like")
+SPEED_FIELDS = ("wind_speed",)
+
+
+def convert_temperature(value, units: str):
+    """Metric temperature in the requested units; None stays None."""
+    if value is None or units == CANONICAL_UNITS:
+        return value
+    return round(value * 9 / 5 + 32, 2)
+
+
+def convert_speed(value, units: str):
+    """Metric speed in the requested units; None stays None."""
+    if value is None or units == CANONICAL_UNITS:
+        return value
+    return round(value / METERS_PER_SECOND_IN_MPH, 2)
+
+
+def convert_fields(data: dict, units: str) -> dict:
+    """Converts the unit-dependent keys present in a serialized weather dict, in place."""
+    if units == CANONICAL_UNITS:
+        return data
+    for field in TEMPERATURE_FIELDS:
+        if field in data:
+            data[field] = convert_temperature(data[field], units)
+    for field in SPEED_FIELDS:
+        if field in data:
+            data[field] = convert_speed(data[field], units)
+    return data
@@ -0,0 +1,220 @@
+import logging
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django_redis import get_redis_connection
+
+from .async_redis import LuaScript
+from .redis_failover import redis_health
+
+logger = logging.getLogger("weather")
+
+INTERACTIVE = "interactive"
+BACKGROUND = "background"
+
+# Priority of upstream calls made in the current thread/task
+_priority = ContextVar("upstream_priority", default=INTERACTIVE)
+
+# Token bucket in one atomic call, on the Redis clock so all workers agree.
+# A call may take `cost` tokens only if at least `floor` tokens remain after
+# it (0 for interactive calls, the reserve for background ones).
+# Returns {allowed, tokens left in thousandths}.
+ACQUIRE_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local refill_per_ms = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local floor = tonumber(ARGV[4])
+
+local tokens = tonumber(redis.call('HGET', KEYS[1], 'tokens') or capacity)
+local updated = tonumber(redis.call('HGET', KEYS[1], 'updated') or now)
+tokens = math.min(capacity, tokens + math.max(0, now - updated) * refill_per_ms)
+
+local allowed = 0
+if tokens - cost >= floor then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / refill_per_ms) + 1000)
+return {allowed, math.floor(tokens * 1000)}
+"""
+
+# Upstream answered 429: empty the bucket so every worker backs off
+EXHAUST_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+redis.call('HSET', KEYS[1], 'tokens', '0', 'updated', now)
+redis.call('PEXPIRE', KEYS[1], tonumber(ARGV[1]))
+return 1
+"""
+
+
+class QuotaExhausted(Exception):
+    """The shared upstream call budget is spent; the call was not attempted."""
+
+
+class UpstreamQuota:
+    """
+    Cluster-wide token bucket for the OpenWeatherMap key's per-minute call
+    limit, with its state in Redis so all workers and replicas share it.
+
+    Holds up to `burst` calls and refills at (per_minute - burst) per minute,
+    so no 60-second window exceeds `per_minute` calls. Background refreshes
+    cannot take the last `background_reserve` tokens, which keeps room for
+    interactive requests. `per_minute` 0 disables the bucket. If Redis is
+    unavailable calls are let through, without trying Redis while
+    `redis_health` has it marked down. Grant/deny counters are per process.
+    """
+
+    def __init__(self, name: str, per_minute: int, burst: int, background_reserve: float):
+        self.name = name
+        self.per_minute = per_minute
+        self.burst = max(1, min(burst, per_minute - 1)) if per_minute > 1 else per_minute
+        self.background_reserve = background_reserve
+        self._acquire_script = None
+        self._exhaust_script = None
+        self._async_acquire_script = LuaScript(ACQUIRE_SCRIPT)
+        self._lock = threading.Lock()
+        self._counts = {
+            f"{priority}_{outcome}": 0
+            for priority in (INTERACTIVE, BACKGROUND)
+            for outcome in ("granted", "denied")
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return self.per_minute > 0
+
+    @property
+    def key(self) -> str:
+        return cache.make_key(f"upstream_quota:{self.name}")
+
+    def acquire(self, cost: int = 1):
+        """Takes `cost` tokens at the current priority, or raises QuotaExhausted."""
+        if not self.enabled or redis_health.is_open:
+            return
+        priority = _priority.get()
+        try:
+            if self._acquire_script is None:
+                self._acquire_script = get_redis_connection("default").register_script(ACQUIRE_SCRIPT)
+            allowed, tokens = self._acquire_script(keys=[self.key], args=self._acquire_args(cost, priority))
+        except Exception as e:
+            self._log_unavailable(e)
+            return
+        self._settle(priority, allowed, tokens)
+
+    async def aacquire(self, cost: int = 1):
+        """Async acquire() for ASGI views."""
+        if not self.enabled or redis_health.is_open:
+            return
+        priority = _priority.get()
+        try:
+            allowed, tokens = await self._async_acquire_script(
+                keys=[self.key], args=self._acquire_args(cost, priority)
+            )
+        except Exception as e:
+            self._log_unavailable(e)
+            return
+        self._settle(priority, allowed, tokens)
+
+    def exhaust(self):
+        """Empties the bucket after upstream rejected a call for exceeding the key's limit."""
+        if not self.enabled or redis_health.is_open:
+            return
+        try:
+            if self._exhaust_script is None:
+                self._exhaust_script = get_redis_connection("default").register_script(EXHAUST_SCRIPT)
+            self._exhaust_script(keys=[self.key], args=[self._ttl_ms()])
+        except Exception as e:
+            self._log_unavailable(e)
+            return
+        logger.warning(
+            "Upstream rejected a call for exceeding the quota - emptying the shared budget",
+            extra={
+                'event': 'upstream_quota_exceeded',
+                'quota': self.name,
+            }
+        )
+
+    def stats(self) -> dict:
+        """Configuration, this process's grant/deny counters and the shared bucket level."""
+        with self._lock:
+            stats = dict(self._counts)
+        stats.update(per_minute=self.per_minute, burst=self.burst, tokens=None)
+        if self.enabled and not redis_health.is_open:
+            try:
+                fields = get_redis_connection("default").hmget(self.key, "tokens", "updated")
+            except Exception:
+                return stats
+            # Level as of the last call; the bucket refills between calls
+            stats["tokens"] = round(float(fields[0]), 2) if fields[0] is not None else float(self.burst)
+        return stats
+
+    def reset(self):
+        get_redis_connection("default").delete(self.key)
+
+    def _acquire_args(self, cost: int, priority: str) -> list:
+        floor = self.burst * self.background_reserve if priority == BACKGROUND else 0
+        return [self.burst, self._refill_per_ms(), cost, floor]
+
+    def _refill_per_ms(self) -> float:
+        return max(self.per_minute - self.burst, 1) / 60000
+
+    def _ttl_ms(self) -> int:
+        return int(self.burst / self._refill_per_ms()) + 1000
+
+    def _settle(self, priority: str, allowed, tokens):
+        outcome = "granted" if allowed else "denied"
+        with self._lock:
+            self._counts[f"{priority}_{outcome}"] += 1
+        if allowed:
+            return
+        logger.warning(
+            "Upstream call budget exhausted - not calling upstream",
+            extra={
+                'event': 'upstream_quota_denied',
+                'quota': self.name,
+                'priority': priority,
+                'tokens': tokens / 1000,
+            }
+        )
+        raise QuotaExhausted(f"Upstream call budget exhausted ({self.per_minute}/min)")
+
+    def _log_unavailable(self, error: Exception):
+        redis_health.record_failure("upstream_quota", error)
+        logger.warning(
+            "Upstream quota state unavailable - allowing call",
+            extra={
+                'event': 'upstream_quota_error',
+                'quota': self.name,
+                'error': str(error),
+            }
+        )
+
+
+@contextmanager
+def upstream_priority(priority: str):
+    """
+    Upstream calls made by the current thread/task inside the block use `priority`:
+
+        with upstream_priority(BACKGROUND):
+            ...
+    """
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+upstream_quota = UpstreamQuota(
+    name="openweather",
+    per_minute=settings.WEATHER_UPSTREAM_QUOTA_PER_MINUTE,
+    burst=settings.WEATHER_UPSTREAM_QUOTA_BURST,
+    background_reserve=settings.WEATHER_UPSTREAM_BACKGROUND_RESERVE,
+)
@@ -1,6 +1,25 @@
+import httpx
 import requests
+from asgiref.sync import sync_to_async
 from django.conf import settings
 
+from .circuit_breaker import upstream_breaker, CircuitOpen
+from .http_client import http_client, async_http_client
+from .upstream_quota import upstream_quota, QuotaExhausted
+
+
+class CityNotFound(ValueError):
+    pass
+
+
+class WeatherAPIError(ValueError):
+    pass
+
+
+class UpstreamUnavailable(Exception):
+    """The upstream circuit is open or the call budget is spent; the call was not attempted."""
+
+
 class OpenWeatherAPI:
     """
     Adapter for OpenWeatherMap API with error handling and data normalization.
@@ -8,30 +27,175 @@ class OpenWeatherAPI:
     """
 
     BASE_URL = "https://api.openweathermap.org/data/2.5/weather"
+    # Current weather for several cities by OpenWeatherMap city id, in one call
+    GROUP_URL = "https://api.openweathermap.org/data/2.5/group"
+    GROUP_MAX_IDS = 20
 
     @staticmethod
-    def fetch_weather(city: str, units: str = "C") -> dict:
+    def fetch_weather(city: str) -> dict:
+        """
+        Fetches current weather, always in metric units, through the shared
+        upstream quota and circuit breaker. Raises UpstreamUnavailable without
+        a network call while the budget is spent or the circuit is open.
+        """
         try:
-            units_param = "metric" if units == "C" else "imperial"
+            return upstream_breaker.call(
+                OpenWeatherAPI._metered, OpenWeatherAPI._request_weather, city,
+                ignore=CityNotFound, uncounted=QuotaExhausted,
+            )
+        except (QuotaExhausted, CircuitOpen) as e:
+            raise UpstreamUnavailable(str(e))
 
-            params = {
-                "q": city,
-                "appid": settings.OPENWEATHER_API_KEY,
-                "units": units_param,
-                "lang": "en",
-            }
+    @staticmethod
+    def fetch_weather_by_coordinates(latitude: float, longitude: float) -> dict:
+        """fetch_weather for the place upstream resolves the coordinates to."""
+        try:
+            return upstream_breaker.call(
+                OpenWeatherAPI._metered, OpenWeatherAPI._request, OpenWeatherAPI._coordinate_params(latitude, longitude),
+                ignore=CityNotFound, uncounted=QuotaExhausted,
+            )
+        except (QuotaExhausted, CircuitOpen) as e:
+            raise UpstreamUnavailable(str(e))
+
+    @staticmethod
+    def fetch_weather_by_id(city_id: int) -> dict:
+        """fetch_weather for one OpenWeatherMap city id."""
+        try:
+            return upstream_breaker.call(
+                OpenWeatherAPI._metered, OpenWeatherAPI._request, OpenWeatherAPI._id_params(city_id),
+                ignore=CityNotFound, uncounted=QuotaExhausted,
+            )
+        except (QuotaExhausted, CircuitOpen) as e:
+            raise UpstreamUnavailable(str(e))
 
-            response = requests.get(OpenWeatherAPI.BASE_URL, params=params, timeout=5)
+    @staticmethod
+    def fetch_group(city_ids: list) -> dict:
+        """
+        Current weather for up to GROUP_MAX_IDS OpenWeatherMap city ids in one
+        call, through the circuit breaker and quota. Returns {city_id: payload} with
+        payloads shaped like fetch_weather's; ids upstream does not know are absent.
+        """
+        if len(city_ids) > OpenWeatherAPI.GROUP_MAX_IDS:
+            raise ValueError(f"At most {OpenWeatherAPI.GROUP_MAX_IDS} city ids per group request")
+        try:
+            return upstream_breaker.call(
+                OpenWeatherAPI._metered, OpenWeatherAPI._request_group, city_ids, uncounted=QuotaExhausted
+            )
+        except (QuotaExhausted, CircuitOpen) as e:
+            raise UpstreamUnavailable(str(e))
+
+    @staticmethod
+    async def afetch_weather(city: str) -> dict:
+        """Async fetch_weather on the shared async client, for ASGI views."""
+        try:
+            return await upstream_breaker.acall(
+                OpenWeatherAPI._ametered, OpenWeatherAPI._arequest_weather, city,
+                ignore=CityNotFound, uncounted=QuotaExhausted,
+            )
+        except (QuotaExhausted, CircuitOpen) as e:
+            raise UpstreamUnavailable(str(e))
+
+    @staticmethod
+    def _metered(request, *args) -> dict:
+        # Runs inside the breaker, so no tokens are spent while the circuit is open
+        upstream_quota.acquire()
+        return request(*args)
+
+    @staticmethod
+    async def _ametered(request, *args) -> dict:
+        await upstream_quota.aacquire()
+        return await request(*args)
+
+    @staticmethod
+    def _request_weather(city: str) -> dict:
+        return OpenWeatherAPI._request(OpenWeatherAPI._params(city))
+
+    @staticmethod
+    def _request(params: dict) -> dict:
+        try:
+            response = http_client.get(OpenWeatherAPI.BASE_URL, params=params)
 
             if response.status_code == 404:
-                raise ValueError("City not found")
+                raise CityNotFound("City not found")
+
+            if response.status_code == 429:
+                # Over the key's limit: stop every worker until the bucket refills
+                upstream_quota.exhaust()
 
             response.raise_for_status()
 
             return response.json()
 
         except requests.RequestException as e:
-            raise ValueError(f"Weather API error: {str(e)}")
+            raise WeatherAPIError(f"Weather API error: {str(e)}")
+
+    @staticmethod
+    def _request_group(city_ids: list) -> dict:
+        params = {
+            "id": ",".join(str(city_id) for city_id in city_ids),
+            "appid": settings.OPENWEATHER_API_KEY,
+            "units": "metric",
+            "lang": "en",
+        }
+        try:
+            response = http_client.get(OpenWeatherAPI.GROUP_URL, params=params)
+
+            if response.status_code == 429:
+                # Over the key's limit: stop every worker until the bucket refills
+                upstream_quota.exhaust()
+
+            response.raise_for_status()
+            return {item["id"]: item for item in response.json().get("list", [])}
+
+        except requests.RequestException as e:
+            raise WeatherAPIError(f"Weather API error: {str(e)}")
+
+    @staticmethod
+    async def _arequest_weather(city: str) -> dict:
+        try:
+            response = await async_http_client.get(OpenWeatherAPI.BASE_URL, params=OpenWeatherAPI._params(city))
+
+            if response.status_code == 404:
+                raise CityNotFound("City not found")
+
+            if response.status_code == 429:
+                # Over the key's limit: stop every worker until the bucket refills
+                await sync_to_async(upstream_quota.exhaust)()
+
+            response.raise_for_status()
+
+            return response.json()
+
+        except httpx.HTTPError as e:
+            raise WeatherAPIError(f"Weather API error: {str(e)}")
+
+    @staticmethod
+    def _params(city: str) -> dict:
+        return {
+            "q": city,
+            "appid": settings.OPENWEATHER_API_KEY,
+            "units": "metric",
+            "lang": "en",
+        }
+
+    @staticmethod
+    def _id_params(city_id: int) -> dict:
+        return {
+            "id": city_id,
+            "appid": settings.OPENWEATHER_API_KEY,
+            "units": "metric",
+            "lang": "en",
+        }
+
+    @staticmethod
+    def _coordinate_params(latitude: float, longitude: float) -> dict:
+        return {
+            "lat": latitude,
+            "lon": longitude,
+            "appid": settings.OPENWEATHER_API_KEY,
+            "units": "metric",
+            "lang": "en",
+        }
 
     @staticmethod
     def normalize_weather_data(data: dict) -> dict:
@@ -53,6 +217,12 @@ class OpenWeatherAPI:
             "icon": weather.get("icon"),
         }
 
+    @staticmethod
+    def observed_at(data: dict):
+        """Epoch seconds upstream measured the observation at (`dt`), or None."""
+        dt = data.get("dt")
+        return float(dt) if isinstance(dt, (int, float)) else None
+
     @staticmethod
     def normalize_location_data(data: dict) -> dict:
         return {
@@ -60,4 +230,5 @@ class OpenWeatherAPI:
             "country_code": data.get("sys", {}).get("country"),
             "latitude": data.get("coord", {}).get("lat"),
             "longitude": data.get("coord", {}).get("lon"),
+            "owm_id": data.get("id"),
         }
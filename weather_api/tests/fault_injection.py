@@ -0,0 +1,42 @@
+from unittest.mock import patch
+
+import redis.asyncio.connection
+from redis.exceptions import ConnectionError as RedisConnectionError, TimeoutError as RedisTimeoutError
+
+from ..services.rate_limiter import local_rate_limiter
+from ..services.redis_failover import failover_cache, redis_health
+from ..services.redis_metrics import CountingConnection
+
+
+class RedisOutage:
+    """
+    Fault injection at the Redis connection layer: inside the block every
+    command sent by the sync (django-redis, scripts, pipelines, locks) and
+    async clients fails, as refused connections or, with slow=True, as socket
+    timeouts. `commands` counts the attempts that reached the connection.
+    Leaving the block restores Redis and resets the failover state.
+    """
+
+    def __init__(self, slow: bool = False):
+        self.error = (RedisTimeoutError if slow else RedisConnectionError)("Injected Redis outage")
+        self._patches = [
+            patch.object(CountingConnection, 'send_packed_command', side_effect=self.error),
+            patch.object(redis.asyncio.connection.AbstractConnection, 'send_packed_command', side_effect=self.error),
+        ]
+        self._mocks = []
+
+    @property
+    def commands(self) -> int:
+        return sum(mock.call_count for mock in self._mocks)
+
+    def __enter__(self):
+        self._mocks = [p.start() for p in self._patches]
+        return self
+
+    def __exit__(self, *exc_info):
+        for p in self._patches:
+            p.stop()
+        redis_health.reset()
+        failover_cache.clear()
+        local_rate_limiter.clear()
+        return False
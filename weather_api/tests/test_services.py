@@ -1,16 +1,51 @@
-from django.test import TestCase
+import asyncio
+import threading
+import time
+from datetime import timedelta
+
+import httpx
+import requests
+
+from django.conf import settings
+from django.test import TestCase, override_settings
 from django.utils import timezone
-from unittest.mock import patch, MagicMock
+from unittest.mock import patch, MagicMock, AsyncMock
 from django.core.cache import cache
+from django_redis import get_redis_connection
+from redis.exceptions import ConnectionError as RedisConnectionError
 
-from ..models import Location, WeatherData, WeatherQuery
-from ..services.cash_service import get_weather_for_city
-from ..services.rate_limiter import check_rate_limit, RateLimitExceeded
+from ..models import Location, WeatherData, WeatherQuery, LatestObservation, RawResponse, CityAlias
+from ..serializers import WeatherQuerySerializer
+from ..services import cash_service
+from ..services.cash_service import (
+    get_weather_for_city, get_weather_for_cities, get_weather_for_coordinates, aget_weather_for_city, local_cache,
+)
+from ..services.cache_codec import encode_entry, decode_entry, CacheDecodeError
+from ..services.city_aliases import CityAliasMap, city_aliases, normalize_city
+from ..services.geo import cells_within, haversine_km, location_grid
+from ..services.circuit_breaker import CircuitBreaker, CircuitOpen, upstream_breaker
+from ..services.hot_refresh import CallBudget, HotCityRefresher
+from ..services.http_client import PooledHTTPClient
+from ..services.local_cache import LocalTTLCache
+from ..services.negative_cache import negative_cache
+from ..services.observation_ttl import ObservationTTL, observation_ttl
+from ..services.query_log import QueryLogWriter
+from ..services.rate_limiter import check_rate_limit, check_rate_limit_and_get, RateLimitExceeded, RATE_LIMIT
+from ..services.redis_failover import RedisHealth, redis_health
+from ..services.redis_metrics import count_round_trips
+from ..services.single_flight import SingleFlight
+from ..services.upstream_quota import UpstreamQuota, QuotaExhausted, upstream_priority, BACKGROUND
+from ..services.weather_api_service import OpenWeatherAPI, CityNotFound, UpstreamUnavailable, WeatherAPIError
+from .fault_injection import RedisOutage
 
 
 class ServiceTests(TestCase):
     def setUp(self):
         cache.clear()
+        local_cache.clear()
+        city_aliases.clear()
+        location_grid.clear()
+        observation_ttl.clear()
         self.mock_weather_data = {
             'main': {
                 'temp': 20.5,
@@ -34,7 +69,12 @@ class ServiceTests(TestCase):
         }
 
     def tearDown(self):
+        cash_service._backfill_executor.submit(lambda: None).result()
         cache.clear()
+        local_cache.clear()
+        city_aliases.clear()
+        location_grid.clear()
+        observation_ttl.clear()
 
     @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
     def test_get_weather_for_city_fresh_fetch(self, mock_fetch):
@@ -47,7 +87,7 @@ class ServiceTests(TestCase):
         self.assertEqual(query.weather_data.temperature, 20.5)
         self.assertEqual(query.units, 'C')
 
-        mock_fetch.assert_called_once_with('london', 'C')
+        mock_fetch.assert_called_once_with('london')
 
     @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
     def test_cache_reuse_same_city_same_units(self, mock_fetch):
@@ -62,16 +102,24 @@ class ServiceTests(TestCase):
         self.assertEqual(mock_fetch.call_count, 1)
 
     @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
-    def test_no_cache_reuse_different_units(self, mock_fetch):
+    def test_cache_shared_across_units(self, mock_fetch):
         mock_fetch.return_value = self.mock_weather_data
 
         query1 = get_weather_for_city('London', 'C', '127.0.0.1')
         self.assertFalse(query1.served_from_cache)
 
         query2 = get_weather_for_city('London', 'F', '127.0.0.1')
-        self.assertFalse(query2.served_from_cache)
+        self.assertTrue(query2.served_from_cache)
+        self.assertEqual(query2.units, 'F')
+        self.assertEqual(query2.weather_data.temperature, 20.5)  # stored metric
 
-        self.assertEqual(mock_fetch.call_count, 2)
+        weather = WeatherQuerySerializer(query2).data['weather_data']
+        self.assertEqual(weather['temperature'], 68.9)
+        self.assertEqual(weather['feels_like'], 66.2)
+        self.assertEqual(weather['wind_speed'], 9.4)
+        self.assertEqual(WeatherQuerySerializer(query1).data['weather_data']['temperature'], 20.5)
+
+        self.assertEqual(mock_fetch.call_count, 1)
 
     def test_rate_limit_normal_usage(self):
         ip = '127.0.0.1'
@@ -130,4 +178,1128 @@ class ServiceTests(TestCase):
         final_count = WeatherQuery.objects.count()
         self.assertEqual(final_count, initial_count)
 
-        mock_fetch.assert_not_called()
\ No newline at end of file
+        mock_fetch.assert_not_called()
+
+    def test_single_flight_coalesces_concurrent_calls(self):
+        flight = SingleFlight()
+        calls = []
+        results = []
+
+        def slow_fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return 'fresh'
+
+        def worker():
+            results.append(flight.do('weather:london', slow_fetch, timeout=2))
+
+        threads = [threading.Thread(target=worker) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(sorted(shared for _, shared in results), [False, True, True, True, True])
+        self.assertTrue(all(result == 'fresh' for result, _ in results))
+
+    def test_single_flight_wait_is_bounded(self):
+        flight = SingleFlight()
+        started = threading.Event()
+
+        def blocking_fetch():
+            started.set()
+            time.sleep(0.3)
+            return 'fresh'
+
+        leader = threading.Thread(target=flight.do, args=('weather:london', blocking_fetch))
+        leader.start()
+        started.wait()
+
+        with self.assertRaises(TimeoutError):
+            flight.do('weather:london', blocking_fetch, timeout=0.05)
+        leader.join()
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_refresh_waits_for_other_worker_lease(self, mock_fetch):
+        location = Location.objects.create(city='london', country_code='GB')
+        weather_data = WeatherData.objects.create(temperature=18.0, main_weather='Clear', description='clear sky')
+
+        lock = cache.lock('lock:weather:london', timeout=5)
+        self.assertTrue(lock.acquire(blocking=False))
+
+        # Simulates the lease holder in another worker publishing its result
+        publisher = threading.Timer(
+            0.1, cache.set, args=('weather:london', encode_entry(location, weather_data, time.time(), time.time() + 300)),
+            kwargs={'timeout': 300}
+        )
+        publisher.start()
+        try:
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+        finally:
+            publisher.join()
+            lock.release()
+
+        mock_fetch.assert_not_called()
+        self.assertTrue(query.served_from_cache)
+        self.assertEqual(query.weather_data, weather_data)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_lease_waiters_follow_the_holders_outcome(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        # Not thread-local, so the simulated holder can release it from its timer thread
+        lock = cache.lock('lock:weather:london', timeout=5, thread_local=False)
+
+        # The lease holder found no such city: waiters re-raise its tombstone
+        self.assertTrue(lock.acquire(blocking=False))
+        holder = threading.Timer(0.1, cache.set, args=(negative_cache.key('london'), 'not_found'), kwargs={'timeout': 60})
+        holder.start()
+        start = time.monotonic()
+        try:
+            with self.assertRaises(CityNotFound):
+                get_weather_for_city('London', 'C', '127.0.0.1')
+        finally:
+            holder.join()
+            lock.release()
+        self.assertLess(time.monotonic() - start, 1)
+        mock_fetch.assert_not_called()
+
+        # The lease holder failed without leaving anything: stop waiting once it lets go
+        cache.delete(negative_cache.key('london'))
+        self.assertTrue(lock.acquire(blocking=False))
+        holder = threading.Timer(0.1, lock.release)
+        holder.start()
+        start = time.monotonic()
+        try:
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+        finally:
+            holder.join()
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertFalse(query.served_from_cache)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_local_cache_hit_skips_redis(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        with patch.object(cache, 'get', wraps=cache.get) as redis_get:
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertNotIn('weather:london', [call.args[0] for call in redis_get.call_args_list])
+        self.assertTrue(query.served_from_cache)
+        self.assertEqual(local_cache.stats()['hits'], 1)
+
+    def test_local_tier_never_outlives_the_soft_ttl(self):
+        location = Location.objects.create(city='london', country_code='GB')
+        weather_data = WeatherData.objects.create(temperature=18.0, main_weather='Clear', description='clear sky')
+        now = time.time()
+
+        cash_service._cache_locally('weather:stale', (location, weather_data, now - 400, now - 100))
+        cash_service._cache_locally('weather:due', (location, weather_data, now, now + 0.1))
+        self.assertIsNone(local_cache.get('weather:stale'))
+        self.assertIsNotNone(local_cache.get('weather:due'))
+
+        time.sleep(0.15)
+        self.assertIsNone(local_cache.get('weather:due'))
+
+    def test_local_cache_lru_eviction_and_ttl(self):
+        now = [0.0]
+        lru = LocalTTLCache(maxsize=2, ttl=60, timer=lambda: now[0])
+
+        lru.set('a', 1)
+        lru.set('b', 2)
+        self.assertEqual(lru.get('a'), 1)  # 'a' becomes most recently used
+        lru.set('c', 3)
+
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('c'), 3)
+
+        now[0] = 61.0
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(lru.stats()['hits'], 2)
+        self.assertEqual(lru.stats()['misses'], 2)
+        self.assertEqual(lru.stats()['size'], 1)
+
+    @patch('weather_api.services.cash_service._refresh_executor')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_stale_entry_served_with_single_background_refresh(self, mock_fetch, mock_executor):
+        location = Location.objects.create(city='london', country_code='GB')
+        weather_data = WeatherData.objects.create(temperature=18.0, main_weather='Clear', description='clear sky')
+        stale_fetched_at = time.time() - cash_service.CACHE_TTL.total_seconds() - 60
+        stale_expires_at = stale_fetched_at + cash_service.CACHE_TTL.total_seconds()
+        cache.set('weather:london', encode_entry(location, weather_data, stale_fetched_at, stale_expires_at), timeout=300)
+
+        try:
+            query1 = get_weather_for_city('London', 'C', '127.0.0.1')
+            query2 = get_weather_for_city('London', 'C', '127.0.0.1')
+        finally:
+            cash_service._pending_refreshes.clear()
+
+        mock_fetch.assert_not_called()
+        self.assertTrue(query1.served_from_cache)
+        self.assertTrue(query2.served_from_cache)
+        self.assertEqual(query2.weather_data, weather_data)
+        self.assertEqual(mock_executor.submit.call_count, 1)
+
+    @patch('weather_api.services.cash_service._refresh_executor')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_fresh_entry_does_not_schedule_refresh(self, mock_fetch, mock_executor):
+        mock_fetch.return_value = self.mock_weather_data
+
+        get_weather_for_city('London', 'C', '127.0.0.1')
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        mock_executor.submit.assert_not_called()
+
+    def test_observation_ttl_follows_upstream_cadence(self):
+        ttl = ObservationTTL(default_ttl=300, min_ttl=60, max_ttl=900)
+
+        first = ttl.schedule(None, 1000.0, 1100.0)
+        self.assertEqual(first['expires_at'], 1400.0)  # cadence unknown yet
+        self.assertEqual(first['observation_lag'], 100.0)
+
+        history = (first['observed_at'], first['update_interval'], first['observation_lag'])
+        second = ttl.schedule(history, 1600.0, 1700.0)
+        self.assertEqual(second['update_interval'], 600.0)
+        self.assertEqual(second['expires_at'], 2300.0)  # next dt + the usual lag
+
+        history = (second['observed_at'], second['update_interval'], second['observation_lag'])
+        unchanged = ttl.schedule(history, 1600.0, 2310.0)
+        self.assertEqual(unchanged['expires_at'], 2370.0)  # update overdue: retried after min_ttl
+        skipped = ttl.schedule(history, 3400.0, 3500.0)
+        self.assertEqual(skipped['update_interval'], 600.0)  # three updates apart, not one slow one
+        self.assertEqual(skipped['expires_at'], 4100.0)
+
+        self.assertEqual(ttl.schedule(None, None, 5000.0)['expires_at'], 5300.0)
+        self.assertEqual(ttl.stats()['fetches'], 5)
+        self.assertEqual(ttl.stats()['redundant_fetches'], 1)
+
+    @patch('weather_api.services.cash_service._refresh_executor')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_adaptive_ttl_applies_to_redis_and_database_tiers(self, mock_fetch, mock_executor):
+        now = time.time()
+        cash_service._store_observation('london', None, dict(self.mock_weather_data, dt=int(now) - 700))
+        cash_service._store_observation('london', None, dict(self.mock_weather_data, dt=int(now) - 100))
+
+        latest = LatestObservation.objects.get()
+        self.assertAlmostEqual(latest.update_interval, 600.0, delta=1)
+        # Next observation expected past the ceiling, so fresh for WEATHER_CACHE_MAX_TTL
+        ttl = (latest.expires_at - latest.fetched_at).total_seconds()
+        self.assertAlmostEqual(ttl, settings.WEATHER_CACHE_MAX_TTL, delta=1)
+        key = f"weather:loc:{latest.location_id}"
+        self.assertEqual(decode_entry(cache.get(key))[3], latest.expires_at.timestamp())
+
+        # Older than the default TTL but its next observation is not due: no refetch
+        location, weather_data, fetched_at, expires_at = decode_entry(cache.get(key))
+        cache.set(key, encode_entry(location, weather_data, now - 400, now + 200), timeout=300)
+        local_cache.clear()
+        get_weather_for_city('London', 'C', '127.0.0.1')
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(query.served_from_cache)
+        mock_fetch.assert_not_called()
+        mock_executor.submit.assert_not_called()
+        self.assertEqual(observation_ttl.stats()['refreshes_deferred'], 1)
+
+    def test_cache_codec_round_trip(self):
+        location = Location.objects.create(
+            city='london', country_code='GB', latitude=51.5, longitude=-0.12,
+            grid_cell=Location.grid_cell_for(51.5, -0.12), owm_id=2643743,
+        )
+        weather_data = WeatherData.objects.create(
+            temperature=18.0, humidity=60, main_weather='Clear', description='clear sky', icon='01d'
+        )
+
+        payload = encode_entry(location, weather_data, 1700000000.5, 1700000300.5)
+        decoded_location, decoded_weather, fetched_at, expires_at = decode_entry(payload)
+
+        self.assertEqual(decoded_location, location)
+        self.assertEqual(decoded_location.latitude, 51.5)
+        with self.assertNumQueries(0):
+            self.assertEqual(decoded_location.grid_cell, location.grid_cell)
+            self.assertEqual(decoded_location.owm_id, 2643743)
+        self.assertEqual(decoded_weather, weather_data)
+        self.assertEqual(decoded_weather.description, 'clear sky')
+        self.assertEqual(fetched_at, 1700000000.5)
+        self.assertEqual(expires_at, 1700000300.5)
+        self.assertFalse(decoded_weather._state.adding)
+
+    def test_cache_codec_rejects_unknown_payloads(self):
+        with self.assertRaises(CacheDecodeError):
+            decode_entry(b'j[999,0,[],[]]')
+        with self.assertRaises(CacheDecodeError):
+            decode_entry(b'j[1,0,[],[]]')  # schema 1 entries had no expiry
+        with self.assertRaises(CacheDecodeError):
+            decode_entry(b'j[2,0,0,[],[]]')  # schema 2 locations had no grid cell or city id
+        with self.assertRaises(CacheDecodeError):
+            decode_entry(b'\x80\x04legacy-pickle')
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_undecodable_redis_entry_is_a_miss(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        cache.set('weather:london', b'garbage', timeout=300)
+
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertFalse(query.served_from_cache)
+        mock_fetch.assert_called_once()
+
+    @override_settings(WEATHER_QUERY_LOG_MODE='write_behind')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_write_behind_defers_query_log_rows(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        writer = QueryLogWriter(max_queue_size=10, batch_size=10, flush_interval=1, autostart=False)
+
+        with patch('weather_api.services.query_log.query_log_writer', writer):
+            query1 = get_weather_for_city('London', 'C', '127.0.0.1')
+            query2 = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertIsNone(query1.id)
+        self.assertTrue(query2.served_from_cache)
+        self.assertEqual(WeatherQuery.objects.count(), 0)
+
+        self.assertEqual(writer.flush(), 2)
+        self.assertEqual(WeatherQuery.objects.count(), 2)
+        self.assertEqual(writer.stats()['written'], 2)
+
+    def test_write_behind_queue_overflow_is_counted(self):
+        location = Location.objects.create(city='london', country_code='GB')
+        writer = QueryLogWriter(max_queue_size=1, batch_size=10, flush_interval=1,
+                                enqueue_timeout=0, autostart=False)
+
+        self.assertTrue(writer.enqueue(WeatherQuery(location=location, ip_address='127.0.0.1')))
+        self.assertFalse(writer.enqueue(WeatherQuery(location=location, ip_address='127.0.0.1')))
+
+        self.assertEqual(writer.stats()['dropped'], 1)
+        self.assertEqual(writer.stats()['pending'], 1)
+
+    def test_non_blocking_enqueue_drops_without_waiting(self):
+        location = Location.objects.create(city='london', country_code='GB')
+        writer = QueryLogWriter(max_queue_size=1, batch_size=10, flush_interval=1,
+                                enqueue_timeout=5, autostart=False)
+        writer.enqueue(WeatherQuery(location=location, ip_address='127.0.0.1'))
+
+        started = time.monotonic()
+        self.assertFalse(writer.enqueue(WeatherQuery(location=location, ip_address='127.0.0.1'), block=False))
+
+        self.assertLess(time.monotonic() - started, 1)
+        self.assertEqual(writer.stats()['dropped'], 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_db_tier_reads_latest_observation(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        latest = LatestObservation.objects.get(location__city='london')
+        self.assertEqual(latest.raw_response.payload, self.mock_weather_data)
+
+        cache.clear()
+        local_cache.clear()
+        with self.assertNumQueries(2):  # latest observation read + query log insert
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(query.served_from_cache)
+        self.assertEqual(query.weather_data, latest.weather_data)
+        self.assertEqual(query.raw_response_id, latest.raw_response_id)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_upstream_fetch_upserts_latest_observation(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        cache.clear()
+        local_cache.clear()
+        LatestObservation.objects.update(fetched_at=timezone.now() - timedelta(days=1))
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual(LatestObservation.objects.count(), 1)
+        self.assertEqual(
+            LatestObservation.objects.get().weather_data,
+            WeatherQuery.objects.filter(served_from_cache=False).first().weather_data,
+        )
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_identical_payloads_are_stored_once(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+
+        get_weather_for_city('London', 'C', '127.0.0.1')
+        cache.clear()
+        local_cache.clear()
+        LatestObservation.objects.all().delete()
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertEqual(mock_fetch.call_count, 2)
+        self.assertEqual(RawResponse.objects.count(), 1)
+        self.assertEqual(
+            WeatherQuery.objects.filter(raw_response=RawResponse.objects.get()).count(), 2
+        )
+
+    def test_rate_limit_reports_remaining_quota(self):
+        status = check_rate_limit('127.0.0.1')
+        self.assertEqual(status.limit, RATE_LIMIT)
+        self.assertEqual(status.remaining, RATE_LIMIT - 1)
+        self.assertTrue(1 <= status.reset_after <= 60)
+
+        for i in range(RATE_LIMIT - 1):
+            status = check_rate_limit('127.0.0.1')
+        self.assertEqual(status.remaining, 0)
+
+        with self.assertRaises(RateLimitExceeded) as context:
+            check_rate_limit('127.0.0.1')
+        self.assertEqual(context.exception.status.remaining, 0)
+
+    def test_rate_limit_is_atomic_under_concurrency(self):
+        allowed = []
+        denied = []
+
+        def worker():
+            try:
+                check_rate_limit('10.0.0.1')
+                allowed.append(1)
+            except RateLimitExceeded:
+                denied.append(1)
+
+        threads = [threading.Thread(target=worker) for _ in range(RATE_LIMIT + 20)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(len(allowed), RATE_LIMIT)
+        self.assertEqual(len(denied), 20)
+
+    @override_settings(WEATHER_RATE_LIMIT_BACKEND='fixed_window')
+    def test_fixed_window_backend_still_available(self):
+        for i in range(RATE_LIMIT):
+            check_rate_limit('127.0.0.1')
+        with self.assertRaises(RateLimitExceeded):
+            check_rate_limit('127.0.0.1')
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_cache_hits_take_one_redis_round_trip(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        local_cache.clear()
+        redis_hit = get_weather_for_city('London', 'C', '127.0.0.1')
+        local_hit = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(redis_hit.served_from_cache)
+        self.assertEqual(redis_hit.redis_round_trips, 1)
+        self.assertEqual(local_hit.redis_round_trips, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_db_tier_hit_backfills_redis_off_the_request_path(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        cache.clear()
+        local_cache.clear()
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+        self.assertEqual(query.redis_round_trips, 1)
+
+        cash_service._backfill_executor.submit(lambda: None).result()
+        local_cache.clear()
+        with count_round_trips() as round_trips:
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertEqual(round_trips.count, 1)
+        self.assertEqual(query.weather_data.temperature, 20.5)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    def test_pipelined_rate_limit_check_returns_cached_value(self):
+        cache.set('weather:london', b'payload')
+        # Script cache lost (e.g. Redis restart): the check reloads it and still passes
+        get_redis_connection('default').script_flush()
+
+        status, value = check_rate_limit_and_get('127.0.0.1', 'weather:london')
+        self.assertEqual(value, b'payload')
+        self.assertEqual(status.remaining, RATE_LIMIT - 1)
+
+        status, value = check_rate_limit_and_get('127.0.0.1', 'weather:paris')
+        self.assertIsNone(value)
+        self.assertEqual(status.remaining, RATE_LIMIT - 2)
+
+    def test_http_client_reuses_connections(self):
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        connections = []
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self):
+                super().setup()
+                connections.append(1)
+
+            def do_GET(self):
+                self.send_response(200)
+                self.send_header("Content-Length", "2")
+                self.end_headers()
+                self.wfile.write(b"{}")
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        client = PooledHTTPClient(pool_size=2, connect_timeout=1, read_timeout=1)
+        url = f"http://127.0.0.1:{server.server_address[1]}/"
+        try:
+            for i in range(5):
+                self.assertEqual(client.get(url).json(), {})
+            self.assertEqual(len(connections), 1)
+
+            # A forked worker must not reuse the parent's pooled sockets
+            session = client.session
+            with patch('weather_api.services.http_client.os.getpid', return_value=-1):
+                self.assertIsNot(client.session, session)
+        finally:
+            client.close()
+            server.shutdown()
+            server.server_close()
+
+    def test_circuit_breaker_opens_and_recovers(self):
+        breaker = CircuitBreaker(name='test', failure_rate=0.5, min_calls=2, window=60,
+                                 slow_call_threshold=1, open_duration=0.1, probe_timeout=1)
+        failing = MagicMock(side_effect=ConnectionError('down'))
+
+        for i in range(2):
+            with self.assertRaises(ConnectionError):
+                breaker.call(failing)
+        with self.assertRaises(CircuitOpen):
+            breaker.call(failing)
+        self.assertEqual(failing.call_count, 2)
+        self.assertEqual(breaker.snapshot()['state'], 'open')
+
+        time.sleep(0.15)
+        self.assertTrue(breaker.allow())  # the single half-open probe
+        self.assertFalse(breaker.allow())
+        breaker.record(failed=False)
+        self.assertEqual(breaker.snapshot()['state'], 'closed')
+        self.assertEqual(breaker.call(lambda: 'ok'), 'ok')
+
+    @patch('weather_api.services.weather_api_service.http_client')
+    def test_fetch_weather_fails_fast_while_circuit_open(self, mock_http):
+        mock_http.get.return_value = MagicMock(status_code=404)
+        for i in range(upstream_breaker.min_calls):
+            with self.assertRaises(CityNotFound):
+                OpenWeatherAPI.fetch_weather('atlantis')
+        self.assertEqual(upstream_breaker.snapshot()['state'], 'closed')
+
+        mock_http.get.side_effect = requests.ConnectionError('down')
+        for i in range(upstream_breaker.min_calls):
+            with self.assertRaises(ValueError):
+                OpenWeatherAPI.fetch_weather('london')
+        mock_http.get.reset_mock()
+
+        with self.assertRaises(UpstreamUnavailable):
+            OpenWeatherAPI.fetch_weather('london')
+        mock_http.get.assert_not_called()
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_open_circuit_serves_last_known_observation_as_stale(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        cache.clear()
+        local_cache.clear()
+        LatestObservation.objects.update(fetched_at=timezone.now() - timedelta(days=1))
+        mock_fetch.side_effect = UpstreamUnavailable('open')
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(query.is_stale)
+        self.assertTrue(query.served_from_cache)
+        self.assertEqual(query.weather_data.temperature, 20.5)
+
+        with self.assertRaises(UpstreamUnavailable):
+            get_weather_for_city('Paris', 'C', '127.0.0.1')
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_unknown_city_is_negatively_cached(self, mock_fetch):
+        mock_fetch.side_effect = CityNotFound('City not found')
+        hits_before = negative_cache.stats()['not_found_hits']
+
+        with self.assertRaises(CityNotFound):
+            get_weather_for_city('Atlantis', 'C', '127.0.0.1')
+        with count_round_trips() as round_trips, self.assertNumQueries(0), self.assertRaises(CityNotFound):
+            get_weather_for_city('atlantis', 'F', '127.0.0.1')
+
+        self.assertEqual(round_trips.count, 1)  # rate limit + entry + tombstone
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(negative_cache.stats()['not_found_hits'], hits_before + 1)
+
+        results, rate_limit = get_weather_for_cities([('atlantis', 'C')], '127.0.0.1')
+        self.assertIsInstance(results[0], CityNotFound)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_upstream_error_tombstone_is_short_lived(self, mock_fetch):
+        mock_fetch.side_effect = WeatherAPIError('Weather API error: 502')
+
+        with self.assertRaises(WeatherAPIError):
+            get_weather_for_city('London', 'C', '127.0.0.1')
+        # The tombstone is transient: unavailable (503), never "not found"
+        with self.assertRaises(UpstreamUnavailable):
+            get_weather_for_city('London', 'C', '127.0.0.1')
+        self.assertEqual(mock_fetch.call_count, 1)
+
+        ttl = get_redis_connection('default').ttl(cache.make_key(negative_cache.key('london')))
+        self.assertLessEqual(ttl, settings.WEATHER_UPSTREAM_ERROR_TTL)
+
+        cache.delete(negative_cache.key('london'))  # tombstone expired
+        mock_fetch.side_effect = None
+        mock_fetch.return_value = self.mock_weather_data
+        self.assertFalse(get_weather_for_city('London', 'C', '127.0.0.1').served_from_cache)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_upstream_error_tombstone_serves_last_known_observation(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        fresh = get_weather_for_city('London', 'C', '127.0.0.1')
+        cash_service._backfill_executor.submit(lambda: None).result()
+        cache.clear()
+        local_cache.clear()
+        LatestObservation.objects.update(fetched_at=timezone.now() - timedelta(days=1))
+        negative_cache.remember('london', WeatherAPIError('Weather API error: 502'))
+
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+        results, rate_limit = get_weather_for_cities([('London', 'C')], '127.0.0.1')
+
+        for served in (query, results[0]):
+            self.assertTrue(served.is_stale)
+            self.assertEqual(served.weather_data.id, fresh.weather_data.id)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    def test_normalize_city(self):
+        self.assertEqual(normalize_city('  Saint   Petersburg '), 'saint petersburg')
+        self.assertEqual(normalize_city('ＳＡＩＮＴ　ＰＥＴＥＲＳＢＵＲＧ'), 'saint petersburg')
+        self.assertEqual(normalize_city('Straße'), 'strasse')
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_city_aliases_share_one_location_entry(self, mock_fetch):
+        mock_fetch.return_value = dict(self.mock_weather_data, name='Saint Petersburg', sys={'country': 'RU'})
+
+        first = get_weather_for_city('St Petersburg', 'C', '127.0.0.1')
+        self.assertFalse(first.served_from_cache)
+        self.assertEqual(
+            set(CityAlias.objects.values_list('alias', flat=True)), {'st petersburg', 'saint petersburg, ru'}
+        )
+
+        for spelling in ('Saint Petersburg, RU', 'st  PETERSBURG', 'ＳＡＩＮＴ　ＰＥＴＥＲＳＢＵＲＧ,　ＲＵ'):
+            with count_round_trips() as round_trips:
+                query = get_weather_for_city(spelling, 'C', '127.0.0.1')
+            self.assertTrue(query.served_from_cache)
+            self.assertEqual(query.location, first.location)
+            self.assertEqual(round_trips.count, 1)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+        # Another worker: the alias table resolves the spelling to the same entry
+        city_aliases.clear()
+        local_cache.clear()
+        query = get_weather_for_city('saint petersburg, ru', 'C', '127.0.0.1')
+        self.assertTrue(query.served_from_cache)
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(city_aliases.stats()['db_hits'], 1)
+
+        results, rate_limit = get_weather_for_cities([('St Petersburg', 'C'), ('SAINT PETERSBURG, RU', 'F')], '127.0.0.1')
+        self.assertEqual(results[0].weather_data, results[1].weather_data)
+        self.assertEqual(mock_fetch.call_count, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_upstream_name_never_repoints_a_bare_alias(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        london = get_weather_for_city('London', 'C', '127.0.0.1')
+        mock_fetch.return_value = dict(self.mock_weather_data, sys={'country': 'CA'}, main=dict(
+            self.mock_weather_data['main'], temp=30.0))
+        ontario = get_weather_for_city('London, CA', 'C', '127.0.0.1')
+        self.assertNotEqual(ontario.location, london.location)
+
+        city_aliases.clear()
+        local_cache.clear()
+        query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertEqual(query.location, london.location)
+        self.assertEqual(query.weather_data.id, london.weather_data.id)
+        self.assertEqual(CityAlias.objects.get(alias='london, ca').location, ontario.location)
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    def _hot_location(self, city, hits, fetched_ago=None):
+        location = Location.objects.create(city=city, country_code='GB')
+        for _ in range(hits):
+            WeatherQuery.objects.create(location=location, ip_address='127.0.0.1')
+        if fetched_ago is not None:
+            LatestObservation.objects.create(
+                location=location,
+                weather_data=WeatherData.objects.create(temperature=10, main_weather='Clear', description='clear'),
+                fetched_at=timezone.now() - fetched_ago,
+            )
+        return location
+
+    @patch('weather_api.services.cash_service.refresh_location', return_value=True)
+    def test_hot_refresher_refreshes_due_entries_hottest_first(self, mock_refresh):
+        london = self._hot_location('london', 3, fetched_ago=timedelta(minutes=10))
+        leeds = self._hot_location('leeds', 2)  # never fetched: due now
+        self._hot_location('york', 1, fetched_ago=timedelta(seconds=0))  # fresh
+        self._hot_location('bath', 1, fetched_ago=timedelta(minutes=10))  # not in the top 3
+        WeatherQuery.objects.filter(location__city='bath').update(timestamp=timezone.now() - timedelta(days=1))
+
+        refresher = HotCityRefresher(top_n=3, lead=30, concurrency=1, budget=1, window=3600)
+        try:
+            stats = refresher.run_once()
+        finally:
+            refresher.shutdown()
+
+        # Budget of one call: the entry that expired first goes, the other waits
+        mock_refresh.assert_called_once_with(london.id, 'london', 'GB')
+        self.assertEqual((stats['hot'], stats['refreshed'], stats['over_budget']), (3, 1, 1))
+        self.assertLessEqual(stats['next_refresh_at'], time.time())
+        self.assertNotIn(leeds.id, [call.args[0] for call in mock_refresh.call_args_list])
+
+    def test_call_budget_slides(self):
+        now = [0.0]
+        budget = CallBudget(per_minute=2, timer=lambda: now[0])
+        self.assertTrue(budget.try_acquire())
+        self.assertTrue(budget.try_acquire())
+        self.assertFalse(budget.try_acquire())
+        now[0] = 60.5
+        self.assertTrue(budget.try_acquire())
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_refresh_location_skips_while_lease_is_held(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        location = get_weather_for_city('London', 'C', '127.0.0.1').location
+
+        lock = cache.lock(f'lock:weather:loc:{location.id}', timeout=5)
+        lock.acquire()
+        try:
+            self.assertFalse(cash_service.refresh_location(location.id, 'london', 'GB'))
+        finally:
+            lock.release()
+        self.assertTrue(cash_service.refresh_location(location.id, 'london', 'GB'))
+        self.assertEqual(mock_fetch.call_args.args[0], 'london,GB')
+        self.assertEqual(mock_fetch.call_count, 2)
+
+    @patch('weather_api.services.weather_api_service.http_client')
+    def test_fetch_group_returns_payloads_by_city_id(self, mock_http):
+        mock_http.get.return_value = MagicMock(status_code=200)
+        mock_http.get.return_value.json.return_value = {
+            'cnt': 2, 'list': [dict(self.mock_weather_data, id=2643743), dict(self.mock_weather_data, id=2988507)],
+        }
+
+        payloads = OpenWeatherAPI.fetch_group([2643743, 2988507])
+
+        self.assertEqual(set(payloads), {2643743, 2988507})
+        self.assertEqual(mock_http.get.call_args.args[0], OpenWeatherAPI.GROUP_URL)
+        self.assertEqual(mock_http.get.call_args.kwargs['params']['id'], '2643743,2988507')
+        with self.assertRaises(ValueError):
+            OpenWeatherAPI.fetch_group(list(range(OpenWeatherAPI.GROUP_MAX_IDS + 1)))
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_group')
+    def test_refresh_locations_groups_known_city_ids(self, mock_group, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        mock_group.side_effect = lambda ids: {
+            owm_id: dict(self.mock_weather_data, id=owm_id, name=f'City {owm_id}') for owm_id in ids if owm_id != 7
+        }
+        locations = [
+            (Location.objects.create(city=f'city {i}', country_code='GB', owm_id=i).id, f'city {i}', 'GB', i)
+            for i in range(1, 26)
+        ]
+        unknown_id = Location.objects.create(city='london', country_code='GB').id
+
+        results = cash_service.refresh_locations(locations + [(unknown_id, 'london', 'GB', None)])
+
+        self.assertEqual([len(call.args[0]) for call in mock_group.call_args_list], [20, 5])
+        self.assertEqual(mock_fetch.call_count, 1)  # no city id yet: single call
+        self.assertIsInstance(results.pop(locations[6][0]), CityNotFound)
+        self.assertTrue(all(result is True for result in results.values()))
+        self.assertEqual(LatestObservation.objects.count(), 25)
+        self.assertIsNotNone(cache.get(f'weather:loc:{locations[0][0]}'))
+
+    def test_hot_refresher_packs_city_ids_into_group_calls(self):
+        due = [(0, -1, (i, f'city {i}', 'GB', i)) for i in range(1, 23)] + [(0, -1, (99, 'london', 'GB', None))]
+        calls = HotCityRefresher.upstream_calls(due)
+        self.assertEqual([len(call) for call in calls], [20, 2, 1])
+
+    def test_upstream_quota_keeps_a_reserve_for_interactive_calls(self):
+        quota = UpstreamQuota('test', per_minute=60, burst=4, background_reserve=0.5)
+
+        with upstream_priority(BACKGROUND):
+            quota.acquire()
+            quota.acquire()
+            with self.assertRaises(QuotaExhausted):
+                quota.acquire()  # would leave less than the reserve of 2
+        quota.acquire()
+        quota.acquire()
+        with self.assertRaises(QuotaExhausted):
+            quota.acquire()
+
+        stats = quota.stats()
+        self.assertEqual((stats['background_granted'], stats['background_denied']), (2, 1))
+        self.assertEqual((stats['interactive_granted'], stats['interactive_denied']), (2, 1))
+        self.assertLess(stats['tokens'], 1)
+
+    @patch('weather_api.services.weather_api_service.http_client')
+    def test_spent_upstream_quota_serves_last_known_observation(self, mock_http):
+        mock_http.get.return_value = MagicMock(status_code=200)
+        mock_http.get.return_value.json.return_value = self.mock_weather_data
+        quota = UpstreamQuota('test', per_minute=2, burst=1, background_reserve=0)
+
+        with patch('weather_api.services.weather_api_service.upstream_quota', quota):
+            get_weather_for_city('London', 'C', '127.0.0.1')
+            cache.delete(f"weather:loc:{LatestObservation.objects.get().location_id}")
+            local_cache.clear()
+            LatestObservation.objects.update(fetched_at=timezone.now() - timedelta(days=1))
+
+            query = get_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(query.is_stale)
+        self.assertEqual(mock_http.get.call_count, 1)
+        self.assertEqual(quota.stats()['interactive_denied'], 1)
+
+    @patch('weather_api.services.weather_api_service.http_client')
+    def test_upstream_429_empties_the_shared_quota(self, mock_http):
+        mock_http.get.return_value = MagicMock(status_code=429)
+        mock_http.get.return_value.raise_for_status.side_effect = requests.HTTPError('429 Too Many Requests')
+        quota = UpstreamQuota('test', per_minute=600, burst=100, background_reserve=0)
+
+        with patch('weather_api.services.weather_api_service.upstream_quota', quota):
+            with self.assertRaises(WeatherAPIError):
+                OpenWeatherAPI.fetch_weather('london')
+            with self.assertRaises(UpstreamUnavailable):
+                OpenWeatherAPI.fetch_weather('london')
+        self.assertEqual(mock_http.get.call_count, 1)
+
+    @patch('weather_api.services.weather_api_service.http_client')
+    def test_open_circuit_spends_no_upstream_quota(self, mock_http):
+        quota = UpstreamQuota('test', per_minute=600, burst=100, background_reserve=0)
+        self.addCleanup(upstream_breaker.reset)
+        for i in range(upstream_breaker.min_calls):
+            upstream_breaker.record(failed=True)
+
+        with patch('weather_api.services.weather_api_service.upstream_quota', quota):
+            with self.assertRaises(UpstreamUnavailable):
+                OpenWeatherAPI.fetch_weather('london')
+        mock_http.get.assert_not_called()
+        self.assertEqual(quota.stats()['interactive_granted'], 0)
+
+        # Nor does a denied quota count against the circuit
+        upstream_breaker.reset()
+        spent = UpstreamQuota('spent', per_minute=0, burst=0, background_reserve=0)
+        with patch('weather_api.services.weather_api_service.upstream_quota', spent), \
+                patch.object(spent, 'acquire', side_effect=QuotaExhausted('spent')):
+            for i in range(upstream_breaker.min_calls):
+                with self.assertRaises(UpstreamUnavailable):
+                    OpenWeatherAPI.fetch_weather('london')
+        self.assertEqual(upstream_breaker.snapshot()['calls'], 0)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_redis_outage_serves_from_database(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        fresh = get_weather_for_city('London', 'C', '127.0.0.1')
+        cash_service._backfill_executor.submit(lambda: None).result()
+        local_cache.clear()
+
+        with RedisOutage(slow=True) as outage:
+            queries = [get_weather_for_city('London', 'C', '127.0.0.1') for _ in range(5)]
+            cash_service._backfill_executor.submit(lambda: None).result()
+
+            # Redis is left alone once the breaker opens
+            self.assertEqual(outage.commands, settings.WEATHER_REDIS_FAILURE_THRESHOLD)
+            self.assertEqual(redis_health.stats()['state'], 'open')
+
+        for query in queries:
+            self.assertTrue(query.served_from_cache)
+            self.assertEqual(query.weather_data.id, fresh.weather_data.id)
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(queries[-1].rate_limit.remaining, RATE_LIMIT - 5)
+
+    def test_rate_limit_is_enforced_per_process_during_redis_outage(self):
+        with RedisOutage():
+            for i in range(RATE_LIMIT):
+                check_rate_limit('10.0.0.1')
+            with self.assertRaises(RateLimitExceeded) as raised:
+                check_rate_limit('10.0.0.1')
+            status, value = check_rate_limit_and_get('10.0.0.2', 'weather:missing:london')
+
+        self.assertEqual(raised.exception.status.remaining, 0)
+        self.assertEqual(status.remaining, RATE_LIMIT - 1)
+        self.assertIsNone(value)
+
+    def test_cache_falls_back_to_process_memory_during_redis_outage(self):
+        with RedisOutage():
+            self.assertTrue(cache.set('greeting', 'hello', timeout=30))
+            self.assertFalse(cache.add('greeting', 'bye', timeout=30))
+            self.assertEqual(cache.get('greeting'), 'hello')
+
+            lock = cache.lock('lock:weather:loc:1', timeout=5)
+            other = cache.lock('lock:weather:loc:1', timeout=5)
+            self.assertTrue(lock.acquire(blocking=False))
+            self.assertFalse(other.acquire(blocking=False))
+            lock.release()
+            self.assertTrue(other.acquire(blocking=False))
+            other.release()
+
+        # Nothing reached Redis
+        self.assertIsNone(cache.get('greeting'))
+
+    def test_redis_health_probes_once_per_open_period(self):
+        now = [0.0]
+        health = RedisHealth(failure_threshold=2, open_duration=5, timer=lambda: now[0])
+        error = RedisConnectionError('down')
+
+        health.record_failure('get', ValueError('not a connection problem'))
+        health.record_failure('get', error)
+        self.assertTrue(health.available())
+        health.record_failure('get', error)
+        self.assertFalse(health.available())
+        self.assertEqual(health.call('get', lambda: 'redis', lambda: 'local'), 'local')
+
+        now[0] = 5.0
+        self.assertTrue(health.available())  # this caller probes
+        self.assertFalse(health.available())
+        health.record_failure('get', error)
+        self.assertTrue(health.is_open)
+
+        now[0] = 10.0
+        self.assertEqual(health.call('get', lambda: 'redis', lambda: 'local'), 'redis')
+        stats = health.stats()
+        self.assertEqual(stats['state'], 'closed')
+        self.assertEqual((stats['errors'], stats['opened'], stats['short_circuited']), (3, 2, 3))
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.afetch_weather', new_callable=AsyncMock)
+    async def test_async_path_survives_redis_outage(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+        await aget_weather_for_city('London', 'C', '127.0.0.1')
+        local_cache.clear()
+
+        with RedisOutage():
+            db_hit = await aget_weather_for_city('London', 'C', '127.0.0.1')
+            fresh = await aget_weather_for_city('Paris', 'C', '127.0.0.1')
+
+        self.assertTrue(db_hit.served_from_cache)
+        self.assertFalse(fresh.served_from_cache)
+        self.assertEqual(mock_fetch.await_count, 2)
+
+    def test_city_alias_map_counts_resolutions(self):
+        location = Location.objects.create(city='saint petersburg', country_code='RU')
+        CityAlias.objects.create(alias='spb', location=location)
+        aliases = CityAliasMap(maxsize=10)
+
+        self.assertIsNone(aliases.cached('spb'))
+        self.assertEqual(aliases.lookup('spb'), location.id)
+        self.assertEqual(aliases.cached('spb'), location.id)
+        self.assertIsNone(aliases.lookup('leningrad'))
+        self.assertEqual(aliases.resolve_many(['spb', 'leningrad']), {'spb': location.id})
+
+        stats = aliases.stats()
+        self.assertEqual((stats['memory_hits'], stats['db_hits'], stats['misses']), (2, 1, 2))
+        self.assertEqual(stats['size'], 1)
+
+    def test_haversine_and_grid_cells(self):
+        self.assertAlmostEqual(haversine_km(51.5074, -0.1278, 48.8566, 2.3522), 343.5, delta=1)
+        self.assertEqual(Location.grid_cell_for(51.5074, -0.1278), '515:3598')
+        self.assertEqual(Location.grid_cell_for(None, -0.1278), '')
+        # Searches wrap around the antimeridian
+        self.assertIn(Location.grid_cell_for(0.0, -179.99), cells_within(0.0, 179.99, 5))
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather_by_coordinates')
+    def test_nearby_coordinates_share_one_location_entry(self, mock_coords, mock_fetch):
+        mock_coords.return_value = self.mock_weather_data  # London at 51.5074, -0.1278
+
+        first = get_weather_for_coordinates(51.51, -0.12, 'C', '127.0.0.1')
+        self.assertFalse(first.served_from_cache)
+        self.assertEqual(first.location.grid_cell, '515:3598')
+
+        with count_round_trips() as round_trips:
+            nearby = get_weather_for_coordinates(51.52, -0.10, 'F', '127.0.0.1')
+        self.assertTrue(nearby.served_from_cache)
+        self.assertEqual(nearby.location, first.location)
+        self.assertEqual(round_trips.count, 1)
+        self.assertTrue(get_weather_for_city('London', 'C', '127.0.0.1').served_from_cache)
+        self.assertEqual((mock_coords.call_count, mock_fetch.call_count), (1, 0))
+
+        get_weather_for_coordinates(51.75, -0.12, 'C', '127.0.0.1')  # ~27 km away
+        self.assertEqual(mock_coords.call_count, 2)
+        self.assertEqual(location_grid.stats()['matches'], 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather_by_id')
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather_by_coordinates')
+    def test_coordinate_matches_refresh_by_id_or_point(self, mock_coords, mock_by_id, mock_fetch):
+        mock_coords.return_value = mock_by_id.return_value = self.mock_weather_data
+        london = Location.objects.create(city='london', country_code='GB', latitude=51.5074, longitude=-0.1278,
+                                         grid_cell=Location.grid_cell_for(51.5074, -0.1278), owm_id=2643743)
+        Location.objects.create(city='paris', country_code='FR', latitude=48.8566, longitude=2.3522,
+                                grid_cell=Location.grid_cell_for(48.8566, 2.3522))
+
+        self.assertEqual(get_weather_for_coordinates(51.51, -0.12, 'C', '127.0.0.1').location, london)
+        mock_by_id.assert_called_once_with(2643743)
+
+        get_weather_for_coordinates(48.86, 2.35, 'C', '127.0.0.1')
+        mock_coords.assert_called_once_with(48.8566, 2.3522)
+        mock_fetch.assert_not_called()
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather_by_coordinates')
+    def test_coordinates_resolved_upstream_are_indexed(self, mock_coords):
+        # The location's centre is out of range, but upstream resolves the point to it
+        mock_coords.return_value = self.mock_weather_data
+        get_weather_for_coordinates(51.60, -0.13, 'C', '127.0.0.1')
+        get_weather_for_coordinates(51.601, -0.131, 'C', '127.0.0.1')
+
+        self.assertEqual(mock_coords.call_count, 1)
+        self.assertEqual(Location.objects.count(), 1)
+
+    def _payload_for(self, city):
+        if city == 'atlantis':
+            raise CityNotFound('City not found')
+        return dict(self.mock_weather_data, name=city.title())
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_batch_returns_per_city_results_with_one_insert(self, mock_fetch):
+        mock_fetch.side_effect = self._payload_for
+        get_weather_for_city('London', 'C', '127.0.0.1')
+        local_cache.clear()
+
+        results, rate_limit = get_weather_for_cities(
+            [('London', 'C'), ('Paris', 'C'), ('atlantis', 'C'), ('Paris', 'C')], '127.0.0.1'
+        )
+
+        self.assertTrue(results[0].served_from_cache)
+        self.assertFalse(results[1].served_from_cache)
+        self.assertEqual(results[1].location.city, 'paris')
+        self.assertIsInstance(results[2], CityNotFound)
+        self.assertTrue(results[3].served_from_cache)
+        self.assertEqual(mock_fetch.call_count, 3)  # london once, then paris and atlantis
+        self.assertEqual(rate_limit.remaining, RATE_LIMIT - 3)  # london, the batch, its second miss
+        self.assertEqual(WeatherQuery.objects.count(), 4)
+
+        local_cache.clear()
+        with count_round_trips() as round_trips, self.assertNumQueries(1):
+            results, rate_limit = get_weather_for_cities([('London', 'C'), ('Paris', 'C')], '127.0.0.1')
+        self.assertEqual(round_trips.count, 1)  # rate limit + MGET
+        self.assertTrue(all(query.served_from_cache for query in results))
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_batch_upstream_misses_are_rate_limited_per_city(self, mock_fetch):
+        mock_fetch.side_effect = self._payload_for
+        get_weather_for_city('London', 'C', '127.0.0.1')
+
+        cities = [('London', 'C')] + [(f'City {i}', 'C') for i in range(RATE_LIMIT)]
+        results, rate_limit = get_weather_for_cities(cities, '127.0.0.1')
+
+        self.assertTrue(results[0].served_from_cache)
+        self.assertTrue(all(isinstance(result, RateLimitExceeded) for result in results[1:]))
+        self.assertEqual(mock_fetch.call_count, 1)
+        self.assertEqual(rate_limit.remaining, RATE_LIMIT - 2)
+
+        results, rate_limit = get_weather_for_cities(cities[:4], '127.0.0.1')
+        self.assertEqual(mock_fetch.call_count, 4)
+        self.assertEqual(rate_limit.remaining, RATE_LIMIT - 5)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_batch_misses_share_the_refresh_lease(self, mock_fetch):
+        mock_fetch.side_effect = self._payload_for
+        location = Location.objects.create(city='london', country_code='GB')
+        weather_data = WeatherData.objects.create(temperature=18.0, main_weather='Clear', description='clear sky')
+
+        # Another worker is refreshing london: the batch waits for its entry instead of calling upstream
+        lock = cache.lock('lock:weather:london', timeout=5)
+        self.assertTrue(lock.acquire(blocking=False))
+        publisher = threading.Timer(
+            0.1, cache.set, args=('weather:london', encode_entry(location, weather_data, time.time(), time.time() + 300)),
+            kwargs={'timeout': 300}
+        )
+        publisher.start()
+        try:
+            results, rate_limit = get_weather_for_cities([('London', 'C'), ('Paris', 'C')], '127.0.0.1')
+        finally:
+            publisher.join()
+            lock.release()
+
+        self.assertEqual(results[0].weather_data, weather_data)
+        self.assertTrue(results[0].served_from_cache)
+        self.assertFalse(results[1].served_from_cache)
+        mock_fetch.assert_called_once_with('Paris')
+        # The batch's own lease is released
+        self.assertTrue(cache.lock('lock:weather:paris', timeout=5).acquire(blocking=False))
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_batch_fetches_misses_concurrently(self, mock_fetch):
+        def slow_fetch(city):
+            time.sleep(0.2)
+            return self._payload_for(city)
+        mock_fetch.side_effect = slow_fetch
+
+        start = time.monotonic()
+        results, rate_limit = get_weather_for_cities(
+            [(city, 'C') for city in ('london', 'paris', 'berlin', 'madrid', 'rome')], '127.0.0.1'
+        )
+
+        self.assertLess(time.monotonic() - start, 0.6)
+        self.assertEqual([query.location.city for query in results], ['london', 'paris', 'berlin', 'madrid', 'rome'])
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.afetch_weather', new_callable=AsyncMock)
+    async def test_async_path_uses_the_same_tiers(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+
+        fresh = await aget_weather_for_city('London', 'C', '127.0.0.1')
+        local_hit = await aget_weather_for_city('London', 'C', '127.0.0.1')
+        local_cache.clear()
+        redis_hit = await aget_weather_for_city('London', 'C', '127.0.0.1')
+        await cache.aclear()
+        local_cache.clear()
+        db_hit = await aget_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertFalse(fresh.served_from_cache)
+        self.assertEqual(fresh.raw_response.payload, self.mock_weather_data)
+        for query in (local_hit, redis_hit, db_hit):
+            self.assertTrue(query.served_from_cache)
+            self.assertEqual(query.weather_data.id, fresh.weather_data.id)
+        self.assertEqual(db_hit.raw_response_id, fresh.raw_response_id)
+        self.assertEqual(mock_fetch.await_count, 1)
+        self.assertEqual(await WeatherQuery.objects.acount(), 4)
+        self.assertEqual(redis_hit.rate_limit.remaining, RATE_LIMIT - 3)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.afetch_weather', new_callable=AsyncMock)
+    async def test_async_request_releases_its_connection_once(self, mock_fetch):
+        mock_fetch.return_value = self.mock_weather_data
+
+        with patch.object(cash_service, '_release_db_connection') as release:
+            await aget_weather_for_city('London', 'C', '127.0.0.1')
+            self.assertEqual(release.call_count, 2)  # before the upstream call, then at the end
+
+            await cache.aclear()
+            local_cache.clear()
+            release.reset_mock()
+            db_hit = await aget_weather_for_city('London', 'C', '127.0.0.1')
+
+        self.assertTrue(db_hit.served_from_cache)
+        self.assertEqual(release.call_count, 1)
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.afetch_weather', new_callable=AsyncMock)
+    async def test_async_misses_are_coalesced(self, mock_fetch):
+        async def slow_fetch(city):
+            await asyncio.sleep(0.1)
+            return self.mock_weather_data
+        mock_fetch.side_effect = slow_fetch
+
+        queries = await asyncio.gather(*[
+            aget_weather_for_city('London', 'C', '127.0.0.1') for _ in range(5)
+        ])
+
+        self.assertEqual(mock_fetch.await_count, 1)
+        self.assertEqual(sum(not query.served_from_cache for query in queries), 1)
+
+    @patch('weather_api.services.weather_api_service.async_http_client')
+    async def test_async_fetch_weather_maps_upstream_errors(self, mock_http):
+        mock_http.get = AsyncMock(return_value=MagicMock(status_code=404))
+        with self.assertRaises(CityNotFound):
+            await OpenWeatherAPI.afetch_weather('atlantis')
+
+        mock_http.get = AsyncMock(side_effect=httpx.ConnectError('down'))
+        with self.assertRaises(ValueError):
+            await OpenWeatherAPI.afetch_weather('london')
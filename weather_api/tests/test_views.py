@@ -1,14 +1,28 @@
-from django.test import TestCase
+import gzip
+import json
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
 from django.urls import reverse
+from redis.exceptions import ConnectionError as RedisConnectionError
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
-from unittest.mock import patch
+from unittest.mock import patch, AsyncMock
 
 from ..models import Location, WeatherData, WeatherQuery
+from ..serializers import WeatherQuerySerializer
+from ..services.rate_limiter import RateLimitExceeded, RateLimitStatus
+from ..services.circuit_breaker import upstream_breaker
+from ..services.redis_failover import redis_health
+from ..services.upstream_quota import UpstreamQuota
+from ..services.weather_api_service import UpstreamUnavailable, CityNotFound
+from .fault_injection import RedisOutage
 
 
 class ViewTests(APITestCase):
     def setUp(self):
+        cache.clear()
         self.location = Location.objects.create(city="Paris", country_code="FR")
         self.weather_data = WeatherData.objects.create(
             temperature=22.0,
@@ -57,6 +71,24 @@ class ViewTests(APITestCase):
         self.assertEqual(call_args.kwargs['units'], 'C')
         self.assertEqual(call_args.kwargs['ip_address'], '127.0.0.1')
 
+    @patch('weather_api.views.get_weather_for_city')
+    def test_rate_limit_headers(self, mock_get_weather):
+        mock_query = WeatherQuery(id=1, location=self.location, weather_data=self.weather_data, units='C')
+        mock_query.rate_limit = RateLimitStatus(limit=30, remaining=12, reset_after=40)
+        mock_get_weather.return_value = mock_query
+
+        response = self.client.post(reverse('weather-data-api'), {'city': 'Paris', 'units': 'C'}, format='json')
+        self.assertEqual(response['X-RateLimit-Limit'], '30')
+        self.assertEqual(response['X-RateLimit-Remaining'], '12')
+        self.assertEqual(response['X-RateLimit-Reset'], '40')
+
+        mock_get_weather.side_effect = RateLimitExceeded(
+            "Rate limit exceeded", RateLimitStatus(limit=30, remaining=0, reset_after=7)
+        )
+        response = self.client.post(reverse('weather-data-api'), {'city': 'Paris', 'units': 'C'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '7')
+
     @patch('weather_api.views.get_weather_for_city')
     def test_weather_query_city_not_found(self, mock_get_weather):
         mock_get_weather.side_effect = ValueError("City not found")
@@ -79,6 +111,33 @@ class ViewTests(APITestCase):
         self.assertEqual(len(response.data['results']), 10)  # Default page size
         self.assertEqual(response.data['count'], 15)  # Total count
 
+    def test_weather_query_list_cursor_pagination(self):
+        url = reverse('weatherquery-list') + '?pagination=cursor&page_size=10'
+        first = self.client.get(url)
+
+        self.assertEqual(first.status_code, status.HTTP_200_OK)
+        self.assertNotIn('count', first.data)
+        self.assertEqual(len(first.data['results']), 10)
+        self.assertIsNone(first.data['previous'])
+
+        second = self.client.get(first.data['next'])
+        self.assertEqual(len(second.data['results']), 5)
+        self.assertIsNone(second.data['next'])
+
+        ids = [item['id'] for item in first.data['results'] + second.data['results']]
+        self.assertEqual(len(set(ids)), 15)
+
+    def test_weather_query_list_cursor_pagination_with_count(self):
+        url = reverse('weatherquery-list') + '?pagination=cursor&with_count=true&city=Paris'
+        response = self.client.get(url)
+
+        self.assertEqual(response.data['count'], 15)
+        self.assertFalse(response.data['count_is_approximate'])
+        self.assertNotIn('with_count', response.data['next'])
+
+        second = self.client.get(response.data['next'])
+        self.assertNotIn('count', second.data)
+
     def test_weather_query_list_filter_by_city(self):
         url = reverse('weatherquery-list') + '?city=Paris'
         response = self.client.get(url)
@@ -102,7 +161,7 @@ class ViewTests(APITestCase):
         self.assertEqual(response['Content-Type'], 'text/csv')
         self.assertIn('attachment', response['Content-Disposition'])
 
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         self.assertIn('City,Country,Temperature', content)
         self.assertIn('Paris,FR,22.0', content)
 
@@ -112,6 +171,241 @@ class ViewTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_200_OK)
 
-        content = response.content.decode('utf-8')
+        content = b''.join(response.streaming_content).decode('utf-8')
         paris_count = content.count('Paris,FR')
-        self.assertEqual(paris_count, 15)
\ No newline at end of file
+        self.assertEqual(paris_count, 15)
+
+    def test_export_csv_gzip(self):
+        url = reverse('weatherquery-export-csv') + '?gzip=true'
+        response = self.client.get(url)
+
+        self.assertEqual(response['Content-Type'], 'application/gzip')
+        self.assertIn('weather_history.csv.gz', response['Content-Disposition'])
+
+        content = gzip.decompress(b''.join(response.streaming_content)).decode('utf-8')
+        self.assertEqual(content.count('Paris,FR'), 15)
+
+    def test_export_ndjson(self):
+        url = reverse('weatherquery-export-ndjson') + '?city=Paris'
+        response = self.client.get(url)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+
+        lines = b''.join(response.streaming_content).decode('utf-8').splitlines()
+        self.assertEqual(len(lines), 15)
+        record = json.loads(lines[0])
+        self.assertEqual(record['city'], 'Paris')
+        self.assertEqual(record['temperature'], 22.0)
+        self.assertFalse(record['served_from_cache'])
+
+    @patch('weather_api.views.get_weather_for_city')
+    def test_cache_hit_response_matches_serializer_output(self, mock_get_weather):
+        cached_query = WeatherQuery.objects.create(
+            location=self.location,
+            weather_data=self.weather_data,
+            units='C',
+            ip_address='127.0.0.1',
+            served_from_cache=True,
+        )
+        mock_get_weather.return_value = cached_query
+        expected = JSONRenderer().render(WeatherQuerySerializer(cached_query).data)
+
+        url = reverse('weather-data-api')
+        for _ in range(2):  # second request reuses the pre-rendered fragment
+            response = self.client.post(url, {'city': 'Paris', 'units': 'C'}, format='json')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(response.content, expected)
+
+        with override_settings(WEATHER_RESPONSE_CACHE=False):
+            response = self.client.post(url, {'city': 'Paris', 'units': 'C'}, format='json')
+        self.assertEqual(response.content, expected)
+
+    @patch('weather_api.views.get_weather_for_city')
+    def test_cache_hit_response_tracks_new_observation(self, mock_get_weather):
+        url = reverse('weather-data-api')
+        mock_get_weather.return_value = WeatherQuery.objects.create(
+            location=self.location, weather_data=self.weather_data, units='C', served_from_cache=True,
+        )
+        self.client.post(url, {'city': 'Paris', 'units': 'C'}, format='json')
+
+        newer_data = WeatherData.objects.create(temperature=25.0, main_weather='Clear', description='hot')
+        mock_get_weather.return_value = WeatherQuery.objects.create(
+            location=self.location, weather_data=newer_data, units='C', served_from_cache=True,
+        )
+        response = self.client.post(url, {'city': 'Paris', 'units': 'C'}, format='json')
+
+        self.assertEqual(response.json()['weather_data']['temperature'], 25.0)
+
+    @patch('weather_api.views.get_weather_for_city')
+    def test_fahrenheit_queries_convert_metric_observation(self, mock_get_weather):
+        mock_get_weather.return_value = WeatherQuery.objects.create(
+            location=self.location, weather_data=self.weather_data, units='F', served_from_cache=True,
+        )
+
+        url = reverse('weather-data-api')
+        for _ in range(2):  # serializer path, then the pre-rendered fragment
+            response = self.client.post(url, {'city': 'Paris', 'units': 'F'}, format='json')
+            self.assertEqual(response.json()['weather_data']['temperature'], 71.6)
+
+        mock_get_weather.return_value.units = 'C'
+        response = self.client.post(url, {'city': 'Paris', 'units': 'C'}, format='json')
+        self.assertEqual(response.json()['weather_data']['temperature'], 22.0)
+
+        content = b''.join(self.client.get(reverse('weatherquery-export-csv')).streaming_content).decode('utf-8')
+        self.assertIn('Paris,FR,71.6', content)
+        self.assertEqual(content.count('Paris,FR,22.0'), 15)
+
+    @patch('weather_api.views.get_weather_for_city')
+    def test_upstream_unavailable_returns_503(self, mock_get_weather):
+        mock_get_weather.side_effect = UpstreamUnavailable('Weather service temporarily unavailable')
+
+        response = self.client.post(reverse('weather-data-api'), {'city': 'london', 'units': 'C'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertIn('Retry-After', response)
+
+    @patch('weather_api.services.http_client.http_client.get')
+    def test_health_check_reports_circuit_breaker(self, mock_get):
+        mock_get.return_value.status_code = 200
+        self.addCleanup(upstream_breaker.reset)
+        with override_settings(OPENWEATHER_API_KEY='test'):
+            response = self.client.get(reverse('health-check'))
+        self.assertEqual(response.data['components']['circuit_breaker']['state'], 'closed')
+
+        for i in range(upstream_breaker.min_calls):
+            upstream_breaker.record(failed=True)
+        with override_settings(OPENWEATHER_API_KEY='test'):
+            response = self.client.get(reverse('health-check'))
+
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(response.data['status'], 'degraded')
+        self.assertEqual(response.data['components']['circuit_breaker']['state'], 'open')
+
+    @patch('weather_api.services.cash_service.OpenWeatherAPI.fetch_weather')
+    def test_weather_api_answers_during_redis_outage(self, mock_fetch):
+        mock_fetch.return_value = {
+            'main': {'temp': 20.5, 'feels_like': 19.0, 'pressure': 1015, 'humidity': 70},
+            'wind': {'speed': 4.2, 'deg': 180},
+            'weather': [{'main': 'Clouds', 'description': 'scattered clouds', 'icon': '03d'}],
+            'name': 'Madrid',
+            'sys': {'country': 'ES'},
+            'coord': {'lat': 40.4168, 'lon': -3.7038},
+        }
+
+        with RedisOutage():
+            response = self.client.post(reverse('weather-data-api'), {'city': 'Madrid', 'units': 'C'}, format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['location']['country_code'], 'ES')
+        self.assertIn('X-RateLimit-Remaining', response)
+
+    @patch('weather_api.services.http_client.http_client.get')
+    def test_health_check_stays_up_during_redis_outage(self, mock_get):
+        mock_get.return_value.status_code = 200
+        with RedisOutage():
+            for i in range(redis_health.failure_threshold):
+                redis_health.record_failure('get', RedisConnectionError('down'))
+            with override_settings(OPENWEATHER_API_KEY='test'):
+                response = self.client.get(reverse('health-check'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['components']['redis']['state'], 'open')
+
+    @patch('weather_api.services.http_client.http_client.get')
+    def test_health_probe_goes_through_quota_and_breaker(self, mock_get):
+        mock_get.return_value.status_code = 200
+        quota = UpstreamQuota('test', per_minute=600, burst=100, background_reserve=0)
+        self.addCleanup(upstream_breaker.reset)
+
+        with patch('weather_api.services.weather_api_service.upstream_quota', quota), \
+                override_settings(OPENWEATHER_API_KEY='test'):
+            response = self.client.get(reverse('health-check'))
+            self.assertEqual(response.data['components']['external_api'], 'healthy')
+            self.assertEqual(quota.stats()['background_granted'], 1)
+
+            for i in range(upstream_breaker.min_calls):
+                upstream_breaker.record(failed=True)
+            response = self.client.get(reverse('health-check'))
+
+        self.assertTrue(response.data['components']['external_api'].startswith('skipped'))
+        self.assertEqual(mock_get.call_count, 1)
+        self.assertEqual(quota.stats()['background_granted'], 1)
+
+    @patch('weather_api.views.get_weather_for_cities')
+    def test_batch_endpoint_reports_per_city_status(self, mock_get_weather):
+        query = WeatherQuery(id=1, location=self.location, weather_data=self.weather_data,
+                             units='C', served_from_cache=True)
+        mock_get_weather.return_value = (
+            [query, CityNotFound('City not found')],
+            RateLimitStatus(limit=30, remaining=29, reset_after=60),
+        )
+
+        response = self.client.post(
+            reverse('weather-batch-api'),
+            {'items': [{'city': 'Paris'}, {'city': 'Atlantis', 'units': 'F'}]},
+            format='json',
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        mock_get_weather.assert_called_once_with([('paris', 'C'), ('atlantis', 'F')], ip_address='127.0.0.1')
+        first, second = response.data['results']
+        self.assertEqual(first['status'], 200)
+        self.assertEqual(first['result']['location']['city'], 'Paris')
+        self.assertEqual(second['status'], 404)
+        self.assertEqual(second['error'], 'City not found')
+        self.assertEqual(response['X-RateLimit-Remaining'], '29')
+
+    def test_batch_endpoint_rejects_empty_batch(self):
+        response = self.client.post(reverse('weather-batch-api'), {'items': []}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('weather_api.views.get_weather_for_coordinates')
+    def test_coordinates_endpoint(self, mock_get_weather):
+        mock_get_weather.return_value = WeatherQuery(id=1, location=self.location, weather_data=self.weather_data,
+                                                     units='F', served_from_cache=True)
+
+        response = self.client.post(reverse('weather-coords-api'), {'lat': 48.85, 'lon': 2.35, 'units': 'F'},
+                                    format='json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(mock_get_weather.call_args.kwargs['latitude'], 48.85)
+        self.assertEqual(mock_get_weather.call_args.kwargs['units'], 'F')
+
+        response = self.client.post(reverse('weather-coords-api'), {'lat': 91, 'lon': 2.35}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        mock_get_weather.side_effect = CityNotFound('No named location at these coordinates')
+        response = self.client.post(reverse('weather-coords-api'), {'lat': 0, 'lon': -30}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_metrics_reports_negative_cache_counters(self):
+        response = self.client.get(reverse('metrics'))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('upstream_calls_absorbed', response.data['negative_cache'])
+        self.assertIn('hit_rate', response.data['local_cache'])
+        self.assertIn('db_hits', response.data['city_aliases'])
+        self.assertIn('match_rate', response.data['location_grid'])
+        self.assertIn('interactive_denied', response.data['upstream_quota'])
+        self.assertIn('redundant_fetches', response.data['observation_ttl'])
+        self.assertIn('pending', response.data['query_log'])
+        self.assertIn('failover_entries', response.data['redis'])
+
+    @patch('weather_api.views.aget_weather_for_city', new_callable=AsyncMock)
+    def test_async_endpoint_matches_sync_response(self, mock_get_weather):
+        query = WeatherQuery(id=1, location=self.location, weather_data=self.weather_data,
+                             units='C', served_from_cache=True)
+        query.rate_limit = RateLimitStatus(limit=30, remaining=12, reset_after=40)
+        mock_get_weather.return_value = query
+
+        response = self.client.post(reverse('weather-data-async'), {'city': 'Paris'}, content_type='application/json')
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(json.loads(response.content), json.loads(json.dumps(WeatherQuerySerializer(query).data)))
+        self.assertEqual(response['X-RateLimit-Remaining'], '12')
+
+        mock_get_weather.side_effect = RateLimitExceeded('limit', RateLimitStatus(limit=30, remaining=0, reset_after=5))
+        response = self.client.post(reverse('weather-data-async'), {'city': 'Paris'}, content_type='application/json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '5')
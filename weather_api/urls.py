@@ -9,9 +9,13 @@ urlpatterns = [
     # API Routes
     path('api/', include(router.urls)),
     path('api/health/', views.HealthCheckView.as_view(), name='health-check'),
+    path('api/metrics/', views.MetricsView.as_view(), name='metrics'),
 
     # Web Interface Routes
     path('', views.WeatherFormView.as_view(), name='weather-form'),
     path('history/', views.WeatherHistoryView.as_view(), name='weather-history'),
     path('api/weather/data/', views.WeatherDataAPIView.as_view(), name='weather-data-api'),
+    path('api/weather/batch/', views.WeatherBatchAPIView.as_view(), name='weather-batch-api'),
+    path('api/weather/coords/', views.WeatherCoordinatesAPIView.as_view(), name='weather-coords-api'),
+    path('api/weather/data/async/', views.WeatherDataAsyncView.as_view(), name='weather-data-async'),
 ]
\ No newline at end of file
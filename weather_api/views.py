@@ -1,8 +1,16 @@
 import csv
+import hashlib
+import json
 import logging
+import zlib
 from datetime import datetime
 
-from django.http import HttpResponse
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
 from django.db import connection
 from django.views.generic import TemplateView
 from django_filters.rest_framework import DjangoFilterBackend
@@ -10,25 +18,120 @@ from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
-from rest_framework.pagination import PageNumberPagination
+from rest_framework.pagination import PageNumberPagination, CursorPagination
+from rest_framework.utils.urls import remove_query_param
 
 from .models import WeatherQuery
 from .serializers import (
     WeatherQuerySerializer,
     WeatherQueryCreateSerializer,
-    WeatherQueryListSerializer
+    WeatherQueryListSerializer,
+    WeatherBatchSerializer,
+    WeatherCoordinatesSerializer,
 )
-from .services.cash_service import get_weather_for_city
-from .services.rate_limiter import RateLimitExceeded
+from .response_cache import weather_query_response, render_weather_query
+from .services.cash_service import (
+    get_weather_for_city, get_weather_for_cities, get_weather_for_coordinates, aget_weather_for_city, local_cache,
+)
+from .services.negative_cache import negative_cache
+from .services.observation_ttl import observation_ttl
+from .services.city_aliases import city_aliases
+from .services.geo import location_grid
+from .services.upstream_quota import upstream_quota, upstream_priority, BACKGROUND
+from .services.query_log import query_log_writer
+from .services.redis_failover import redis_health
+from .services.rate_limiter import RateLimitExceeded, rate_limit_headers
+from .services.weather_api_service import OpenWeatherAPI, UpstreamUnavailable, CityNotFound
+from .services.circuit_breaker import upstream_breaker
+from .services.units import convert_temperature
 
 logger = logging.getLogger("weather")
 
+EXPORT_CHUNK_SIZE = 2000  # rows fetched per server-side cursor round trip
+EXPORT_FLUSH_ROWS = 500  # rows buffered per streamed chunk
+EXPORT_FIELDS = (
+    'location__city',
+    'location__country_code',
+    'weather_data__temperature',
+    'weather_data__feels_like',
+    'weather_data__main_weather',
+    'weather_data__description',
+    'timestamp',
+    'units',
+    'served_from_cache',
+)
+
+COUNT_CACHE_TTL = 60  # seconds
+APPROXIMATE_COUNT_THRESHOLD = 100_000  # rows; above this the planner estimate is used
+
+
 class StandardResultsPagination(PageNumberPagination):
     page_size = 10
     page_size_query_param = 'page_size'
     max_page_size = 100
 
 
+class HistoryCursorPagination(CursorPagination):
+    """
+    Cursor pagination ordered by -timestamp: each page seeks on the timestamp
+    index instead of OFFSET-scanning the table, so deep pages cost about the
+    same as the first one. DRF positions the cursor on the first ordering
+    field only; rows sharing a timestamp are skipped with a small offset
+    encoded in the cursor, and '-id' just keeps their order stable.
+
+    No COUNT(*) unless `with_count=true` is passed, and then it is cached or
+    estimated. The flag is dropped from the next/previous links, so only the
+    page that asked for it pays for the count.
+    """
+    page_size = 10
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = ('-timestamp', '-id')
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.with_count = request.query_params.get('with_count', '').lower() in ('1', 'true')
+        self.count_queryset = queryset
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_next_link(self):
+        link = super().get_next_link()
+        return link and remove_query_param(link, 'with_count')
+
+    def get_previous_link(self):
+        link = super().get_previous_link()
+        return link and remove_query_param(link, 'with_count')
+
+    def get_paginated_response(self, data):
+        payload = {
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        }
+        if self.with_count:
+            payload['count'], payload['count_is_approximate'] = history_count(self.count_queryset)
+        return Response(payload)
+
+
+def history_count(queryset):
+    """
+    Returns (count, is_approximate). Large unfiltered histories use the
+    planner's row estimate; anything else is an exact count cached briefly.
+    """
+    if not queryset.query.where:
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SELECT reltuples::bigint FROM pg_class WHERE relname = %s",
+                [WeatherQuery._meta.db_table],
+            )
+            row = cursor.fetchone()
+        if row and row[0] >= APPROXIMATE_COUNT_THRESHOLD:
+            return row[0], True
+
+    sql, params = queryset.query.sql_with_params()
+    cache_key = 'history_count:' + hashlib.md5(f"{sql}|{params}".encode('utf-8')).hexdigest()
+    return cache.get_or_set(cache_key, queryset.count, timeout=COUNT_CACHE_TTL), False
+
+
 class WeatherQueryFilter(viewsets.GenericViewSet):
     def get_queryset(self):
         queryset = WeatherQuery.objects.select_related(
@@ -62,6 +165,16 @@ class WeatherQueryViewSet(WeatherQueryFilter, viewsets.ModelViewSet):
     pagination_class = StandardResultsPagination
     filter_backends = [DjangoFilterBackend]
 
+    @property
+    def paginator(self):
+        # `?pagination=cursor` switches the history list to keyset pagination
+        if not hasattr(self, '_paginator'):
+            if self.request.query_params.get('pagination') == 'cursor':
+                self._paginator = HistoryCursorPagination()
+            else:
+                self._paginator = self.pagination_class()
+        return self._paginator
+
     def get_serializer_class(self):
         if self.action == 'create':
             return WeatherQueryCreateSerializer
@@ -115,8 +228,7 @@ class WeatherQueryViewSet(WeatherQueryFilter, viewsets.ModelViewSet):
                     }
                 )
 
-                response_serializer = WeatherQuerySerializer(weather_query)
-                return Response(response_serializer.data, status=status.HTTP_201_CREATED)
+                return weather_query_response(request, weather_query, status.HTTP_201_CREATED)
 
             except RateLimitExceeded as e:
                 logger.warning(
@@ -132,7 +244,26 @@ class WeatherQueryViewSet(WeatherQueryFilter, viewsets.ModelViewSet):
                 )
                 return Response(
                     {"error": "Rate limit exceeded", "message": "Please try again in a minute.", "detail": str(e)},
-                    status=status.HTTP_429_TOO_MANY_REQUESTS
+                    status=status.HTTP_429_TOO_MANY_REQUESTS,
+                    headers=rate_limit_headers(e.status, exceeded=True),
+                )
+
+            except UpstreamUnavailable as e:
+                logger.warning(
+                    "Upstream unavailable with no cached observation",
+                    extra={
+                        'ip': ip_address,
+                        'user': 'anonymous',
+                        'event': 'upstream_unavailable',
+                        'city': city,
+                        'units': units,
+                        'error': str(e),
+                    }
+                )
+                return Response(
+                    {"error": "Weather service unavailable", "detail": str(e)},
+                    status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    headers={"Retry-After": str(int(settings.WEATHER_BREAKER_OPEN_SECONDS))},
                 )
 
             except ValueError as e:
@@ -182,29 +313,28 @@ class WeatherQueryViewSet(WeatherQueryFilter, viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def export_csv(self, request):
-        queryset = self.get_queryset().select_related('location', 'weather_data')
-
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = 'attachment; filename="weather_history.csv"'
-
-        writer = csv.writer(response)
-        writer.writerow(
-            ['City', 'Country', 'Temperature', 'Feels Like', 'Weather', 'Description', 'Query Timestamp', 'Units',
-             'Served From Cache'])
-
-        for query in queryset:
-            writer.writerow([
-                query.location.city,
-                query.location.country_code,
-                query.weather_data.temperature if query.weather_data else 'N/A',
-                query.weather_data.feels_like if query.weather_data else 'N/A',
-                query.weather_data.main_weather if query.weather_data else 'N/A',
-                query.weather_data.description if query.weather_data else 'N/A',
-                query.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
-                query.units,
-                'Yes' if query.served_from_cache else 'No'
-            ])
+        """Streams the filtered history as CSV; `?gzip=true` compresses the download."""
+        return self._streaming_export(_csv_chunks(self._export_rows()), 'weather_history.csv', 'text/csv')
+
+    @action(detail=False, methods=['get'])
+    def export_ndjson(self, request):
+        """Streams the filtered history as newline-delimited JSON; `?gzip=true` compresses the download."""
+        return self._streaming_export(
+            _ndjson_chunks(self._export_rows()), 'weather_history.ndjson', 'application/x-ndjson'
+        )
 
+    def _export_rows(self):
+        # Plain tuples over a server-side cursor: memory stays flat regardless of row count
+        return self.get_queryset().values_list(*EXPORT_FIELDS).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+    def _streaming_export(self, chunks, filename, content_type):
+        if self.request.query_params.get('gzip', '').lower() in ('1', 'true'):
+            chunks = _gzip_chunks(chunks)
+            filename = f"{filename}.gz"
+            content_type = 'application/gzip'
+
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
         return response
 
     def get_client_ip(self):
@@ -216,6 +346,73 @@ class WeatherQueryViewSet(WeatherQueryFilter, viewsets.ModelViewSet):
         return ip
 
 
+class _Echo:
+    """File-like object for csv.writer that returns each row instead of storing it."""
+    def write(self, value):
+        return value
+
+
+def _csv_chunks(rows):
+    writer = csv.writer(_Echo())
+    yield writer.writerow(
+        ['City', 'Country', 'Temperature', 'Feels Like', 'Weather', 'Description', 'Query Timestamp', 'Units',
+         'Served From Cache'])
+
+    buffer = []
+    for city, country_code, temperature, feels_like, main_weather, description, timestamp, units, cached in rows:
+        if temperature is None:  # temperature is required, so no linked WeatherData
+            temperature = feels_like = main_weather = description = 'N/A'
+        else:
+            temperature = convert_temperature(temperature, units)
+            feels_like = convert_temperature(feels_like, units)
+        buffer.append(writer.writerow([
+            city,
+            country_code,
+            temperature,
+            feels_like,
+            main_weather,
+            description,
+            timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            units,
+            'Yes' if cached else 'No'
+        ]))
+        if len(buffer) >= EXPORT_FLUSH_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _ndjson_chunks(rows):
+    buffer = []
+    for city, country_code, temperature, feels_like, main_weather, description, timestamp, units, cached in rows:
+        buffer.append(json.dumps({
+            'city': city,
+            'country_code': country_code,
+            'temperature': convert_temperature(temperature, units),
+            'feels_like': convert_temperature(feels_like, units),
+            'main_weather': main_weather,
+            'description': description,
+            'timestamp': timestamp.isoformat(),
+            'units': units,
+            'served_from_cache': cached,
+        }, ensure_ascii=False) + '\n')
+        if len(buffer) >= EXPORT_FLUSH_ROWS:
+            yield ''.join(buffer)
+            buffer = []
+    if buffer:
+        yield ''.join(buffer)
+
+
+def _gzip_chunks(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)  # gzip container
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode('utf-8'))
+        if data:
+            yield data
+    yield compressor.flush()
+
+
 class HealthCheckView(APIView):
     def get(self, request):
         try:
@@ -227,42 +424,44 @@ class HealthCheckView(APIView):
 
         api_status = "not_checked"
         try:
-            import requests
             from django.conf import settings
 
             if settings.OPENWEATHER_API_KEY:
-                test_response = requests.get(
-                    "https://api.openweathermap.org/data/2.5/weather",
-                    params={
-                        "q": "London",
-                        "appid": settings.OPENWEATHER_API_KEY,
-                        "units": "metric"
-                    },
-                    timeout=3
-                )
-
-                if test_response.status_code == 200:
-                    api_status = "healthy"
-                elif test_response.status_code == 401:
-                    api_status = "unhealthy: invalid API key"
-                else:
-                    api_status = f"unhealthy: HTTP {test_response.status_code}"
+                # Through the shared quota (at background priority, so probes never
+                # take the interactive reserve) and the circuit breaker
+                with upstream_priority(BACKGROUND):
+                    OpenWeatherAPI.fetch_weather("London")
+                api_status = "healthy"
             else:
                 api_status = "unhealthy: API key not configured"
 
-        except requests.exceptions.Timeout:
-            api_status = "unhealthy: timeout"
-        except requests.exceptions.ConnectionError:
-            api_status = "unhealthy: connection failed"
+        except UpstreamUnavailable as e:
+            # Open circuit or spent budget; the breaker state below reports the former
+            api_status = f"skipped: {str(e)}"
+        except CityNotFound:
+            api_status = "healthy"
         except Exception as e:
             api_status = f"unhealthy: {str(e)}"
 
+        try:
+            breaker_status = upstream_breaker.snapshot()
+        except Exception as e:
+            breaker_status = {"state": f"unknown: {str(e)}"}
+
+        healthy = (
+            db_status == "healthy" and api_status.startswith(("healthy", "skipped"))
+            and breaker_status["state"] == "closed"
+        )
         health_data = {
-            "status": "healthy" if db_status == "healthy" and api_status == "healthy" else "degraded",
+            "status": "healthy" if healthy else "degraded",
             "timestamp": datetime.now().isoformat(),
             "components": {
                 "database": db_status,
-                "external_api": api_status
+                "external_api": api_status,
+                "circuit_breaker": breaker_status,
+                # Informational only: requests are still served during a Redis
+                # outage, so it must not take the replica out of rotation
+                "redis": redis_health.stats(),
             }
         }
 
@@ -271,6 +470,22 @@ class HealthCheckView(APIView):
         return Response(health_data, status=status_code)
 
 
+class MetricsView(APIView):
+    """Cache and query log counters of the worker process serving the request."""
+
+    def get(self, request):
+        return Response({
+            "local_cache": local_cache.stats(),
+            "negative_cache": negative_cache.stats(),
+            "observation_ttl": observation_ttl.stats(),
+            "city_aliases": city_aliases.stats(),
+            "location_grid": location_grid.stats(),
+            "upstream_quota": upstream_quota.stats(),
+            "redis": redis_health.stats(),
+            "query_log": query_log_writer.stats(),
+        })
+
+
 class WeatherFormView(TemplateView):
     template_name = 'weather/weather_form.html'
 
@@ -285,33 +500,43 @@ class WeatherDataAPIView(APIView):
             city = serializer.validated_data['city']
             units = serializer.validated_data['units']
             ip_address = self.get_client_ip(request)
-            try:
-                weather_query = get_weather_for_city(
-                    city_name=city,
-                    units=units,
-                    ip_address=ip_address
-                )
+            return self.weather_response(request, lambda: get_weather_for_city(
+                city_name=city,
+                units=units,
+                ip_address=ip_address
+            ))
 
-                response_serializer = WeatherQuerySerializer(weather_query)
-                return Response(response_serializer.data)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
-            except RateLimitExceeded:
-                return Response(
-                    {"error": "Rate limit exceeded. Please try again later."},
-                    status=status.HTTP_429_TOO_MANY_REQUESTS
-                )
-            except ValueError as e:
-                return Response(
-                    {"error": str(e)},
-                    status=status.HTTP_404_NOT_FOUND
-                )
-            except Exception as e:
-                return Response(
-                    {"error": str(e)},
-                    status=status.HTTP_500_INTERNAL_SERVER_ERROR
-                )
+    def weather_response(self, request, lookup):
+        """Runs `lookup` (returning a WeatherQuery) and maps its errors to responses."""
+        try:
+            weather_query = lookup()
 
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            return weather_query_response(request, weather_query, status.HTTP_200_OK)
+
+        except RateLimitExceeded as e:
+            return Response(
+                {"error": "Rate limit exceeded. Please try again later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers=rate_limit_headers(e.status, exceeded=True),
+            )
+        except UpstreamUnavailable as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(int(settings.WEATHER_BREAKER_OPEN_SECONDS))},
+            )
+        except ValueError as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_404_NOT_FOUND
+            )
+        except Exception as e:
+            return Response(
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
 
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -319,4 +544,140 @@ class WeatherDataAPIView(APIView):
             ip = x_forwarded_for.split(',')[0]
         else:
             ip = request.META.get('REMOTE_ADDR')
-        return ip
\ No newline at end of file
+        return ip
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class WeatherDataAsyncView(View):
+    """
+    Async twin of WeatherDataAPIView for ASGI deployments: the request never
+    holds a thread while waiting on Redis, Postgres reads or the upstream API.
+    Plain Django view, since DRF views are sync-only; responses match the sync endpoint.
+    """
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b"{}")
+        except ValueError:
+            return JsonResponse({"error": "Invalid JSON body"}, status=status.HTTP_400_BAD_REQUEST)
+
+        serializer = WeatherQueryCreateSerializer(data=data)
+        if not serializer.is_valid():
+            return JsonResponse(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        city = serializer.validated_data['city']
+        units = serializer.validated_data['units']
+        try:
+            weather_query = await aget_weather_for_city(
+                city_name=city,
+                units=units,
+                ip_address=self.get_client_ip(request)
+            )
+        except RateLimitExceeded as e:
+            return JsonResponse(
+                {"error": "Rate limit exceeded. Please try again later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers=rate_limit_headers(e.status, exceeded=True),
+            )
+        except UpstreamUnavailable as e:
+            return JsonResponse(
+                {"error": str(e)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": str(int(settings.WEATHER_BREAKER_OPEN_SECONDS))},
+            )
+        except ValueError as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except Exception as e:
+            return JsonResponse({"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+        return HttpResponse(
+            render_weather_query(weather_query),
+            status=status.HTTP_200_OK,
+            content_type="application/json",
+            headers=rate_limit_headers(weather_query.rate_limit),
+        )
+
+    def get_client_ip(self, request):
+        x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
+        if x_forwarded_for:
+            ip = x_forwarded_for.split(',')[0]
+        else:
+            ip = request.META.get('REMOTE_ADDR')
+        return ip
+
+
+class WeatherCoordinatesAPIView(WeatherDataAPIView):
+    """
+    Weather at {"lat": ..., "lon": ..., "units": ...}, e.g. a device position.
+    Points near a location already looked up share its cache entry; the
+    response matches the city endpoint.
+    """
+
+    def post(self, request):
+        serializer = WeatherCoordinatesSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        data = serializer.validated_data
+        ip_address = self.get_client_ip(request)
+        return self.weather_response(request, lambda: get_weather_for_coordinates(
+            latitude=data['lat'],
+            longitude=data['lon'],
+            units=data['units'],
+            ip_address=ip_address,
+        ))
+
+
+class WeatherBatchAPIView(WeatherDataAPIView):
+    """
+    Weather for many cities in one request: {"items": [{"city": ..., "units": ...}, ...]}.
+    The batch takes one rate-limit slot plus one per additional city fetched
+    from upstream, all or none; when the budget cannot cover the misses they
+    get status 429 while cached cities are still served. Results keep the
+    request order and carry their own status, so one failing city does not
+    fail the batch.
+    """
+
+    def post(self, request):
+        serializer = WeatherBatchSerializer(data=request.data)
+        if not serializer.is_valid():
+            return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        items = [(item['city'], item['units']) for item in serializer.validated_data['items']]
+        try:
+            results, rate_limit = get_weather_for_cities(items, ip_address=self.get_client_ip(request))
+        except RateLimitExceeded as e:
+            return Response(
+                {"error": "Rate limit exceeded. Please try again later."},
+                status=status.HTTP_429_TOO_MANY_REQUESTS,
+                headers=rate_limit_headers(e.status, exceeded=True),
+            )
+
+        body = []
+        for (city, units), result in zip(items, results):
+            if isinstance(result, Exception):
+                body.append({
+                    "city": city,
+                    "units": units,
+                    "status": _batch_error_status(result),
+                    "error": str(result),
+                })
+            else:
+                body.append({
+                    "city": city,
+                    "units": units,
+                    "status": status.HTTP_200_OK,
+                    "result": WeatherQuerySerializer(result).data,
+                })
+
+        return Response({"results": body}, status=status.HTTP_200_OK, headers=rate_limit_headers(rate_limit))
+
+
+def _batch_error_status(error: Exception) -> int:
+    if isinstance(error, RateLimitExceeded):
+        return status.HTTP_429_TOO_MANY_REQUESTS
+    if isinstance(error, UpstreamUnavailable):
+        return status.HTTP_503_SERVICE_UNAVAILABLE
+    if isinstance(error, ValueError):
+        return status.HTTP_404_NOT_FOUND
+    return status.HTTP_500_INTERNAL_SERVER_ERROR